@@ -0,0 +1,98 @@
+"""
+predict_batch 缓存路径基准测试。
+
+多个 worker 进程共享同一个缓存目录（模拟同一端口下的 gunicorn worker），
+第一个进程预热后，其余进程对同一批输入调用 `ModelLibrary.predict_batch`，
+统计各进程的缓存命中率与吞吐。缓存键由输入内容决定，因此预热结果在所有
+进程和重启之间都能命中。
+
+用法：
+    python benchmarks/predict_batch_cache.py --workers 4 --items 500 --rounds 20
+"""
+
+import argparse
+import multiprocessing as mp
+import tempfile
+import time
+
+from optiflux import Model, ModelLibrary
+
+
+class CountingModel(Model):
+    """记录实际参与预测的条目数，用于计算命中率"""
+
+    def load(self):
+        self.predicted = 0
+
+    def _predict(self, input_data):
+        return None if input_data["uid"] % 7 == 0 else {"score": input_data["uid"]}
+
+    def _predict_batch(self, inputs):
+        self.predicted += len(inputs)
+        return [self._predict(item) for item in inputs]
+
+
+def make_items(n):
+    return [{"uid": i, "ctx": {"b": [1, 2, 3], "a": "x"}} for i in range(n)]
+
+
+def run_worker(cache_dir, n_items, rounds, queue):
+    lib = ModelLibrary(models={"bench": CountingModel}, cache_dir=cache_dir)
+    model = lib.get_model("bench")
+    items = make_items(n_items)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        lib.predict_batch("bench", items)
+    elapsed = time.perf_counter() - start
+
+    total = n_items * rounds
+    queue.put(
+        {
+            "hit_rate": 1 - model.predicted / total,
+            "items_per_sec": total / elapsed,
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="predict_batch cache benchmark")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        queue = mp.Queue()
+
+        # 预热：单进程写入全部结果
+        warm = mp.Process(target=run_worker, args=(cache_dir, args.items, 1, queue))
+        warm.start()
+        warm.join()
+        result = queue.get()
+        print(
+            f"warm-up   hit_rate={result['hit_rate']:.2%} "
+            f"items/s={result['items_per_sec']:.0f}"
+        )
+
+        # 其余进程并发读取同一批输入
+        procs = [
+            mp.Process(
+                target=run_worker, args=(cache_dir, args.items, args.rounds, queue)
+            )
+            for _ in range(args.workers)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        for i in range(args.workers):
+            result = queue.get()
+            print(
+                f"worker {i}  hit_rate={result['hit_rate']:.2%} "
+                f"items/s={result['items_per_sec']:.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
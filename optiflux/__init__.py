@@ -1,4 +1,5 @@
 from .core.model import Model
 from .core.library import ModelLibrary
 from .core.cache import make
+from .core.artifacts import ArtifactStore, open_artifacts
 from .api import create_optiflux_app, serve
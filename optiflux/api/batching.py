@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional, Tuple
+
+# 配置日志
+logger = logging.getLogger("optiflux.MicroBatcher")
+
+
+class MicroBatcher:
+    """
+    动态微批处理：合并并发的单条预测请求，一次性交给 `_predict_batch`。
+
+    在事件循环中收集请求，凑满 `max_batch_size` 条或等待 `max_wait_ms`
+    毫秒后（以先到者为准）触发一次批量预测，再把结果逐条交还给等待中的请求。
+    所有状态只在事件循环线程中读写，因此无需加锁。
+    """
+
+    def __init__(
+        self,
+        predict_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        executor: Optional[Executor] = None,
+    ):
+        """
+        :param predict_batch: 批量预测函数（同步函数在 executor 中执行，协程函数直接 await）
+        :param max_batch_size: 单批最大条数
+        :param max_wait_ms: 首条请求到达后最长等待时间（毫秒）
+        :param executor: 执行批量预测的线程池，默认使用事件循环的默认线程池
+        """
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.Handle] = None
+
+    async def submit(self, item: Any) -> Any:
+        """提交单条输入，等待所在批次完成后返回对应结果"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """取出当前积攒的请求并发起一次批量预测"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch = self._pending[: self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size :]
+        if self._pending:
+            # 超出单批上限的请求立即进入下一批
+            self._timer = asyncio.get_running_loop().call_soon(self._flush)
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            if asyncio.iscoroutinefunction(self.predict_batch):
+                results = await self.predict_batch(items)
+            else:
+                results = await loop.run_in_executor(
+                    self.executor, self.predict_batch, items
+                )
+            if len(results) != len(items):
+                raise RuntimeError(
+                    f"_predict_batch returned {len(results)} results "
+                    f"for {len(items)} inputs"
+                )
+        except Exception as e:
+            logger.error(f"Batch prediction failed ({len(items)} items): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        logger.debug(f"Batch prediction finished: {len(items)} items")
+        for (_, future), result in zip(batch, results):
+            # 客户端断开时 future 可能已被取消
+            if not future.done():
+                future.set_result(result)
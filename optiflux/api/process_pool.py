@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Type
+
+from ..core.library import ModelLibrary
+from ..core.model import Model
+
+try:  # 可选依赖：NumPy 数组通过共享内存文件传递
+    import numpy as np
+except ImportError:
+    np = None
+
+# 配置日志
+logger = logging.getLogger("optiflux.ProcessPool")
+
+# 优先使用 tmpfs（/dev/shm），数组文件只存在于内存中
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+# 小于该字节数的数组直接随 pickle 传递，省去建文件的开销
+SHARED_MIN_BYTES = 64 * 1024
+
+
+class _SharedArray(NamedTuple):
+    """占位符：指向共享内存中以 .npy 格式保存的数组"""
+
+    path: str
+
+
+def _pack(obj: Any, paths: List[str]) -> Any:
+    """把大数组写入共享内存文件并替换为占位符，新建文件路径追加到 paths"""
+    if np is not None and isinstance(obj, np.ndarray):
+        if obj.nbytes < SHARED_MIN_BYTES or obj.dtype.hasobject:
+            return obj
+        path = os.path.join(_SHM_DIR, f"optiflux-{uuid.uuid4().hex}.npy")
+        np.save(path, obj, allow_pickle=False)
+        paths.append(path)
+        return _SharedArray(path)
+    if isinstance(obj, dict):
+        return {k: _pack(v, paths) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_pack(v, paths) for v in obj]
+    if isinstance(obj, tuple) and not hasattr(obj, "_fields"):
+        return tuple(_pack(v, paths) for v in obj)
+    return obj
+
+
+def _unpack(obj: Any, unlink: bool = False) -> Any:
+    """
+    把占位符还原为写时复制的内存映射数组（不发生整块拷贝）。
+
+    :param unlink: 映射后立即删除文件（映射在 POSIX 上仍然有效）
+    """
+    if isinstance(obj, _SharedArray):
+        array = np.asarray(np.load(obj.path, mmap_mode="c"))
+        if unlink:
+            _remove([obj.path])
+        return array
+    if isinstance(obj, dict):
+        return {k: _unpack(v, unlink) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_unpack(v, unlink) for v in obj]
+    if isinstance(obj, tuple) and not hasattr(obj, "_fields"):
+        return tuple(_unpack(v, unlink) for v in obj)
+    return obj
+
+
+def _remove(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# 子进程内的模型实例（每个子进程只加载一次）
+_WORKER_MODEL: Optional[Model] = None
+
+
+def _init_worker(
+    models: Dict[str, Type[Model]], model_name: str, library_kwargs: Dict[str, Any]
+):
+    """子进程初始化：通过 ModelLibrary 加载模型及其依赖"""
+    global _WORKER_MODEL
+    lib = ModelLibrary(models=models, **library_kwargs)
+    _WORKER_MODEL = lib.get_model(model_name)
+    logger.info(f"Process worker {os.getpid()} loaded model: {model_name}")
+
+
+def _worker_call(method: str, payload: Any) -> Any:
+    """在子进程中执行预测，输入与输出中的大数组经共享内存传递"""
+    result = getattr(_WORKER_MODEL, method)(_unpack(payload))
+    return _pack(result, [])
+
+
+class ProcessPoolRunner:
+    """
+    在进程池中执行 `_predict` / `_predict_batch`，让 CPU 密集型模型绕开 GIL。
+    只支持同步模型：异步模型（重写了 `_apredict` / `_apredict_batch`）应使用线程模式。
+
+    每个子进程在启动时加载一次模型；进程池按 pid 惰性创建，
+    因此在 gunicorn --preload 的 master 中创建本对象后 fork 也是安全的。
+    """
+
+    def __init__(
+        self,
+        models: Dict[str, Type[Model]],
+        model_name: str,
+        max_workers: Optional[int] = None,
+        start_method: str = "spawn",
+        **library_kwargs,
+    ):
+        """
+        :param models: 模型名称到模型类的映射（模型类需可在子进程中导入）
+        :param model_name: 对外提供服务的模型名称
+        :param max_workers: 子进程数量，默认为 CPU 核数
+        :param start_method: 子进程启动方式（spawn/forkserver/fork）
+        :param library_kwargs: 子进程中创建 ModelLibrary 的其他参数（如缓存的 size_limit）
+        """
+        model = models[model_name]
+        if isinstance(model, type) and issubclass(model, Model) and model.is_async():
+            raise ValueError(
+                f"Model {model_name} is async and cannot run in a process pool; "
+                f"use execution_mode='thread'"
+            )
+        self.models = models
+        self.model_name = model_name
+        self.max_workers = max_workers
+        self.start_method = start_method
+        self.library_kwargs = library_kwargs
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(self.models, self.model_name, self.library_kwargs),
+            )
+            self._pid = os.getpid()
+            logger.info(
+                f"Started process pool for {self.model_name} "
+                f"(workers={self.max_workers or os.cpu_count()}, "
+                f"start_method={self.start_method})"
+            )
+        return self._pool
+
+    async def _call(self, method: str, data: Any) -> Any:
+        paths: List[str] = []
+        payload = _pack(data, paths)
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                self._ensure_pool(), _worker_call, method, payload
+            )
+        finally:
+            _remove(paths)
+        return _unpack(result, unlink=True)
+
+    async def predict(self, item: Any) -> Any:
+        return await self._call("_predict", item)
+
+    async def predict_batch(self, items: List[Any]) -> List[Any]:
+        return await self._call("_predict_batch", items)
+
+    def shutdown(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False)
+        self._pool = None
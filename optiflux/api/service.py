@@ -1,25 +1,100 @@
+import asyncio
+import os
 import fastapi
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional
 import uvicorn
 import logging
 from optiflux.core.library import ModelLibrary
 from ..core.model import Model
+from .batching import MicroBatcher
+from .process_pool import ProcessPoolRunner
+from ..utils.memory import memory_report
 
 # 配置日志
 logger = logging.getLogger("optiflux.APIService")
 
+# 模型库磁盘缓存的大小上限（线程模式与进程池子进程相同）
+CACHE_SIZE_LIMIT = 5 * 1024**3  # 5GB
+
 
 class ModelkitAPIRouter(fastapi.APIRouter):
     def __init__(
         self,
         # ModelLibrary arguments
         model: Dict,
+        # size of the thread pool running sync models (None: executor default)
+        executor_workers: Optional[int] = None,
+        # "thread": run models in this process; "process": in a process pool
+        execution_mode: str = "thread",
+        # load models on first request (optionally warmed up in background)
+        lazy: bool = False,
+        warmup: bool = False,
         **kwargs,
     ) -> None:
         # add custom startup/shutdown events
         super().__init__(**kwargs)
 
-        self.lib = ModelLibrary(models=model, size_limit=5 * 1024**3)  # 5GB 缓存)
+        if execution_mode not in ("thread", "process"):
+            raise ValueError(f"Unknown execution_mode: {execution_mode}")
+        self.execution_mode = execution_mode
+        # 进程池模式下模型只在子进程中加载，当前进程不持有模型实例
+        self.lib = None
+        self.lazy = lazy
+        self.warmup = warmup
+        self.executor_workers = executor_workers
+        if execution_mode == "thread":
+            # 预加载阶段（gunicorn --preload 时在 master 中、fork 之前执行）：
+            # 只加载只读的模型数据；惰性模式的后台预热推迟到 worker 中进行。
+            # 冻结 GC、关闭缓存连接只在 fork 前进行，普通构造时不执行
+            self.lib = ModelLibrary(
+                models=model, lazy=lazy, size_limit=CACHE_SIZE_LIMIT
+            )
+            if not lazy:
+                self.lib.preload_on_fork()
+        # 同步模型在独立的线程池中执行，不占用 Starlette 默认线程池；
+        # 线程池属于 worker 阶段，在 startup 事件中按进程创建
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self._batchers: List[MicroBatcher] = []
+        self.add_event_handler("startup", self._on_worker_start)
+        self.add_event_handler("shutdown", self._shutdown_executor)
+
+    def _on_worker_start(self):
+        """worker 阶段（fork 之后）：创建线程池并执行模型的 worker 级初始化"""
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.executor_workers, thread_name_prefix="optiflux-predict"
+        )
+        for batcher in self._batchers:
+            batcher.executor = self.executor
+        if self.lib is not None:
+            self.lib.on_worker_start()
+            if self.lazy and self.warmup:
+                self.lib.warmup()
+        logger.info(f"Worker {os.getpid()} ready.")
+
+    def _shutdown_executor(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def _model_dependency(self, model_name: str):
+        """返回获取模型实例的异步依赖（避免依赖解析占用线程池）"""
+
+        async def _get_model():
+            if self.lib.is_loaded(model_name):
+                return self.lib.get_model(model_name)
+            # 惰性模式下首次加载可能很慢，放到线程池中避免阻塞事件循环
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, self.lib.get_model, model_name
+            )
+
+        return _get_model
+
+    @staticmethod
+    def _is_async_model(model) -> bool:
+        return (
+            isinstance(model, type) and issubclass(model, Model) and model.is_async()
+        )
 
 
 class ModelkitAutoAPIRouter(ModelkitAPIRouter):
@@ -30,6 +105,12 @@ class ModelkitAutoAPIRouter(ModelkitAPIRouter):
         # paths overrides change the configuration key into a path
         route_paths: Optional[Dict[str, str]] = None,
         api_prefix: str = "",
+        # micro-batching of single-item predictions (0 disables)
+        micro_batch_size: int = 0,
+        micro_batch_wait_ms: float = 5.0,
+        # process pool options (execution_mode="process")
+        process_workers: Optional[int] = None,
+        process_start_method: str = "spawn",
         # APIRouter arguments
         **kwargs,
     ) -> None:
@@ -37,9 +118,21 @@ class ModelkitAutoAPIRouter(ModelkitAPIRouter):
             model=model,
             **kwargs,
         )
+        self.micro_batch_size = micro_batch_size
+        self.micro_batch_wait_ms = micro_batch_wait_ms
 
         route_paths = route_paths or {}
         model_name = list(model.keys())[0]
+        self.runner = None
+        if self.execution_mode == "process":
+            self.runner = ProcessPoolRunner(
+                model,
+                model_name,
+                max_workers=process_workers,
+                start_method=process_start_method,
+                size_limit=CACHE_SIZE_LIMIT,
+            )
+            self.add_event_handler("shutdown", self.runner.shutdown)
         path = route_paths.get(model_name, f"{api_prefix}/predict/" + model_name)
         batch_path = route_paths.get(
             model_name, f"{api_prefix}/predict/batch/" + model_name
@@ -75,47 +168,109 @@ class ModelkitAutoAPIRouter(ModelkitAPIRouter):
         )
         logger.info(f"Added model to service: {model_name}, path: {path}")
 
+        self.add_api_route(
+            f"{api_prefix}/memory",
+            self._memory_endpoint,
+            methods=["GET"],
+            summary="Memory usage of the master and all workers",
+        )
+
+    @staticmethod
+    async def _memory_endpoint():
+        # 对比各进程 RSS 与 Pss，查看 fork 后共享的模型页
+        return memory_report()
+
     def _make_model_endpoint_fn(self, model, model_name):
-        if isinstance(model, Model):
+        get_model = self._model_dependency(model_name)
+        is_async = self._is_async_model(model)
+
+        if self.micro_batch_size > 0:
+            # 合并并发的单条请求，交给模型的批量预测一次完成
+            if self.runner is not None:
+                predict_batch = self.runner.predict_batch
+            elif is_async:
 
+                async def predict_batch(items):
+                    return await (await get_model())._apredict_batch(items)
+
+            else:
+
+                def predict_batch(items):
+                    return self.lib.get_model(model_name)._predict_batch(items)
+
+            batcher = MicroBatcher(
+                predict_batch,
+                max_batch_size=self.micro_batch_size,
+                max_wait_ms=self.micro_batch_wait_ms,
+                executor=self.executor,
+            )
+            self._batchers.append(batcher)
+
+            async def _batched_endpoint(item=fastapi.Body(...)):
+                return await batcher.submit(item)
+
+            return _batched_endpoint
+
+        if self.runner is not None:
+
+            async def _pendpoint(item=fastapi.Body(...)):
+                return await self.runner.predict(item)
+
+            return _pendpoint
+
+        if is_async:
+            # 异步模型直接在事件循环上 await
             async def _aendpoint(
                 item=fastapi.Body(...),
-                model=fastapi.Depends(lambda: self.lib.get_model(model_name)),
+                model=fastapi.Depends(get_model),
             ):
-                return await model._predict(item)
+                return await model._apredict(item)
 
             return _aendpoint
 
-        def _endpoint(
+        async def _endpoint(
             item=fastapi.Body(...),
-            model=fastapi.Depends(lambda: self.lib.get_model(model_name)),
+            model=fastapi.Depends(get_model),
         ):
-            return model._predict(item)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, model._predict, item)
 
         return _endpoint
 
     def _make_batch_model_endpoint_fn(self, model, model_name):
-        if isinstance(model, Model):
+        get_model = self._model_dependency(model_name)
+
+        if self.runner is not None:
+
+            async def _pendpoint(item: List = fastapi.Body(...)):
+                return await self.runner.predict_batch(item)
+
+            return _pendpoint
+
+        if self._is_async_model(model):
 
             async def _aendpoint(
                 item: List = fastapi.Body(...),
-                model=fastapi.Depends(lambda: self.lib.get_model(model_name)),
+                model=fastapi.Depends(get_model),
             ):
-                return await model._predict_batch(item)
+                return await model._apredict_batch(item)
 
             return _aendpoint
 
-        def _endpoint(
+        async def _endpoint(
             item: List = fastapi.Body(...),
-            model=fastapi.Depends(lambda: self.lib.get_model(model_name)),
+            model=fastapi.Depends(get_model),
         ):
-            return model._predict_batch(item)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, model._predict_batch, item
+            )
 
         return _endpoint
 
 
 def create_optiflux_app(model: Dict, **config):
-    title = config.get("title")
+    title = config.pop("title", None)
     if title is None:
         title = "Optiflux API"
     version = "1.0"
@@ -4,12 +4,17 @@ import yaml
 import os
 from pathlib import Path
 from .utils.file_utils import data_dir_default
+from .client.artifact import PushArtifact
+from .client.index import LocalIndex
+from .utils.ignore import IgnoreMatcher
+from .utils.zipstream import ZipStreamError, extract_entry, iter_entries
 import hashlib
 import json
 import requests
 from datetime import datetime
-import zipfile
-import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 配置日志
 logging.basicConfig(
@@ -79,11 +84,30 @@ NODES={json.dumps([
 
 # SERVER_URL = "http://35.165.37.114:8913"
 
+# 分片上传的分片大小
+UPLOAD_CHUNK_SIZE = 8 << 20
+# 并发上传的对象数；每个上传中的对象只缓存一块数据
+UPLOAD_WORKERS = 4
+
+def format_bytes(size):
+    """字节数转为便于阅读的字符串"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+# 计算文件哈希的线程数（读文件与 sha1 计算都会释放 GIL）
+HASH_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+# 修改时间距今小于该值的文件视为可能仍在变化，不缓存其状态
+RACY_WINDOW_NS = 2 * 10**9
+
+# 内置忽略规则（gitignore 语法），仓库中的 .gitignore / .optifluxignore 可以覆盖
 IGNORE_PATTERNS = [
-    ".ipynb_checkpoints",  # 忽略 Jupyter Notebook 的检查点目录
-    ".optiflux/index",  # 忽略索引文件
-    ".optiflux",
+    ".ipynb_checkpoints/",  # 忽略 Jupyter Notebook 的检查点目录
+    ".optiflux/",  # 忽略索引、对象与会话文件
     "servers.yaml",
+    "__pycache__/",
 ]
 
 
@@ -94,8 +118,11 @@ class OptifluxClient:
         self.objects_dir = os.path.join(self.git_dir, "objects")
         self.head_path = os.path.join(self.git_dir, "HEAD")
         self.server_name = server_name
+        self.prefix = ""  # 推送进度输出的前缀，多目标推送时为目标名
         self.server_info = self.load_server_info()
         self.session = requests.Session()
+        self.ignore = IgnoreMatcher(repo_path, IGNORE_PATTERNS)
+        self.index = LocalIndex(self.git_dir)
         os.makedirs(self.git_dir, exist_ok=True)
         os.makedirs(self.objects_dir, exist_ok=True)
 
@@ -188,21 +215,7 @@ class OptifluxClient:
         return self.server_info["api_key"]
 
     def get_index_path(self):
-        return os.path.join(self.git_dir, "index")
-
-    def read_index(self):
-        """读取索引文件"""
-        index_path = self.get_index_path()
-        if os.path.exists(index_path):
-            with open(index_path, "r") as f:
-                return json.load(f)
-        return {}
-
-    def write_index(self, index):
-        """写入索引文件"""
-        index_path = self.get_index_path()
-        with open(index_path, "w") as f:
-            json.dump(index, f)
+        return self.index.db_path
 
     def hash_object2(self, data):
         """生成对象的哈希值"""
@@ -216,91 +229,99 @@ class OptifluxClient:
 
     def add(self, path):
         """添加文件到暂存区"""
-        index = self.read_index()
-        index["operations"] = []
-
-        def should_ignore(file_path):
-            """检查文件路径是否匹配忽略规则"""
-            for pattern in IGNORE_PATTERNS:
-                if pattern in file_path:
-                    return True
-            return False
-
         if os.path.isdir(path):
-            for root, _, files in os.walk(path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if should_ignore(file_path):
-                        print(f"Ignored {file_path}")
-                        continue
-                    try:
-                        with open(file_path, "rb") as f:  # 以二进制模式读取
-                            content = f.read()
-                        file_hash = self.hash_object(content)
-
-                        if file_path not in index:
-                            # 文件新增
-                            index[file_path] = file_hash
-                            index["operations"].append(
-                                {
-                                    "type": "add",
-                                    "file": file_path,
-                                    "old_hash": file_hash,
-                                    "new_hash": file_hash,
-                                }
-                            )
-                            print(f"Added {file_path}")
-                        elif index[file_path] != file_hash:
-                            # 文件更新
-                            index["operations"].append(
-                                {
-                                    "type": "update",
-                                    "file": file_path,
-                                    "old_hash": index[file_path],
-                                    "new_hash": file_hash,
-                                }
-                            )
-
-                            print(f"Updated {file_path}")
-
-                    except UnicodeDecodeError:
-                        print(f"Skipped binary file: {file_path}")
+            # 被忽略的目录直接剪枝，不会进入
+            file_paths = list(
+                self.ignore.walk(path, on_ignored=lambda p: print(f"Ignored {p}"))
+            )
         else:
-            if should_ignore(path):
+            if self.should_ignore(path):
                 print(f"Ignored {path}")
                 return
+            file_paths = [path]
+
+        known = self.index.lookup(file_paths)
+        entries = self.hash_files(file_paths, known)
+        operations = []
+        changed = {}
+        for file_path in file_paths:
+            entry = entries.get(file_path)
+            if entry is None:
+                print(f"Skipped unreadable file: {file_path}")
+                continue
+            old_entry = known.get(file_path)
+            if old_entry is None:
+                # 文件新增
+                operations.append(
+                    {
+                        "type": "add",
+                        "file": file_path,
+                        "old_hash": entry["hash"],
+                        "new_hash": entry["hash"],
+                    }
+                )
+                print(f"Added {file_path}")
+            elif old_entry["hash"] != entry["hash"]:
+                # 文件更新
+                operations.append(
+                    {
+                        "type": "update",
+                        "file": file_path,
+                        "old_hash": old_entry["hash"],
+                        "new_hash": entry["hash"],
+                    }
+                )
+                print(f"Updated {file_path}")
+            if entry != old_entry:
+                changed[file_path] = entry
+        # 只写入变化的条目；每次 add 重新开始记录操作
+        self.index.update(changed)
+        self.index.reset_operations(operations)
+
+    def file_status(self, st):
+        """索引中用于判断文件是否变化的状态"""
+        return {"size": st.st_size, "mtime": st.st_mtime_ns, "inode": st.st_ino}
+
+    def hash_files(self, file_paths, known):
+        """
+        计算一批文件的哈希：大小、修改时间、inode 与索引一致的文件直接沿用索引中的
+        哈希，不读取内容；其余文件在线程池中分块读取计算。
+        :param known: 索引中已有的条目 {路径: 条目}
+        :return: {路径: 索引条目}，无法读取的文件不在结果中
+        """
+        entries = {}
+        changed = []
+        for file_path in file_paths:
             try:
-                with open(path, "rb") as f:  # 以二进制模式读取
-                    content = f.read()
-                file_hash = self.hash_object(content)
-
-                if path not in index:
-                    # 文件新增
-                    index["operations"].append(
-                        {
-                            "type": "add",
-                            "file": path,
-                            "old_hash": file_hash,
-                            "new_hash": file_hash,
-                        }
-                    )
-                    print(f"Added {path}")
-                elif index[path] != file_hash:
-                    # 文件更新
-                    index["operations"].append(
-                        {
-                            "type": "update",
-                            "file": path,
-                            "old_hash": index[path],
-                            "new_hash": file_hash,
-                        }
-                    )
-
-                    print(f"Updated {path}")
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            status = self.file_status(st)
+            entry = known.get(file_path)
+            if entry is not None and all(
+                entry.get(key) == value for key, value in status.items()
+            ):
+                entries[file_path] = entry
+                continue
+            # 刚修改过的文件可能在同一时间精度内再次被修改而状态不变，
+            # 不记录其状态，下次仍重新计算
+            if time.time_ns() - st.st_mtime_ns < RACY_WINDOW_NS:
+                status = {}
+            changed.append((file_path, status))
 
-            except UnicodeDecodeError:
-                print(f"Skipped binary file: {path}")
-        self.write_index(index)
+        def hash_one(file_path):
+            try:
+                return self.hash_file(file_path)[0]
+            except OSError:
+                return None
+
+        if changed:
+            with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+                hashes = pool.map(hash_one, [file_path for file_path, _ in changed])
+                for (file_path, status), file_hash in zip(changed, hashes):
+                    if file_hash is not None:
+                        entries[file_path] = {"hash": file_hash, **status}
+        return entries
 
     def commit(self, message):
         """提交更改到服务端"""
@@ -311,33 +332,29 @@ class OptifluxClient:
             "operations": [],  # 记录操作信息
         }
 
-        def should_ignore(file_path):
-            """检查文件路径是否匹配忽略规则"""
-            for pattern in IGNORE_PATTERNS:
-                if pattern in file_path:
-                    return True
-            return False
-
-        index = self.read_index()
-        operations = index.get("operations", [])
+        known = self.index.lookup()
+        operations = self.index.operations()
         commit_data["operations"] = operations
-        for file_path, file_hash in list(
-            index.items()
-        ):  # 使用 list() 避免迭代时修改字典
-            if should_ignore(file_path):
+        new_operations = []
+        changed = {}
+        removed = []
+        file_paths = []
+        for file_path in known:
+            if self.should_ignore(file_path):
                 print(f"Ignored {file_path}")
                 continue
-            if file_path == "operations":  # 跳过操作信息
-                continue
-            if os.path.exists(file_path):  # 检查文件是否存在
-                with open(file_path, "rb") as f:
-                    content = f.read()
-                current_hash = self.hash_object(content)
-
+            file_paths.append(file_path)
+
+        # 状态未变的文件沿用索引中的哈希，其余文件并行计算
+        entries = self.hash_files(file_paths, known)
+        for file_path in file_paths:
+            file_hash = known[file_path]["hash"]
+            entry = entries.get(file_path)
+            if entry is not None:  # 文件存在（不存在的文件不会出现在结果中）
+                current_hash = entry["hash"]
                 if file_hash != current_hash:
                     # 文件内容已更新
-                    commit_data["files"][file_path] = current_hash
-                    commit_data["operations"].append(
+                    new_operations.append(
                         {
                             "type": "update",
                             "file": file_path,
@@ -345,27 +362,27 @@ class OptifluxClient:
                             "new_hash": current_hash,
                         }
                     )
-                    index[file_path] = current_hash  # 更新索引中的哈希值
                     print(f"Updated {file_path}")
-                else:
-                    # 文件未更改
-                    commit_data["files"][file_path] = file_hash
+                commit_data["files"][file_path] = current_hash
+                if entry != known[file_path]:
+                    changed[file_path] = entry  # 更新索引中的哈希值与文件状态
             else:
                 # 文件已删除
-                commit_data["operations"].append(
+                new_operations.append(
                     {
                         "type": "delete",
                         "file": file_path,
                         "old_hash": file_hash,
                     }
                 )
-                del index[file_path]  # 从索引中移除
+                removed.append(file_path)  # 从索引中移除
                 print(f"Removed non-existent file from index: {file_path}")
 
-        # operations_info = commit_data["operations"]
-        index["operations"] = commit_data["operations"]
-        # 更新索引文件
-        self.write_index(index)
+        commit_data["operations"] = operations + new_operations
+        # 增量更新索引与操作记录
+        self.index.update(changed)
+        self.index.remove(removed)
+        self.index.append_operations(new_operations)
 
         # 发送提交数据到服务端
         response = requests.post(
@@ -385,21 +402,17 @@ class OptifluxClient:
             "files": {},
         }
 
-        index = self.read_index()
-        for file_path, file_hash in list(
-            index.items()
-        ):  # 使用 list() 避免迭代时修改字典
+        removed = []
+        for file_path, entry in self.index.lookup().items():
             if os.path.exists(file_path):  # 检查文件是否存在
-                with open(file_path, "rb") as f:
-                    content = f.read()
-                commit_data["files"][file_path] = file_hash
+                commit_data["files"][file_path] = entry["hash"]
             else:
                 # 如果文件不存在，从索引中移除
-                del index[file_path]
+                removed.append(file_path)
                 print(f"Removed non-existent file from index: {file_path}")
 
         # 更新索引文件
-        self.write_index(index)
+        self.index.remove(removed)
 
         response = requests.post(
             f"{self.get_server_url()}/commit", json={"commit": commit_data}
@@ -412,74 +425,468 @@ class OptifluxClient:
 
     def should_ignore(self, file_path):
         """检查文件路径是否匹配忽略规则"""
-        for pattern in IGNORE_PATTERNS:
-            if pattern in file_path:
-                return True
-        return False
+        return self.ignore.is_ignored(file_path, is_dir=False)
 
     def push(self, remote, model_name, model_version):
-        """打包文件并推送到服务端"""
-        index = self.read_index()
+        """推送到服务端：优先按内容去重只上传变化的文件，服务端不支持时上传归档"""
+        artifact = self.prepare_push()
+        if artifact is None:
+            return
+        try:
+            self.load_session(server_name=self.server_name)
+            pushed = self.push_to(artifact, remote, model_name, model_version)
+        finally:
+            artifact.close()
+        if pushed:
+            print("Push completed")
+        else:
+            print("Push failed")
+
+    def push_many(self, targets, model_name, model_version):
+        """
+        同时推送到多个目标：清单与压缩数据只准备一次，各目标并发上传、互不影响，
+        总耗时取决于最慢的目标。
+        :param targets: [(服务器名, 环境)]，服务器名为 None 时使用当前服务器
+        :return: {(服务器名, 环境): 是否成功}
+        """
+        artifact = self.prepare_push(shared=len(targets) > 1)
+        if artifact is None:
+            return {}
+
+        targets = [(server or self.server_name, env) for server, env in targets]
+
+        def label(target):
+            return f"{target[0] or 'default'}/{target[1]}"
+
+        def push_target(target):
+            server_name, remote = target
+            client = OptifluxClient(self.repo_path, server_name)
+            client.prefix = f"[{label(target)}] "
+            client.load_session(server_name=server_name)
+            return client.push_to(artifact, remote, model_name, model_version)
+
+        results = {}
+        started = time.time()
+        try:
+            with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+                futures = {
+                    executor.submit(push_target, target): target for target in targets
+                }
+                for future in as_completed(futures):
+                    target = futures[future]
+                    try:
+                        pushed = future.result()
+                        message = "ok" if pushed else "failed"
+                    except Exception as e:
+                        # 单个目标的错误（如服务器未配置、连接失败）不影响其他目标
+                        pushed = False
+                        message = f"failed: {type(e).__name__}: {e}"
+                    results[target] = pushed
+                    elapsed = time.time() - started
+                    print(f"[{label(target)}] {message} after {elapsed:.1f}s")
+        finally:
+            artifact.close()
+
+        print(f"Push summary for {model_name} {model_version}:")
+        for target in targets:
+            print(f"  {'ok    ' if results[target] else 'FAILED'}  {label(target)}")
+        ok = sum(1 for pushed in results.values() if pushed)
+        print(f"{ok}/{len(targets)} targets have {model_name} {model_version}")
+        return results
+
+    def report(self, message):
+        """输出推送进度，多目标推送时带目标前缀"""
+        print(f"{self.prefix}{message}")
+
+    def prepare_push(self, shared=False):
+        """
+        读取索引并计算清单，得到可供一个或多个目标使用的 PushArtifact。
+        :return: PushArtifact，没有可推送的文件时返回 None
+        """
+        index = self.index.lookup()
         if not index:
             print("No files to push")
-            return
+            return None
 
-        operations = index.get("operations", [])
-        # 创建内存中的 ZIP 文件
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for file_path, file_hash in index.items():
-                if self.should_ignore(file_path):
-                    print(f"Ignored {file_path}")
-                    continue
-                if file_path in ["operations", "commit_data"]:  # 跳过操作信息
-                    continue
-                zipf.write(file_path, os.path.relpath(file_path, self.repo_path))
-                print(f"Added to ZIP: {file_path}")
+        operations = self.index.operations()
+        files = self.push_files(index)
+        print(f"Pushing {len(files)} files to server")
+        print(f"operations data: {operations}")
+        manifest = {}
+        objects = {}  # sha1 -> (本地文件, 大小)
+        # 状态与索引一致的文件不再读取内容
+        entries = self.hash_files([file_path for file_path, _ in files], index)
+        for file_path, arcname in files:
+            entry = entries.get(file_path)
+            if entry is None:
+                print(f"Skipped unreadable file: {file_path}")
+                continue
+            sha1, size = entry["hash"], os.path.getsize(file_path)
+            manifest[arcname] = {"sha1": sha1, "size": size}
+            objects.setdefault(sha1, (file_path, size))
+        if not manifest:
+            print("No files to push")
+            return None
+        return PushArtifact(
+            self.git_dir, files, manifest, objects, operations, shared=shared
+        )
 
-        # 重置缓冲区指针
-        zip_buffer.seek(0)
+    def push_to(self, artifact, remote, model_name, model_version):
+        """把 artifact 推送到当前服务器的 remote 环境，服务端不支持按内容去重时上传归档"""
+        pushed = self.push_objects(artifact, remote, model_name, model_version)
+        if pushed is None:
+            pushed = self.upload_archive(
+                artifact.archive(),
+                remote,
+                model_name,
+                model_version,
+                artifact.operations,
+            )
+        return pushed
 
-        # 发送 ZIP 文件到服务端
-        print(f"Pushing files to server: {list(index.keys())}")
-        print(f"operations data: {operations}")
-        self.load_session(server_name=self.server_name)
+    def push_files(self, index):
+        """索引中需要推送的文件：[(本地路径, 版本目录内的相对路径)]"""
+        files = []
+        for file_path in index:
+            if self.should_ignore(file_path):
+                print(f"Ignored {file_path}")
+                continue
+            if not os.path.isfile(file_path):
+                print(f"Skipped missing file: {file_path}")
+                continue
+            files.append((file_path, os.path.relpath(file_path, self.repo_path)))
+        return files
+
+    def hash_file(self, file_path, chunk_size=1 << 20):
+        """分块计算文件的哈希值（与 hash_object 对整个文件内容的结果一致）"""
+        digest = hashlib.sha1()
+        size = 0
+        with open(file_path, "rb") as f:
+            for data in iter(lambda: f.read(chunk_size), b""):
+                digest.update(data)
+                size += len(data)
+        return digest.hexdigest(), size
+
+    def push_objects(self, artifact, remote, model_name, model_version, retries=3):
+        """
+        按内容去重推送：提交 路径→sha1 清单，只上传服务端对象存储中缺少的文件，
+        版本目录由服务端用已有对象构建。
+        :param artifact: prepare_push 的结果
+        :return: 是否成功；服务端不支持时返回 None
+        """
+        url = self.get_server_url()
+        target = {
+            "remote": remote,
+            "model_name": model_name,
+            "model_version": model_version,
+        }
+        response = self.session.post(
+            f"{url}/push/manifest", json={**target, "files": artifact.manifest}
+        )
+        if response.status_code in (404, 405):
+            return None
+        if response.status_code != 200:
+            self.report(f"Server response: {response.status_code}, {response.text}")
+            return False
+        result = response.json()
+        missing = result["missing"]
+        # 旧版服务端不返回 encodings，对象按原始字节上传
+        encoding = "deflate" if "deflate" in result.get("encodings", ()) else None
+        total_bytes = artifact.total_bytes
+        upload_bytes = sum(artifact.objects[sha1][1] for sha1 in missing)
+        self.report(
+            f"Uploading {len(missing)}/{len(artifact.objects)} objects "
+            f"({format_bytes(upload_bytes)} of {format_bytes(total_bytes)})"
+        )
+
+        # 多个对象并发上传，每个对象边读边压缩边发送
+        params = {"remote": remote, "model_name": model_name}
+        stopped = threading.Event()
+
+        def upload(sha1):
+            if stopped.is_set():
+                return None
+            sent = self.upload_object(
+                artifact,
+                sha1,
+                f"{url}/push/objects/{sha1}",
+                {**params, "size": artifact.objects[sha1][1]},
+                encoding,
+                retries,
+            )
+            if sent is None:
+                stopped.set()  # 一个对象失败后不再开始新的上传
+            return sent
+
+        started = time.time()
+        sent_bytes = done = 0
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            futures = {executor.submit(upload, sha1): sha1 for sha1 in missing}
+            for future in as_completed(futures):
+                sent = future.result()
+                if sent is None:
+                    continue
+                done += 1
+                sent_bytes += sent
+                file_path, size = artifact.objects[futures[future]]
+                self.report(
+                    f"Uploaded {done}/{len(missing)}: {file_path} "
+                    f"({format_bytes(size)} -> {format_bytes(sent)})"
+                )
+        if stopped.is_set():
+            self.report("Upload interrupted, run push again to upload the rest")
+            return False
+        if missing:
+            elapsed = max(time.time() - started, 1e-6)
+            saved = upload_bytes - sent_bytes
+            self.report(
+                f"Sent {format_bytes(sent_bytes)} in {elapsed:.1f}s "
+                f"({format_bytes(sent_bytes / elapsed)}/s, "
+                f"{format_bytes(upload_bytes / elapsed)}/s uncompressed); "
+                f"compression saved {format_bytes(saved)} "
+                f"({saved * 100 / max(upload_bytes, 1):.0f}%)"
+            )
+        if total_bytes > upload_bytes:
+            self.report(
+                f"Skipped {format_bytes(total_bytes - upload_bytes)} "
+                f"already on the server"
+            )
+
+        response = self.session.post(
+            f"{url}/push/finalize",
+            json={
+                **target,
+                "files": artifact.manifest,
+                "operations": artifact.operations,
+            },
+        )
+        self.report(f"Server response: {response.status_code}, {response.text}")
+        return response.status_code == 200
+
+    def upload_object(self, artifact, sha1, url, params, encoding=None, retries=3):
+        """
+        上传一个对象。可压缩的文件以 deflate 编码分块传输：只有连接可写时才读取并压缩
+        下一块，网络慢时压缩随之暂停，不会在内存中堆积；已压缩的文件按原始字节发送。
+        :param encoding: 服务端支持的请求体编码，None 表示不压缩
+        :return: 实际发送的字节数，失败返回 None
+        """
+        file_path = artifact.objects[sha1][0]
+        for attempt in range(retries):
+            try:
+                with artifact.object_body(sha1, encoding) as (body, encoded, sent):
+                    headers = {"Content-Type": "application/octet-stream"}
+                    if encoded:
+                        headers["Content-Encoding"] = encoded
+                    response = self.session.put(
+                        url, params=params, data=body, headers=headers
+                    )
+                if response.status_code == 200:
+                    return sent[0]
+                message = f"{response.status_code}, {response.text}"
+            except requests.exceptions.RequestException as e:
+                message = str(e)
+            self.report(f"Upload of {file_path} failed ({message}), retrying...")
+            time.sleep(2**attempt)
+        return None
+
+    def upload_archive(
+        self,
+        archive_path,
+        remote,
+        model_name,
+        model_version,
+        operations,
+        chunk_size=UPLOAD_CHUNK_SIZE,
+        retries=3,
+    ):
+        """
+        分片上传归档：只上传服务端缺失的分片，每个分片失败后重试，
+        服务端不支持分片上传时退回整包上传。
+        :return: 是否成功
+        """
+        size = os.path.getsize(archive_path)
+        chunk_hashes = []
+        with open(archive_path, "rb") as f:
+            for data in iter(lambda: f.read(chunk_size), b""):
+                chunk_hashes.append(self.hash_object(data))
+
+        url = f"{self.get_server_url()}/push/upload"
         response = self.session.post(
-            f"{self.get_server_url()}/push",
-            files={"file": (f"{model_name}_{model_version}.zip", zip_buffer)},
-            data={
+            url,
+            json={
                 "remote": remote,
                 "model_name": model_name,
                 "model_version": model_version,
-                "remote": remote,
-                "operations": json.dumps({"operations": operations}),
+                "size": size,
+                "chunk_size": chunk_size,
+                "chunk_hashes": chunk_hashes,
+                "operations": operations,
             },
         )
-        print(f"Server response: {response.status_code}, {response.text}")
-        if response.status_code == 200:
-            print("Push completed")
-        else:
-            print("Push failed")
+        if response.status_code in (404, 405):
+            return self.push_archive(
+                archive_path, remote, model_name, model_version, operations
+            )
+        if response.status_code != 200:
+            self.report(f"Server response: {response.status_code}, {response.text}")
+            return False
+        status = response.json()
+        upload_id = status["upload_id"]
+        missing = status["missing"]
+        if len(missing) < len(chunk_hashes):
+            self.report(f"Resuming upload {upload_id}: {len(missing)} chunks left")
+
+        with open(archive_path, "rb") as f:
+            for done, chunk_index in enumerate(missing, 1):
+                f.seek(chunk_index * chunk_size)
+                data = f.read(chunk_size)
+                for attempt in range(retries):
+                    try:
+                        response = self.session.put(
+                            f"{url}/{upload_id}/{chunk_index}",
+                            data=data,
+                            headers={
+                                "Content-Type": "application/octet-stream",
+                                "X-Chunk-Sha1": chunk_hashes[chunk_index],
+                            },
+                        )
+                        if response.status_code == 200:
+                            break
+                        message = f"{response.status_code}, {response.text}"
+                    except requests.exceptions.RequestException as e:
+                        message = str(e)
+                    self.report(f"Chunk {chunk_index} failed ({message}), retrying...")
+                    time.sleep(2**attempt)
+                else:
+                    self.report(f"Upload interrupted, run push again to resume {upload_id}")
+                    return False
+                self.report(f"Uploaded chunk {done}/{len(missing)}")
 
-    def pull(self, remote, model_name, model_version):
-        """从服务端拉取 ZIP 文件并解压"""
+        response = self.session.post(f"{url}/{upload_id}/complete")
+        if response.status_code != 200:
+            self.report(f"Server response: {response.status_code}, {response.text}")
+            return False
+        # 服务端在后台完成解压与安装
+        status = response.json()
+        while status.get("status") not in ("done", "error"):
+            time.sleep(0.5)
+            status = self.session.get(f"{url}/{upload_id}").json()
+        self.report(f"Server response: {status}")
+        return status.get("status") == "done"
+
+    def push_archive(self, archive_path, remote, model_name, model_version, operations):
+        """整包上传归档（兼容不支持分片上传的服务端）"""
+        with open(archive_path, "rb") as f:
+            response = self.session.post(
+                f"{self.get_server_url()}/push",
+                files={"file": (f"{model_name}_{model_version}.zip", f)},
+                data={
+                    "remote": remote,
+                    "model_name": model_name,
+                    "model_version": model_version,
+                    "operations": json.dumps({"operations": operations}),
+                },
+            )
+        self.report(f"Server response: {response.status_code}, {response.text}")
+        return response.status_code == 200
+
+    def pull(self, remote, model_name, model_version, incremental=False):
+        """
+        从服务端流式拉取 ZIP，边下载边解压。
+        incremental 为 True 时先获取服务端清单，只拉取与本地内容不同的文件。
+        """
         self.load_session(server_name=self.server_name)
+        params = {
+            "model_name": model_name,
+            "model_version": model_version,
+            "remote": remote,
+        }
+        paths = None
+        if incremental:
+            paths = self.pull_changed_paths(params)
+            if paths == []:
+                print("Already up to date")
+                return
+        if paths is None:
+            response = self.session.get(
+                f"{self.get_server_url()}/pull", params=params, stream=True
+            )
+        else:
+            print(f"Pulling {len(paths)} changed files")
+            response = self.session.post(
+                f"{self.get_server_url()}/pull",
+                params=params,
+                json={"paths": paths},
+                stream=True,
+            )
+        if response.status_code != 200:
+            print("Pull failed")
+            return
+        try:
+            response.raw.decode_content = True
+            count = 0
+            for entry in iter_entries(response.raw):
+                extract_entry(entry, self.repo_path)
+                count += 1
+            print(f"Pull completed: {count} files")
+        except (ZipStreamError, requests.exceptions.RequestException) as e:
+            print(f"Pull failed: {e}")
+        finally:
+            response.close()
+
+    def pull_changed_paths(self, params):
+        """
+        对比服务端清单与本地文件，返回需要拉取的相对路径；
+        服务端不支持清单（或请求失败）时返回 None，由调用方整包拉取。
+        """
         response = self.session.get(
-            f"{self.get_server_url()}/pull",
-            params={
-                "model_name": model_name,
-                "model_version": model_version,
-                "remote": remote,
-            },
+            f"{self.get_server_url()}/pull/manifest", params=params
         )
-        if response.status_code == 200:
-            # 将响应内容写入内存中的 ZIP 文件
-            zip_buffer = io.BytesIO(response.content)
-            with zipfile.ZipFile(zip_buffer, "r") as zipf:
-                zipf.extractall(self.repo_path)
-            print("Pull completed")
+        if response.status_code != 200:
+            return None
+        changed = []
+        for name, item in response.json()["files"].items():
+            local_path = os.path.join(self.repo_path, name)
+            if os.path.isfile(local_path):
+                if os.path.getsize(local_path) == item["size"]:
+                    if self.hash_file(local_path)[0] == item["sha1"]:
+                        continue
+            changed.append(name)
+        return changed
+
+def parse_push_targets(remote, servers=None):
+    """
+    解析推送目标。
+    :param remote: 逗号分隔的环境名，单项可写为 服务器名:环境名
+    :param servers: --server 指定的服务器名列表，未写服务器名的环境推送到其中每一个
+    :return: [(服务器名, 环境名)]，服务器名为 None 表示默认服务器
+    """
+    targets = []
+    for item in remote.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        server_name, _, env = item.rpartition(":")
+        if server_name:
+            targets.append((server_name, env))
         else:
-            print("Pull failed")
+            targets.extend((server, env) for server in servers or [None])
+    # 去掉重复的目标，保持顺序
+    return list(dict.fromkeys(targets))
+
+
+def push_command(args):
+    targets = parse_push_targets(args.remote, args.server)
+    if not targets:
+        print("No push target given")
+        return
+    if len(targets) == 1:
+        server_name, remote = targets[0]
+        client = OptifluxClient(os.getcwd(), server_name)
+        client.push(remote, args.model_name, args.model_version)
+        return
+    client = OptifluxClient(os.getcwd(), args.server[0] if args.server else None)
+    client.push_many(targets, args.model_name, args.model_version)
 
 
 def init_command(args):
@@ -801,15 +1208,19 @@ def main():
 
     # Push command
     push_parser = subparsers.add_parser("push", help="Push changes to remote")
-    push_parser.add_argument("remote", help="Remote Environment name")
+    push_parser.add_argument(
+        "remote",
+        help="Remote Environment name; several targets as dev,preprod or "
+        "node1:prod,node2:prod (server:env)",
+    )
     push_parser.add_argument("model_name", help="Model name")
     push_parser.add_argument("model_version", help="Model version")
-    push_parser.add_argument("--server", help="Server name to use")
-    push_parser.set_defaults(
-        func=lambda args: OptifluxClient(os.getcwd(), args.server).push(
-            args.remote, args.model_name, args.model_version
-        )
+    push_parser.add_argument(
+        "--server",
+        action="append",
+        help="Server name to use (repeat to push to several servers)",
     )
+    push_parser.set_defaults(func=push_command)
 
     # Pull command
     pull_parser = subparsers.add_parser("pull", help="Pull changes from remote")
@@ -817,9 +1228,14 @@ def main():
     pull_parser.add_argument("model_name", help="Model name")
     pull_parser.add_argument("model_version", help="Model version")
     pull_parser.add_argument("--server", help="Server name to use")
+    pull_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only pull files whose content differs locally",
+    )
     pull_parser.set_defaults(
         func=lambda args: OptifluxClient(os.getcwd(), args.server).pull(
-            args.remote, args.model_name, args.model_version
+            args.remote, args.model_name, args.model_version, args.incremental
         )
     )
 
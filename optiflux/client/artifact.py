@@ -0,0 +1,123 @@
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+import zlib
+
+from ..utils.zipstream import choose_compresslevel
+
+
+def iter_deflate(f, level, sent=None, chunk_size=1 << 20):
+    """
+    逐块读取并压缩文件（zlib 格式）。
+    :param sent: 可选的计数 [n]，累计输出的字节数
+    """
+    compressor = zlib.compressobj(level)
+    for data in iter(lambda: f.read(chunk_size), b""):
+        data = compressor.compress(data)
+        if data:
+            if sent is not None:
+                sent[0] += len(data)
+            yield data
+    data = compressor.flush()
+    if sent is not None:
+        sent[0] += len(data)
+    yield data
+
+
+class PushArtifact:
+    """
+    一次推送的内容，可由多个推送目标（服务器 + 环境）共用：
+
+    - 清单（版本目录内的路径 → sha1、大小）只计算一次；
+    - 单个目标时对象边读边压缩边发送；多个目标（shared）时每个对象只压缩一次，
+      结果写入临时目录，各目标读取同一份压缩数据；
+    - 服务端不支持按内容去重时使用的 ZIP 归档同样只构建一次；
+    - 临时目录位于 .optiflux 下，close 时删除。
+    """
+
+    def __init__(self, git_dir, files, manifest, objects, operations, shared=False):
+        """
+        :param files: [(本地路径, 版本目录内的相对路径)]
+        :param manifest: {相对路径: {"sha1", "size"}}
+        :param objects: {sha1: (本地路径, 大小)}
+        :param operations: 待推送的操作记录
+        :param shared: 是否有多个目标共用
+        """
+        self.git_dir = git_dir
+        self.files = files
+        self.manifest = manifest
+        self.objects = objects
+        self.operations = operations
+        self.shared = shared
+        self._work_dir = None
+        self._archive_path = None
+        self._lock = threading.Lock()
+        self._object_locks = {}
+
+    @property
+    def total_bytes(self):
+        return sum(size for _, size in self.objects.values())
+
+    def _work_path(self, name):
+        with self._lock:
+            if self._work_dir is None:
+                self._work_dir = tempfile.mkdtemp(prefix="push-", dir=self.git_dir)
+        return os.path.join(self._work_dir, name)
+
+    def _packed(self, sha1, level):
+        """对象的压缩数据文件，多个目标同时需要时只压缩一次"""
+        with self._lock:
+            lock = self._object_locks.setdefault(sha1, threading.Lock())
+        with lock:
+            path = self._work_path(f"{sha1}.deflate")
+            if not os.path.exists(path):
+                tmp_path = f"{path}.tmp"
+                with open(self.objects[sha1][0], "rb") as src:
+                    with open(tmp_path, "wb") as dst:
+                        for data in iter_deflate(src, level):
+                            dst.write(data)
+                os.replace(tmp_path, path)
+        return path
+
+    @contextlib.contextmanager
+    def object_body(self, sha1, encoding=None):
+        """
+        上传对象时的请求体。
+        :param encoding: 服务端支持的请求体编码，None 表示不压缩
+        :return: (请求体, Content-Encoding 或 None, 发送字节数的计数 [n])
+        """
+        file_path, size = self.objects[sha1]
+        sent = [0]
+        with open(file_path, "rb") as f:
+            level = choose_compresslevel(f, file_path) if encoding else 0
+            if not level:
+                sent[0] = size
+                yield f, None, sent
+                return
+            if not self.shared:
+                yield iter_deflate(f, level, sent), encoding, sent
+                return
+        with open(self._packed(sha1, level), "rb") as f:
+            sent[0] = os.fstat(f.fileno()).st_size
+            yield f, encoding, sent
+
+    def archive(self):
+        """ZIP 归档路径，首次调用时构建（文件未变时内容不变，便于续传）"""
+        path = self._work_path("archive.zip")
+        with self._lock:
+            if self._archive_path is None:
+                with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zipf:
+                    for file_path, arcname in self.files:
+                        zipf.write(file_path, arcname)
+                        print(f"Added to ZIP: {file_path}")
+                self._archive_path = path
+            return self._archive_path
+
+    def close(self):
+        if self._work_dir is not None:
+            shutil.rmtree(self._work_dir, ignore_errors=True)
+            self._work_dir = None
+            self._archive_path = None
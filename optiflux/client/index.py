@@ -0,0 +1,180 @@
+import json
+import os
+import sqlite3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    size INTEGER,
+    mtime INTEGER,
+    inode INTEGER
+) WITHOUT ROWID;
+"""
+
+# 条目中除 path 外的字段
+_FIELDS = ("hash", "size", "mtime", "inode")
+# 单条 SQL 中 IN (...) 的参数个数上限
+_BATCH = 500
+
+
+class LocalIndex:
+    """
+    客户端暂存区索引。
+
+    - 文件条目（路径、哈希、大小、修改时间、inode）保存在 .optiflux/index.db（SQLite），
+      按路径查询与增量写入，只有变化的条目会被写入，每次写入是一个事务；
+    - 待推送的操作记录追加写入 .optiflux/operations.jsonl，每行一条，重置时先写临时
+      文件再改名；读取时跳过写了一半的末行；
+    - 旧版的 JSON 索引 .optiflux/index 在首次打开时导入，之后改名为 index.migrated。
+    """
+
+    def __init__(self, git_dir):
+        """
+        :param git_dir: .optiflux 目录
+        """
+        self.git_dir = git_dir
+        self.db_path = os.path.join(git_dir, "index.db")
+        self.journal_path = os.path.join(git_dir, "operations.jsonl")
+        self.legacy_path = os.path.join(git_dir, "index")
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(self.git_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            if os.path.isfile(self.legacy_path):
+                self._migrate()
+        return self._conn
+
+    def _migrate(self):
+        """导入旧版 JSON 索引：{路径: 哈希或条目, "operations": [...]}"""
+        with open(self.legacy_path, "r") as f:
+            legacy = json.load(f)
+        entries = {}
+        for path, value in legacy.items():
+            if path in ("operations", "commit_data"):
+                continue
+            if isinstance(value, str):
+                # 只有哈希的旧条目没有文件状态，下次 add 时重新计算
+                value = {"hash": value}
+            entries[path] = value
+        self.update(entries)
+        self.reset_operations(legacy.get("operations", []))
+        os.replace(self.legacy_path, f"{self.legacy_path}.migrated")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # ---------------------------------------------------------------- 文件条目
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def lookup(self, paths=None):
+        """
+        :param paths: 要查询的路径，默认全部
+        :return: {路径: {"hash", "size", "mtime", "inode"}}，不在索引中的路径不返回
+        """
+        conn = self._connect()
+        query = "SELECT path, hash, size, mtime, inode FROM entries"
+        if paths is None:
+            rows = conn.execute(query)
+        else:
+            paths = list(paths)
+            rows = []
+            for start in range(0, len(paths), _BATCH):
+                batch = paths[start : start + _BATCH]
+                rows.extend(
+                    conn.execute(
+                        f"{query} WHERE path IN ({','.join('?' * len(batch))})", batch
+                    )
+                )
+        return {
+            row[0]: {
+                field: value
+                for field, value in zip(_FIELDS, row[1:])
+                if value is not None
+            }
+            for row in rows
+        }
+
+    def update(self, entries):
+        """
+        写入（新增或覆盖）条目。
+        :param entries: {路径: {"hash": ..., "size": ..., "mtime": ..., "inode": ...}}，
+            缺少的文件状态字段记为 NULL
+        """
+        if not entries:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (path, hash, size, mtime, inode) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    (path, *(entry.get(field) for field in _FIELDS))
+                    for path, entry in entries.items()
+                ),
+            )
+
+    def remove(self, paths):
+        """从索引中删除条目"""
+        paths = list(paths)
+        if not paths:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "DELETE FROM entries WHERE path = ?", ((path,) for path in paths)
+            )
+
+    # ---------------------------------------------------------------- 操作记录
+
+    def operations(self):
+        """待推送的操作记录"""
+        self._connect()  # 确保旧版索引中的操作记录已导入
+        operations = []
+        try:
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    try:
+                        operations.append(json.loads(line))
+                    except ValueError:
+                        continue  # 中断时写了一半的行
+        except FileNotFoundError:
+            pass
+        return operations
+
+    def append_operations(self, operations):
+        """追加操作记录"""
+        if not operations:
+            return
+        self._connect()
+        data = "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in operations)
+        with open(self.journal_path, "a+b") as f:
+            # 上次中断留下的不完整末行单独成行，不影响本次追加的记录
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    data = "\n" + data
+            f.write(data.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def reset_operations(self, operations=()):
+        """用 operations 替换全部操作记录（写临时文件后改名）"""
+        os.makedirs(self.git_dir, exist_ok=True)
+        tmp_path = f"{self.journal_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            for op in operations:
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
@@ -43,6 +43,9 @@ def load_config(env="dev"):
         "GUNICORN_LOGLEVEL": os.getenv("GUNICORN_LOGLEVEL", "info"),
         "NODES": nodes,
         "META_DB": os.getenv("META_DB_DIR", os.path.join(os.getcwd(), "meta_db")),
+        # 服务端口健康探测
+        "HEALTH_CHECK_INTERVAL": float(os.getenv("HEALTH_CHECK_INTERVAL", 5)),
+        "HEALTH_CHECK_PATH": os.getenv("HEALTH_CHECK_PATH", ""),
     }
 
 
@@ -63,6 +66,8 @@ ENV_DIRS = base_config["ENV_DIRS"]
 LOG_DIR = base_config["LOG_DIR"]
 NODES = base_config["NODES"]
 META_DB_DIR = base_config["META_DB"]
+HEALTH_CHECK_INTERVAL = base_config["HEALTH_CHECK_INTERVAL"]
+HEALTH_CHECK_PATH = base_config["HEALTH_CHECK_PATH"]
 
 base_paths = [ENV_DIRS["dev"], ENV_DIRS["preprod"], ENV_DIRS["prod"], LOG_DIR]
 for bp in base_paths:
@@ -1,5 +1,6 @@
 from .library import ModelLibrary
 from .model import Model
 from .cache import ModelCache
+from .artifacts import ArtifactStore, open_artifacts
 
-__all__ = ["ModelLibrary", "Model", "ModelCache"]
+__all__ = ["ModelLibrary", "Model", "ModelCache", "ArtifactStore", "open_artifacts"]
@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+from .cache import CACHE_DIRS
+
+try:  # 可选依赖：数组以 .npy 格式保存并通过内存映射读取
+    import numpy as np
+except ImportError:
+    np = None
+
+# 配置日志
+logger = logging.getLogger("optiflux.ArtifactStore")
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FORMAT = 1
+
+
+class ArtifactStore:
+    """
+    可内存映射的模型产物目录：每个数组保存为一个 `.npy` 文件，`manifest.json` 记录元数据。
+
+    `load()` 通过 `np.load(mmap_mode="r")` 返回零拷贝的只读视图，数据由操作系统按需
+    调页。同一版本目录下的产物在所有 gunicorn worker、所有端口之间共享同一份
+    page cache，加载耗时与产物大小基本无关。
+
+    用法::
+
+        class Ranker(Model):
+            def load(self):
+                store = open_artifacts("prod", "ranker", "1.0")
+                self.embeddings = store.load("item_embeddings")
+    """
+
+    def __init__(self, root: str):
+        """
+        :param root: 产物目录（不存在时在首次写入时创建）
+        """
+        if np is None:
+            raise ImportError("ArtifactStore requires numpy")
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._arrays: Dict[str, "np.ndarray"] = {}  # 本进程已映射的数组
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.root / MANIFEST_NAME
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {"format": MANIFEST_FORMAT, "arrays": {}}
+        if manifest.get("format") != MANIFEST_FORMAT:
+            raise ValueError(
+                f"Unsupported artifact manifest format: {manifest.get('format')}"
+            )
+        return manifest
+
+    def _atomic_write(self, path: Path, write):
+        """写入同目录下的临时文件后 rename，读者永远看不到写了一半的文件"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp 创建的文件只有属主可读，放开读权限供其他服务用户映射
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def save(self, name: str, array: Any):
+        """保存单个数组（见 `save_many`）"""
+        self.save_many({name: array})
+
+    def save_many(self, arrays: Mapping[str, Any]):
+        """
+        保存多个数组并更新清单。
+
+        数组以 C 连续布局写入 `.npy` 文件（数据区按 64 字节对齐），
+        不支持对象类型数组。数组文件与清单均为原子替换，已映射旧文件的
+        进程不受影响。
+
+        :param arrays: 产物名称到数组的映射
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            manifest = self._read_manifest()
+            for name, array in arrays.items():
+                if os.sep in name or name.startswith("."):
+                    raise ValueError(f"Invalid artifact name: {name}")
+                array = np.ascontiguousarray(array)
+                if array.dtype.hasobject:
+                    raise TypeError(
+                        f"Artifact {name} has object dtype and cannot be memory-mapped"
+                    )
+                filename = f"{name}.npy"
+                self._atomic_write(
+                    self.root / filename,
+                    lambda f: np.save(f, array, allow_pickle=False),
+                )
+                manifest["arrays"][name] = {
+                    "file": filename,
+                    "dtype": array.dtype.str,
+                    "shape": list(array.shape),
+                    "nbytes": int(array.nbytes),
+                }
+                self._arrays.pop(name, None)
+                logger.info(
+                    f"Saved artifact {name}: shape={array.shape}, "
+                    f"dtype={array.dtype}, {array.nbytes} bytes"
+                )
+
+            data = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+            self._atomic_write(self.manifest_path, lambda f: f.write(data))
+
+    def names(self) -> List[str]:
+        """清单中的全部产物名称"""
+        return list(self._read_manifest()["arrays"])
+
+    def info(self, name: str) -> Dict[str, Any]:
+        """产物的元数据（文件名、dtype、shape、字节数）"""
+        try:
+            return self._read_manifest()["arrays"][name]
+        except KeyError:
+            raise KeyError(f"Artifact {name} not found in {self.root}") from None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._read_manifest()["arrays"]
+
+    def load(self, name: str) -> "np.ndarray":
+        """
+        以只读内存映射方式加载数组（零拷贝，进程内只映射一次）。
+
+        对返回数组的写入会抛出 ValueError；需要修改时请先 `copy()`。
+        """
+        array = self._arrays.get(name)
+        if array is not None:
+            return array
+
+        with self._lock:
+            array = self._arrays.get(name)
+            if array is not None:
+                return array
+
+            meta = self.info(name)
+            mapped = np.load(
+                self.root / meta["file"], mmap_mode="r", allow_pickle=False
+            )
+            if mapped.dtype.str != meta["dtype"] or list(mapped.shape) != meta["shape"]:
+                raise ValueError(
+                    f"Artifact {name} does not match manifest: "
+                    f"{mapped.dtype.str}{list(mapped.shape)} != "
+                    f"{meta['dtype']}{meta['shape']}"
+                )
+            # 去掉 memmap 子类，避免运算结果也被当作 memmap；底层仍是同一映射
+            array = mapped.view(np.ndarray)
+            self._arrays[name] = array
+            logger.info(f"Mapped artifact {name}: {meta['nbytes']} bytes")
+            return array
+
+    def load_all(self) -> Dict[str, "np.ndarray"]:
+        """加载清单中的全部产物"""
+        return {name: self.load(name) for name in self.names()}
+
+
+def open_artifacts(
+    env: str,
+    model_name: str,
+    model_version: Optional[str] = None,
+    default_version: str = "0.0",
+) -> ArtifactStore:
+    """
+    打开模型版本目录下的产物库：`<env 目录>/<model>/<version>/artifacts`。
+
+    Args:
+        env: 环境名称 (e.g. "dev")
+        model_name: 模型名称
+        model_version: 模型版本 (可选)
+        default_version: 未指定版本时使用的默认版本号
+
+    Returns:
+        ArtifactStore 实例
+    """
+    version = model_version or default_version
+    root = Path(CACHE_DIRS[env]) / model_name / version / "artifacts"
+    return ArtifactStore(str(root))
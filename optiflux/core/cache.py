@@ -1,11 +1,46 @@
+import datetime
+import decimal
 import logging
+import hashlib
+from contextlib import contextmanager
 from diskcache import Cache
-from typing import Any, Optional
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
 import os
-from pathlib import Path
+import mmap
+import pickle
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from collections import OrderedDict
+from pathlib import Path, PurePath
 from ..utils.file_utils import data_dir_default
 import json
 
+try:  # 可选依赖：更快的规范化序列化
+    import orjson
+except ImportError:
+    orjson = None
+
+try:  # 可选依赖：非加密哈希
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:  # 批量读取依赖 diskcache 5.x 的内部结构，缺失时退回逐键读取
+    from diskcache.core import EVICTION_POLICY
+except ImportError:
+    EVICTION_POLICY = None
+
+try:  # Windows 上没有 fcntl，版本号只在进程内串行递增
+    import fcntl
+except ImportError:
+    fcntl = None
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -21,26 +56,314 @@ with open(CACHE_CONFIG, "r", encoding="utf-8") as f:
     CACHE_DIRS = json.load(f)
 
 
+# 内存层中用于区分“未命中”与“缓存值为 None”的哨兵对象
+_MISSING = object()
+
+# SQLite 单条语句的参数个数上限（旧版本为 999），批量查询按此分段
+_SQL_BATCH = 500
+
+
+def _key_bytes(key: Any) -> bytes:
+    """将缓存键转换为稳定的字节串（用于跨进程一致的槽位哈希）"""
+    if isinstance(key, bytes):
+        return key
+    if isinstance(key, str):
+        return key.encode("utf-8")
+    return repr(key).encode("utf-8")
+
+
+def _sizeof(value: Any) -> int:
+    """估算缓存值占用的字节数（用于内存层的字节上限）"""
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def _canonical_default(obj: Any) -> Any:
+    """
+    将 JSON 不支持的对象转换为稳定的可序列化形式。
+
+    其他类型抛出 TypeError：默认的 repr 可能包含内存地址（如
+    `<Foo object at 0x...>`），据此生成的键在不同 worker 与重启之间不一致。
+    """
+    if hasattr(obj, "tolist"):  # numpy 数组与标量
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=repr)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.hex()
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID, PurePath)):
+        return str(obj)
+    raise TypeError(
+        f"Cannot derive a stable cache key from {type(obj).__name__} objects"
+    )
+
+
+def _canonical_bytes(item: Any) -> bytes:
+    """对输入做规范化序列化（字典按键排序、紧凑分隔符）"""
+    if orjson is not None:
+        try:
+            return b"oj" + orjson.dumps(
+                item,
+                default=_canonical_default,
+                option=orjson.OPT_SORT_KEYS
+                | orjson.OPT_SERIALIZE_NUMPY
+                | orjson.OPT_NON_STR_KEYS,
+            )
+        except TypeError:
+            pass
+    return b"js" + json.dumps(
+        item,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=_canonical_default,
+    ).encode("utf-8")
+
+
+def content_key(namespace: str, item: Any) -> str:
+    """
+    生成内容寻址的缓存键，在不同 worker 进程与重启之间保持稳定。
+
+    与 Python 内置 `hash()` 不同，键只取决于输入内容：先做规范化序列化，
+    再计算非加密摘要（安装了 xxhash 时使用 xxh3-128，否则使用 blake2b）。
+
+    Args:
+        namespace (str): 键前缀，通常为模型名称。
+        item (Any): 预测输入。
+
+    Returns:
+        str: 形如 `<namespace>:<算法>:<摘要>` 的缓存键。
+
+    Raises:
+        TypeError: 输入中含有无法稳定序列化的对象。
+    """
+    payload = _canonical_bytes(item)
+    if xxhash is not None:
+        return f"{namespace}:xxh3:{xxhash.xxh3_128_hexdigest(payload)}"
+    return f"{namespace}:b2:{hashlib.blake2b(payload, digest_size=16).hexdigest()}"
+
+
+# 同一进程内所有版本表共用的递增锁（同一文件可能被多个 ModelCache 映射）
+_BUMP_LOCK = threading.Lock()
+
+
+class _VersionTable:
+    """
+    跨进程共享的失效版本表。
+
+    表存放在缓存目录下的一个小文件中，通过 mmap 映射，所有共享同一
+    `dbs/<db_name>` 目录的 gunicorn worker 看到的是同一份页缓存。
+    文件头 8 字节为全局代数（clear 时递增），其后为按键哈希分桶的
+    64 位计数器（写入/删除对应键时递增）。读取只是一次内存访问；
+    递增在进程内锁与文件的 fcntl 记录锁下完成，多个写入方不会得到同一个版本号。
+    """
+
+    FILENAME = "memory_tier.versions"
+
+    def __init__(self, cache_dir: str, slots: int = 4096):
+        self.slots = slots
+        size = 8 * (slots + 1)
+        path = os.path.join(cache_dir, self.FILENAME)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        except BaseException:
+            os.close(fd)
+            raise
+        # 保持打开：fcntl 记录锁属于进程，关闭该文件的任一描述符都会释放锁
+        self._fd = fd
+
+    def _offset(self, key: Any) -> int:
+        return 8 * (1 + zlib.crc32(_key_bytes(key)) % self.slots)
+
+    def read(self, key: Any) -> Tuple[int, int]:
+        """返回 (全局代数, 键所在槽位的版本号)"""
+        return (
+            struct.unpack_from("<Q", self._mm, 0)[0],
+            struct.unpack_from("<Q", self._mm, self._offset(key))[0],
+        )
+
+    @contextmanager
+    def _locked(self, offset: int):
+        """对槽位做原子的读-改-写：进程内的线程之间用锁，进程之间用 fcntl 记录锁"""
+        with _BUMP_LOCK:
+            if fcntl is None:
+                yield
+                return
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 8, offset)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 8, offset)
+
+    def bump(self, key: Any) -> Tuple[int, int]:
+        """原子地递增键所在槽位的版本号"""
+        offset = self._offset(key)
+        with self._locked(offset):
+            version = struct.unpack_from("<Q", self._mm, offset)[0] + 1
+            struct.pack_into("<Q", self._mm, offset, version)
+        return struct.unpack_from("<Q", self._mm, 0)[0], version
+
+    def bump_all(self):
+        """原子地递增全局代数，使所有进程的内存层整体失效"""
+        with self._locked(0):
+            generation = struct.unpack_from("<Q", self._mm, 0)[0] + 1
+            struct.pack_into("<Q", self._mm, 0, generation)
+
+
+# 当前进程中的全部内存层，fork 后在子进程中重置其锁
+_MEMORY_TIERS: "weakref.WeakSet[_MemoryTier]" = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    """fork 时其他线程可能正持有锁，子进程中换用新锁并丢弃父进程的统计"""
+    global _BUMP_LOCK
+    _BUMP_LOCK = threading.Lock()
+    for tier in list(_MEMORY_TIERS):
+        tier._lock = threading.Lock()
+        tier.hits = tier.misses = tier.evictions = tier.invalidations = 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class _MemoryTier:
+    """进程内 LRU 层，同时按条目数和字节数限制大小"""
+
+    def __init__(self, max_items: int, max_bytes: int):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        # key -> (value, nbytes, version, expire_at)
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        _MEMORY_TIERS.add(self)
+
+    def get(self, key: Any, version: Tuple[int, int]) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            value, nbytes, cached_version, expire_at = entry
+            if cached_version != version or (
+                expire_at is not None and expire_at <= time.time()
+            ):
+                # 其他进程已写入该键（或已过期），丢弃本地副本
+                del self._data[key]
+                self._bytes -= nbytes
+                self.invalidations += 1
+                self.misses += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(
+        self,
+        key: Any,
+        value: Any,
+        version: Tuple[int, int],
+        expire_at: Optional[float] = None,
+    ):
+        nbytes = _sizeof(value)
+        if nbytes > self.max_bytes:
+            self.discard(key)
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, nbytes, version, expire_at)
+            self._bytes += nbytes
+            while len(self._data) > self.max_items or self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= evicted[1]
+                self.evictions += 1
+
+    def discard(self, key: Any):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "items": len(self._data),
+                "bytes": self._bytes,
+                "max_items": self.max_items,
+                "max_bytes": self.max_bytes,
+            }
+
+
 class ModelCache:
-    def __init__(self, cache_dir: str, size_limit: int = int(100e9), **kwargs):
+    def __init__(
+        self,
+        cache_dir: str,
+        size_limit: int = int(100e9),
+        memory_max_items: int = 0,
+        memory_max_bytes: int = 64 * 1024**2,
+        **kwargs,
+    ):
         """
         初始化缓存实例。
 
         Args:
             cache_dir (str): 缓存目录路径。
             size_limit (int): 缓存大小限制，默认为 1GB。
+            memory_max_items (int): 进程内 LRU 层的最大条目数，0 表示不启用。
+            memory_max_bytes (int): 进程内 LRU 层的最大字节数，默认为 64MB。
             **kwargs: 传递给 `diskcache.Cache` 的其他参数。
+
+        启用内存层后，读取优先命中进程内字典，写入同时落盘（write-through），
+        并通过 `_VersionTable` 通知共享同一目录的其他 worker 失效本地副本。
+        内存层直接返回缓存对象本身，调用方修改取出的对象后应重新 `set`。
         """
         self.cache = Cache(cache_dir, size_limit=size_limit, **kwargs)
-        logger.info(f"初始化缓存，目录: {cache_dir}，大小限制: {size_limit} bytes")
-        
+        self._memory: Optional[_MemoryTier] = None
+        self._versions: Optional[_VersionTable] = None
+        self._batch_supported = True
+        if memory_max_items > 0:
+            self._memory = _MemoryTier(memory_max_items, memory_max_bytes)
+            self._versions = _VersionTable(cache_dir)
+        logger.info(
+            f"初始化缓存，目录: {cache_dir}，大小限制: {size_limit} bytes，"
+            f"内存层: {memory_max_items} 条 / {memory_max_bytes} bytes"
+        )
+
     def __setitem__(self, key: str, value: Any):
         """支持 model_db[key] = value 语法"""
-        self.cache.set(key, value)
+        self.set(key, value)
 
     def __getitem__(self, key: str) -> Any:
         """支持 value = model_db[key] 语法"""
-        value = self.cache.get(key)
+        value = self.get(key)
         if value is None:
             raise KeyError(f"Key '{key}' not found in cache")
         return value
@@ -55,7 +378,20 @@ class ModelCache:
         Returns:
             Optional[Any]: 如果键存在则返回对应的值，否则返回 None。
         """
-        value = self.cache.get(key, defu)
+        if self._memory is None:
+            return self.cache.get(key, defu)
+
+        # 先读版本再读磁盘：写入方在事务提交之后还会再递增一次版本，
+        # 读取期间提交的写入必然使这里读到的版本失效
+        version = self._versions.read(key)
+        value = self._memory.get(key, version)
+        if value is not _MISSING:
+            return value
+
+        value, expire_at = self.cache.get(key, _MISSING, expire_time=True)
+        if value is _MISSING:
+            return defu
+        self._memory.put(key, value, version, expire_at)
         # logger.debug(f"从缓存中获取键 '{key}'，值: {value}")
         return value
 
@@ -68,14 +404,233 @@ class ModelCache:
             value (Any): 要缓存的值。
             expire (int): 缓存过期时间（秒），默认为 1 小时。
         """
-        self.cache.set(key, value, expire=expire)
+        if self._memory is None:
+            self.cache.set(key, value, expire=expire)
+            return
+
+        with self.cache.transact():
+            self.cache.set(key, value, expire=expire)
+            staged = self._versions.bump(key)
+        version = self._settle(key, staged)
+        if version is None:
+            self._memory.discard(key)
+            return
+        expire_at = time.time() + expire if expire is not None else None
+        self._memory.put(key, value, version, expire_at)
         # logger.debug(f"将键 '{key}' 存储到缓存中，值: {value}，过期时间: {expire} 秒")
 
+    def get_many(self, keys: Iterable[str], defu=None) -> List[Any]:
+        """
+        批量从缓存中获取值，结果顺序与传入的键一致。
+
+        Args:
+            keys (Iterable[str]): 缓存的键。
+            defu: 键不存在时的返回值，默认为 None。传入哨兵对象即可区分
+                “未命中”与“缓存值为 None”。
+
+        Returns:
+            List[Any]: 与 `keys` 一一对应的值列表。
+        """
+        keys = list(keys)
+        results = [_MISSING] * len(keys)
+        versions = None
+        if self._memory is not None:
+            versions = [self._versions.read(key) for key in keys]
+            for i, key in enumerate(keys):
+                results[i] = self._memory.get(key, versions[i])
+
+        pending = [i for i, value in enumerate(results) if value is _MISSING]
+        if pending:
+            fetched = self._fetch_many({keys[i] for i in pending})
+            for i in pending:
+                found = fetched.get(keys[i])
+                if found is None:
+                    continue
+                value, expire_at = found
+                results[i] = value
+                if versions is not None:
+                    self._memory.put(keys[i], value, versions[i], expire_at)
+
+        return [defu if value is _MISSING else value for value in results]
+
+    def _fetch_many(self, keys: Iterable[str]) -> Dict[str, Tuple[Any, Any]]:
+        """
+        从 diskcache 批量读取，每 `_SQL_BATCH` 个键一次 SQLite 查询。
+
+        批量查询直接使用 diskcache 5.x 的内部接口（`_sql`、`_disk` 与 Cache 表结构）；
+        这些接口缺失或查询失败时，退回到公开的逐键 `get`。
+
+        Returns:
+            Dict[str, Tuple[Any, Any]]: 命中的键到 (值, 过期时间) 的映射。
+        """
+        keys = list(keys)
+        if self._batched_reads():
+            try:
+                return self._fetch_batched(keys)
+            except (sqlite3.OperationalError, AttributeError) as e:
+                logger.warning(f"批量读取失败，改为逐键读取: {e}")
+                self._batch_supported = False
+        return self._fetch_each(keys)
+
+    def _batched_reads(self) -> bool:
+        """是否可以绕过 diskcache 的逐键读取路径做批量查询"""
+        cache = self.cache
+        if not self._batch_supported or EVICTION_POLICY is None:
+            return False
+        if not (hasattr(cache, "_sql") and hasattr(cache, "_disk")):
+            return False
+        # 需要在读取时更新统计/访问时间的策略，只能逐键走 diskcache 的事务路径
+        policy = EVICTION_POLICY.get(cache.eviction_policy)
+        return not cache.statistics and policy is not None and not policy["get"]
+
+    def _fetch_each(self, keys: List[str]) -> Dict[str, Tuple[Any, Any]]:
+        """在一个事务中逐键调用 diskcache 的公开接口读取"""
+        cache = self.cache
+        found = {}
+        with cache.transact():
+            for key in keys:
+                value, expire_at = cache.get(key, _MISSING, expire_time=True)
+                if value is not _MISSING:
+                    found[key] = (value, expire_at)
+        return found
+
+    def _fetch_batched(self, keys: List[str]) -> Dict[str, Tuple[Any, Any]]:
+        """用 `WHERE key IN (...)` 分段查询 diskcache 的 Cache 表"""
+        cache = self.cache
+        found = {}
+        disk = cache._disk
+        lookup = {}
+        for key in keys:
+            db_key, raw = disk.put(key)
+            if isinstance(db_key, memoryview):
+                db_key = bytes(db_key)
+            lookup[(db_key, bool(raw))] = key
+
+        db_keys = [db_key for db_key, _ in lookup]
+        for start in range(0, len(db_keys), _SQL_BATCH):
+            chunk = db_keys[start : start + _SQL_BATCH]
+            select = (
+                "SELECT key, raw, expire_time, mode, filename, value"
+                f" FROM Cache WHERE key IN ({','.join('?' * len(chunk))})"
+                " AND (expire_time IS NULL OR expire_time > ?)"
+            )
+            rows = cache._sql(select, (*chunk, time.time())).fetchall()
+            for db_key, raw, expire_at, mode, filename, db_value in rows:
+                key = lookup.get((db_key, bool(raw)), _MISSING)
+                if key is _MISSING:
+                    continue
+                try:
+                    value = disk.fetch(mode, filename, db_value, False)
+                except IOError:
+                    # 读取期间该键已被其他进程删除
+                    continue
+                found[key] = (value, expire_at)
+        return found
+
+    def set_many(self, mapping: Mapping[str, Any], expire: int = None):
+        """
+        在同一个 SQLite 事务中批量写入缓存。
+
+        Args:
+            mapping (Mapping[str, Any]): 键到值的映射。
+            expire (int): 缓存过期时间（秒），默认不过期。
+        """
+        items = list(mapping.items())
+        if not items:
+            return
+
+        staged = {}
+        with self.cache.transact():
+            for key, value in items:
+                self.cache.set(key, value, expire=expire)
+                if self._memory is not None:
+                    staged[key] = self._versions.bump(key)
+
+        if self._memory is not None:
+            expire_at = time.time() + expire if expire is not None else None
+            for key, value in items:
+                version = self._settle(key, staged[key])
+                if version is None:
+                    self._memory.discard(key)
+                else:
+                    self._memory.put(key, value, version, expire_at)
+
+    def delete(self, key: str) -> bool:
+        """
+        从缓存中删除键。
+
+        Args:
+            key (str): 缓存的键。
+
+        Returns:
+            bool: 键存在并被删除时返回 True。
+        """
+        if self._memory is None:
+            return self.cache.delete(key)
+
+        deleted = self.cache.delete(key)
+        # 提交之后再递增，使其他进程在删除前读到的副本失效
+        self._versions.bump(key)
+        self._memory.discard(key)
+        return deleted
+
+    def _settle(self, key: str, staged: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """
+        写入提交之后再次递增键的版本号。
+
+        事务内的递增与写入一起串行，提交后的递增则让提交前读取了版本号的
+        读者失效。两次递增之间若有其他写入方递增（其写入可能晚于本次提交），
+        返回 None，调用方不应把本次写入的值放入内存层。
+
+        Returns:
+            Optional[Tuple[int, int]]: 可用于内存层的版本，或 None。
+        """
+        version = self._versions.bump(key)
+        if version == (staged[0], staged[1] + 1):
+            return version
+        return None
+
+    @contextmanager
+    def transact(self):
+        """
+        在一个 SQLite 事务中执行多次读写（可嵌套）。
+
+        事务期间其他进程的写入会被阻塞，应尽量保持简短。
+        """
+        with self.cache.transact():
+            yield
+
     def clear(self):
         """清空缓存。"""
-        self.cache.clear()
+        if self._memory is not None:
+            self.cache.clear()
+            # 提交之后再递增全局代数，使清空前读到的副本全部失效
+            self._versions.bump_all()
+            self._memory.clear()
+        else:
+            self.cache.clear()
         logger.info("缓存已清空")
 
+    def close(self):
+        """
+        关闭当前进程持有的 SQLite 连接。
+
+        在 gunicorn --preload 的 master 中 fork 前调用，避免 worker 继承同一个
+        连接；之后的任何读写都会在所在进程中自动重新打开连接。
+        """
+        self.cache.close()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        返回内存层的命中、未命中、淘汰与失效计数。
+
+        Returns:
+            Dict[str, int]: 未启用内存层时返回空字典。
+        """
+        if self._memory is None:
+            return {}
+        return self._memory.stats()
+
 
 def find_directory_from_fragment(fragment: str) -> Optional[str]:
     """
@@ -130,6 +685,7 @@ def make(
     model_version: Optional[str] = None,
     default_version: str = "0.0",  # 允许配置默认版本
     use_sys_path=True,
+    **cache_kwargs,
 ) -> Optional[ModelCache]:
     """
     优化后的缓存创建函数，支持更健壮的路径处理和错误反馈
@@ -140,6 +696,7 @@ def make(
         db_name: 数据库名称
         model_version: 模型版本 (可选)
         default_version: 默认版本号 (从配置读取更佳)
+        **cache_kwargs: 传递给 `ModelCache` 的参数 (如 memory_max_items)
 
     Returns:
         ModelCache 实例或 None
@@ -161,7 +718,7 @@ def make(
             cache_dir.mkdir(parents=True, exist_ok=True)
             logger.info(f"已创建缓存目录: {cache_dir}")
 
-            return ModelCache(cache_dir=str(cache_dir))
+            return ModelCache(cache_dir=str(cache_dir), **cache_kwargs)
 
         # 场景1: 有明确版本号时
         if model_version:
@@ -194,7 +751,7 @@ def make(
         cache_dir.mkdir(parents=True, exist_ok=True)
         logger.info(f"已创建缓存目录: {cache_dir}")
 
-        return ModelCache(cache_dir=str(cache_dir))
+        return ModelCache(cache_dir=str(cache_dir), **cache_kwargs)
 
     except Exception as e:
         logger.error(f"创建缓存失败: {str(e)}", exc_info=True)
@@ -1,8 +1,14 @@
+import gc
 import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Type, Any, List, Optional
+from typing import Dict, Type, Any, List, Optional, Tuple
 from .model import Model
-from .cache import ModelCache
+from .cache import ModelCache, content_key
 from optiflux.utils.config_loader import load_config
 
 # 配置日志
@@ -14,6 +20,9 @@ logging.basicConfig(
 
 logger = logging.getLogger("optiflux.ModelLibrary")
 
+# 区分“缓存未命中”与“缓存结果为 None”的哨兵对象
+_MISSING = object()
+
 
 class ModelLibrary:
     """模型库：集中管理模型配置和实例"""
@@ -23,19 +32,39 @@ class ModelLibrary:
         models: Dict[str, Type[Model]],
         config_path: Optional[str] = None,
         cache_dir: str = "optiflux_cache",
+        load_workers: Optional[int] = None,
+        lazy: bool = False,
+        warmup: bool = False,
         **cache_kwargs,
     ):
         """
         :param models: 模型名称到模型类的映射
         :param config_path: 配置文件路径（可选）
+        :param load_workers: 同一依赖层内并发加载的线程数（默认由线程池决定，1 为串行）
+        :param lazy: 惰性模式，模型（及其依赖）在首次 get_model 时才加载
+        :param warmup: 惰性模式下启动后在后台线程中预热全部模型
         """
         logger.info("Initializing ModelLibrary...")
         self.models = models
+        self.load_workers = load_workers
+        self.lazy = lazy
         # 加载配置并填充默认值
         self.config = self._load_config_with_defaults(config_path)
         self.cache = ModelCache(cache_dir, **cache_kwargs)
         self._model_instances: Dict[str, Model] = {}
-        self._initialize_models()
+        self.load_times: Dict[str, float] = {}  # 每个模型 load() 的耗时（秒）
+        # 每个模型一把锁：并发的首次调用只触发一次加载
+        self._load_locks = {name: threading.Lock() for name in models}
+        self._worker_pid: Optional[int] = None  # 已执行 on_worker_start 的进程
+        self._preloaded = False  # 是否已执行过 preload
+        self._worker_started: set = set()  # 本进程中已调用过 on_worker_start 的模型
+        self._levels = self._dependency_levels()
+        if lazy:
+            logger.info(f"Lazy mode: {len(models)} models will load on first use.")
+            if warmup:
+                self.warmup()
+        else:
+            self._initialize_models()
         logger.info("ModelLibrary initialized successfully.")
 
     def _load_config_with_defaults(self, config_path: Optional[str]) -> Dict[str, dict]:
@@ -62,81 +91,238 @@ class ModelLibrary:
 
         return final_config
 
-    # core/library.py
+    def _dependency_levels(self) -> List[List[str]]:
+        """按依赖关系把模型分层（拓扑排序），同一层内的模型互不依赖"""
+        deps = {
+            name: list(dict.fromkeys(getattr(cls, "depends", [])))
+            for name, cls in self.models.items()
+        }
+        dependents: Dict[str, List[str]] = {name: [] for name in deps}
+        for name, model_deps in deps.items():
+            unknown = [dep for dep in model_deps if dep not in deps]
+            if unknown:
+                raise RuntimeError(
+                    f"Model {name} depends on unknown models: {unknown}"
+                )
+            for dep in model_deps:
+                dependents[dep].append(name)
+
+        indegree = {name: len(model_deps) for name, model_deps in deps.items()}
+        level = [name for name, degree in indegree.items() if degree == 0]
+        levels = []
+        while level:
+            levels.append(level)
+            next_level = []
+            for name in level:
+                for dependent in dependents[name]:
+                    indegree[dependent] -= 1
+                    if indegree[dependent] == 0:
+                        next_level.append(dependent)
+            level = next_level
+
+        if sum(len(level) for level in levels) < len(deps):
+            remaining = {name for name, degree in indegree.items() if degree > 0}
+            cycle = self._find_cycle(remaining, deps)
+            raise RuntimeError(
+                f"Circular dependency detected in models: {' -> '.join(cycle)}"
+            )
+        return levels
+
+    @staticmethod
+    def _find_cycle(nodes: set, deps: Dict[str, List[str]]) -> List[str]:
+        """在剩余节点中找出一条具体的依赖环（首尾为同一模型）"""
+        visited = set()
+        for start in nodes:
+            if start in visited:
+                continue
+            path: List[str] = []
+            on_path: Dict[str, int] = {}
+            stack: List[Tuple[str, int]] = [(start, 0)]
+            while stack:
+                node, index = stack.pop()
+                if index == 0:
+                    visited.add(node)
+                    on_path[node] = len(path)
+                    path.append(node)
+                children = [dep for dep in deps[node] if dep in nodes]
+                if index < len(children):
+                    stack.append((node, index + 1))
+                    child = children[index]
+                    if child in on_path:
+                        return path[on_path[child] :] + [child]
+                    if child not in visited:
+                        stack.append((child, 0))
+                else:
+                    path.pop()
+                    del on_path[node]
+        return sorted(nodes)
+
+    def _instantiate(self, model_name: str) -> Model:
+        """实例化单个模型、注入依赖并调用 load()（依赖必须已加载）"""
+        model_cls = self.models[model_name]
+        logger.info(f"Loading model: {model_name}")
+        start = time.perf_counter()
+        instance = model_cls(self.config.get(model_name, {}))
+
+        # 注入依赖模型
+        for dep_name in getattr(model_cls, "depends", []):
+            instance.add_dependency(dep_name, self._model_instances[dep_name])
+
+        instance.load()
+        self.load_times[model_name] = time.perf_counter() - start
+        logger.info(
+            f"Model {model_name} loaded successfully "
+            f"in {self.load_times[model_name]:.3f}s."
+        )
+        return instance
+
     def _initialize_models(self):
-        """初始化模型实例（确保依赖模型先加载）"""
+        """初始化模型实例：按依赖层依次加载，同一层内的模型并发加载"""
         logger.info(f"Loading {len(self.models)} models...")
+        start = time.perf_counter()
+
+        for level in self._levels:
+            if len(level) == 1 or self.load_workers == 1:
+                for model_name in level:
+                    self._model_instances[model_name] = self._instantiate(model_name)
+                continue
+
+            with ThreadPoolExecutor(
+                max_workers=self.load_workers, thread_name_prefix="optiflux-load"
+            ) as pool:
+                futures = {
+                    model_name: pool.submit(self._instantiate, model_name)
+                    for model_name in level
+                }
+                for model_name, future in futures.items():
+                    self._model_instances[model_name] = future.result()
+
+        logger.info(
+            f"All models loaded in {time.perf_counter() - start:.3f}s: "
+            + ", ".join(
+                f"{name}={seconds:.3f}s"
+                for name, seconds in sorted(
+                    self.load_times.items(), key=lambda item: -item[1]
+                )
+            )
+        )
+
+    def _ensure_loaded(self, name: str) -> Model:
+        """惰性加载模型及其 depends 链；同一模型的并发调用者等待同一次加载"""
+        instance = self._model_instances.get(name)
+        if instance is not None:
+            return instance
+
+        # 依赖在各自的锁内加载，不嵌套持锁（依赖图无环，不会死锁）
+        for dep_name in getattr(self.models[name], "depends", []):
+            self._ensure_loaded(dep_name)
+
+        with self._load_locks[name]:
+            instance = self._model_instances.get(name)
+            if instance is None:
+                instance = self._instantiate(name)
+                if self._worker_pid == os.getpid():
+                    # worker 启动后才惰性加载的模型，补调 worker 级初始化
+                    self._start_worker_model(name, instance)
+                self._model_instances[name] = instance
+        return instance
+
+    def _start_worker_model(self, name: str, instance: Model):
+        """调用模型的 on_worker_start（调用方需持有该模型的加载锁）"""
+        if name not in self._worker_started:
+            instance.on_worker_start()
+            self._worker_started.add(name)
+
+    def preload(self):
+        """
+        fork 前的预加载阶段（gunicorn --preload 的 master 中调用）。
 
-        # 按依赖顺序加载模型
-        loaded_models = set()
-        while len(loaded_models) < len(self.models):
-            progress = False  # 标记本轮是否有模型加载
-            for model_name, model_cls in self.models.items():
-                if model_name in loaded_models:
-                    continue  # 已加载的模型跳过
-
-                # 检查依赖是否已加载
-                dependencies = getattr(model_cls, "depends", [])
-                if all(dep in loaded_models for dep in dependencies):
-                    logger.info(f"Loading model: {model_name}")
-                    config = self.config.get(model_name, {})
-                    instance = model_cls(config)
-
-                    # 注入依赖模型
-                    for dep_name in dependencies:
-                        instance.add_dependency(
-                            dep_name, self._model_instances[dep_name]
-                        )
-
-                    instance.load()
-                    self._model_instances[model_name] = instance
-                    loaded_models.add(model_name)
-                    progress = True  # 标记本轮有模型加载
-                    logger.info(f"Model {model_name} loaded successfully.")
-                else:
-                    missing_deps = [
-                        dep for dep in dependencies if dep not in loaded_models
-                    ]
-                    logger.warning(
-                        f"Model {model_name} is waiting for dependencies: {missing_deps}"
-                    )
-
-            # 如果本轮没有模型加载，说明存在循环依赖
-            if not progress:
-                raise RuntimeError("Circular dependency detected in models.")
+        加载全部尚未加载的模型，关闭缓存的 SQLite 连接，并把现存对象移出
+        GC 追踪范围，避免 worker 中的垃圾回收写入这些页面而触发写时复制。
+        """
+        self._preloaded = True
+        self.warmup(background=False)
+        self.cache.close()
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+        logger.info(f"Preloaded {len(self._model_instances)} models before fork.")
+
+    def preload_on_fork(self):
+        """
+        在当前进程第一次 fork 前执行 preload（只执行一次）。
 
-        logger.info("All models loaded.")
+        gunicorn --preload 时 master 导入应用后 fork 出 worker，preload 在此时执行；
+        不经过 fork 的场景（uvicorn 直接运行、不带 --preload 时在 worker 中导入应用）
+        不会执行，因而不会冻结 GC 或关闭缓存连接。
+        """
+        if not hasattr(os, "register_at_fork"):
+            return
+        ref = weakref.ref(self)
 
-    def _load_model(self, model_name: str, initialized: set):
-        """递归加载模型及其依赖"""
-        model_cls = self.models[model_name]
-        deps = getattr(model_cls, "dependencies", [])
+        def _before_fork():
+            lib = ref()
+            if lib is not None and not lib._preloaded:
+                lib.preload()
 
-        # 先加载依赖
-        for dep in deps:
-            if dep not in initialized:
-                self._load_model(dep, initialized)
+        os.register_at_fork(before=_before_fork)
 
-        # 实例化当前模型
-        if model_name not in self.config:
-            raise ValueError(f"Missing config for {model_name}")
+    def on_worker_start(self):
+        """
+        fork 后的 worker 阶段：按依赖顺序调用已加载模型的 `on_worker_start`。
 
-        instance = model_cls(self.config[model_name])
+        每个进程只执行一次；不经过 fork 的场景也可直接调用。
+        """
+        if self._worker_pid == os.getpid():
+            return
+        self._worker_started = set()
+        self._worker_pid = os.getpid()
+        for level in self._levels:
+            for model_name in level:
+                with self._load_locks[model_name]:
+                    instance = self._model_instances.get(model_name)
+                    if instance is not None:
+                        self._start_worker_model(model_name, instance)
+        logger.info(f"Worker {self._worker_pid} started.")
+
+    def warmup(self, background: bool = True) -> Optional[threading.Thread]:
+        """
+        按依赖层顺序加载所有尚未加载的模型。
 
-        # 注入依赖
-        for dep in deps:
-            instance.add_dependency(dep, self._model_instances[dep])
+        :param background: 在后台守护线程中执行并返回该线程，否则阻塞至完成
+        """
 
-        instance.load()
-        self._model_instances[model_name] = instance
-        initialized.add(model_name)
+        def _run():
+            start = time.perf_counter()
+            for level in self._levels:
+                for model_name in level:
+                    try:
+                        self._ensure_loaded(model_name)
+                    except Exception as e:
+                        # 预热失败不影响服务，首次请求时会再次尝试加载
+                        logger.error(f"Warm-up failed for model {model_name}: {e}")
+            logger.info(f"Warm-up finished in {time.perf_counter() - start:.3f}s.")
+
+        if not background:
+            _run()
+            return None
+        thread = threading.Thread(target=_run, name="optiflux-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def is_loaded(self, name: str) -> bool:
+        """模型是否已加载（惰性模式下 get_model 可能触发加载）"""
+        return name in self._model_instances
 
     def get_model(self, name: str) -> Model:
-        """获取已加载的模型实例"""
-        if name not in self._model_instances:
-            logger.error(f"Model {name} not found in library")
-            raise KeyError(f"Model {name} not loaded")
-        return self._model_instances[name]
+        """获取模型实例（惰性模式下首次调用时加载）"""
+        instance = self._model_instances.get(name)
+        if instance is not None:
+            return instance
+        if self.lazy and name in self.models:
+            return self._ensure_loaded(name)
+        logger.error(f"Model {name} not found in library")
+        raise KeyError(f"Model {name} not loaded")
 
     def predict(
         self,
@@ -147,9 +333,16 @@ class ModelLibrary:
         **kwargs,
     ) -> Any:
         """Execute prediction with dynamic input handling."""
+        if use_cache and cache_key is None:
+            try:
+                cache_key = content_key(model_name, [list(args), kwargs])
+            except TypeError as e:
+                # 输入无法生成稳定的键时本次不使用缓存
+                logger.debug(f"Skipping cache for {model_name}: {e}")
+                use_cache = False
         if use_cache:
-            cached_result = self.cache.get(cache_key)
-            if cached_result is not None:
+            cached_result = self.cache.get(cache_key, _MISSING)
+            if cached_result is not _MISSING:
                 return cached_result
 
         # Get the model instance
@@ -158,7 +351,7 @@ class ModelLibrary:
         # Pass the first argument as input_data
         result = model._predict(*args, **kwargs)
 
-        if use_cache and cache_key:
+        if use_cache:
             self.cache.set(cache_key, result)
 
         return result
@@ -171,47 +364,57 @@ class ModelLibrary:
         use_cache: bool = True,
         **kwargs,
     ) -> List[Any]:
-        """Execute batch prediction with dynamic input handling."""
+        """Execute batch prediction with dynamic input handling.
+
+        Cache keys default to content-addressed digests of each item together
+        with ``kwargs``, so they are identical across worker processes and
+        restarts, and calls that differ only in keyword arguments (e.g.
+        ``top_k``) never share results. Cached ``None``
+        results count as hits; misses are predicted in one ``_predict_batch``
+        call and written back in a single transaction.
+        """
         model = self.get_model(model_name)
+        items = list(args[0])
 
         # Generate default cache keys
         if cache_keys is None and use_cache:
-            cache_keys = [f"{model_name}_{hash(str(item))}" for item in args[0]]
-
-        results = []
+            try:
+                cache_keys = [
+                    content_key(model_name, [item, kwargs]) for item in items
+                ]
+            except TypeError as e:
+                # 输入无法生成稳定的键时本次不使用缓存
+                logger.debug(f"Skipping cache for {model_name}: {e}")
+                use_cache = False
 
         # Try to fetch cached results
-        cached_results = []
         if use_cache and cache_keys:
-            cached_results = [self.cache.get(key) for key in cache_keys]
+            results = self.cache.get_many(cache_keys, _MISSING)
         else:
-            cached_results = [None] * len(args[0])
+            results = [_MISSING] * len(items)
 
         # Identify indices that need prediction
         need_predict_indices = [
-            i for i, val in enumerate(cached_results) if val is None
+            i for i, val in enumerate(results) if val is _MISSING
         ]
-        need_predict_items = [args[0][i] for i in need_predict_indices]
 
-        if need_predict_items:
+        if need_predict_indices:
             # Execute batch prediction
-            new_results = model._predict_batch(need_predict_items, **kwargs)
+            new_results = model._predict_batch(
+                [items[i] for i in need_predict_indices], **kwargs
+            )
 
             # Store new results in cache
             if use_cache and cache_keys:
-                with self.cache.transact():
-                    for idx, result in zip(need_predict_indices, new_results):
-                        self.cache.set(cache_keys[idx], result)
+                self.cache.set_many(
+                    {
+                        cache_keys[idx]: result
+                        for idx, result in zip(need_predict_indices, new_results)
+                    }
+                )
 
             # Merge results
-            result_ptr = 0
-            for i in range(len(args[0])):
-                if cached_results[i] is not None:
-                    results.append(cached_results[i])
-                else:
-                    results.append(new_results[result_ptr])
-                    result_ptr += 1
-        else:
-            results = cached_results
+            for idx, result in zip(need_predict_indices, new_results):
+                results[idx] = result
 
         return results
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List
+import asyncio
 import logging
 
 # 配置日志
@@ -26,12 +27,44 @@ class Model(ABC):
 
     @abstractmethod
     def load(self):
+        """加载权重等只读数据（在 gunicorn --preload 的 master 中执行，fork 后由 worker 共享）"""
         pass
 
-    @abstractmethod
-    def _predict(self, input_data: Any) -> Any:
+    def on_worker_start(self):
+        """每个 worker 进程启动后调用一次：在此创建连接、线程池等不能跨 fork 共享的资源"""
         pass
 
+    def _predict(self, input_data: Any) -> Any:
+        """单条预测（同步模型必须重写；异步模型重写 `_apredict` 即可）"""
+        raise NotImplementedError(
+            f"{type(self).__name__} must implement _predict or _apredict"
+        )
+
     def _predict_batch(self, inputs: List[Any]) -> List[Any]:
         """批量预测（默认实现为循环调用单条预测，可重写优化）"""
         return [self._predict(item) for item in inputs]
+
+    async def _apredict(self, input_data: Any) -> Any:
+        """
+        异步单条预测（I/O 型模型可重写）。
+        默认：只重写了 `_apredict_batch` 时按一条的批量调用，否则在线程池中调用 `_predict`
+        """
+        if type(self)._apredict_batch is not Model._apredict_batch:
+            return (await self._apredict_batch([input_data]))[0]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._predict, input_data)
+
+    async def _apredict_batch(self, inputs: List[Any]) -> List[Any]:
+        """异步批量预测（异步模型默认并发调用 `_apredict`，否则在线程池中调用 `_predict_batch`）"""
+        if type(self).is_async():
+            return list(await asyncio.gather(*(self._apredict(x) for x in inputs)))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._predict_batch, inputs)
+
+    @classmethod
+    def is_async(cls) -> bool:
+        """子类重写了 `_apredict` 或 `_apredict_batch` 即视为异步模型"""
+        return (
+            cls._apredict is not Model._apredict
+            or cls._apredict_batch is not Model._apredict_batch
+        )
@@ -0,0 +1,544 @@
+import ctypes
+import ctypes.util
+import errno
+import json
+import logging
+import os
+import select
+import struct
+import tempfile
+import threading
+import time
+
+try:  # Windows 上没有 fcntl，每个进程各自监听
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from ..config import ENV_DIRS, META_DB_DIR
+
+# 配置日志
+logger = logging.getLogger("optiflux.DirectoryWatcher")
+
+# inotify 常量（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+
+_WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_inotify():
+    """通过 ctypes 加载 libc 的 inotify 接口，不可用时返回 None"""
+    if not hasattr(os, "O_CLOEXEC"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def _walk_size(directory):
+    """直接遍历目录树统计大小（监听数据不可用时的回退方式）"""
+    total = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class _Dir:
+    """单个目录的聚合信息"""
+
+    __slots__ = ("files", "subdirs", "own_size", "tree_size", "mtime", "tree_mtime")
+
+    def __init__(self, mtime):
+        self.files = {}  # 文件名 -> (大小, 修改时间)
+        self.subdirs = set()
+        self.own_size = 0  # 直接位于本目录下的文件大小之和
+        self.tree_size = 0  # 含全部子目录的大小之和
+        self.mtime = mtime
+        self.tree_mtime = mtime  # 子树中最新的修改时间
+
+
+class DirectoryWatcher:
+    """
+    后台目录监听器：在内存中维护每个目录的大小与修改时间聚合，并随文件变化增量更新。
+
+    Linux 上使用 inotify（通过 ctypes 调用 libc），每个事件只重新 stat 变化的条目，
+    并把大小差值沿父目录向上累加；inotify 不可用或监听数超限时退回定期轮询。
+    聚合结果定期落盘，进程重启后在首次全量扫描完成前也能直接应答。
+
+    同一主机上的多个 worker 通过 `<snapshot_path>.lock` 文件锁选出一个主进程，
+    只有它扫描目录树、注册 inotify 监听并写快照；其他进程定期重新读取快照，
+    主进程退出后由其中一个接替。
+    """
+
+    def __init__(
+        self,
+        roots,
+        snapshot_path=None,
+        poll_interval=30,
+        snapshot_interval=10,
+        follow_interval=5,
+    ):
+        """
+        :param roots: 需要监听的根目录列表
+        :param snapshot_path: 聚合结果的落盘路径（可选，未设置时每个进程各自监听）
+        :param poll_interval: 轮询模式下的全量扫描间隔（秒）
+        :param snapshot_interval: 聚合结果落盘的最小间隔（秒）
+        :param follow_interval: 非主进程检查快照更新、尝试接替主进程的间隔（秒）
+        """
+        self.roots = [os.path.abspath(r) for r in roots if r]
+        self.snapshot_path = snapshot_path
+        self.poll_interval = poll_interval
+        self.snapshot_interval = snapshot_interval
+        self.follow_interval = follow_interval
+        self._lock = threading.RLock()
+        self._dirs = {}
+        self._snapshot_mtime = None
+        self._snapshot = self._load_snapshot()
+        self._indexed = threading.Event()  # 本进程的内存索引已建立（仅主进程）
+        self._ready = threading.Event()  # 内存索引或主进程的快照可用
+        self._lock_file = None
+        self._dirty = False
+        self._pid = None
+        self._libc = None
+        self._fd = None
+        self._wd_to_path = {}
+        self._path_to_wd = {}
+
+    # ---------------------------------------------------------------- 查询
+
+    def _lookup(self, path):
+        path = os.path.abspath(path)
+        if not any(path == r or path.startswith(r + os.sep) for r in self.roots):
+            return path, None, False
+        self.start()
+        if self._indexed.is_set():
+            with self._lock:
+                node = self._dirs.get(path)
+                if node is not None:
+                    return path, (
+                        node.own_size,
+                        node.tree_size,
+                        node.mtime,
+                        node.tree_mtime,
+                    ), True
+            return path, None, True
+        return path, self._snapshot.get(path), True
+
+    def stat(self, path):
+        """
+        查询目录的聚合信息。
+
+        :param path: 目录路径
+        :return: own_size/tree_size/mtime/tree_mtime 字典；不在监听范围或不存在时为 None
+        """
+        _, entry, _ = self._lookup(path)
+        if entry is None:
+            return None
+        own_size, tree_size, mtime, tree_mtime = entry
+        return {
+            "own_size": own_size,
+            "tree_size": tree_size,
+            "mtime": mtime,
+            "tree_mtime": tree_mtime,
+        }
+
+    def tree_size(self, path):
+        """目录树的总大小（字节），监听数据不可用时直接遍历"""
+        path, entry, _ = self._lookup(path)
+        return entry[1] if entry is not None else _walk_size(path)
+
+    def own_size(self, path):
+        """直接位于目录下的文件大小之和（不含子目录）"""
+        path, entry, _ = self._lookup(path)
+        if entry is not None:
+            return entry[0]
+        total = 0
+        try:
+            with os.scandir(path) as it:
+                for item in it:
+                    if item.is_file():
+                        total += item.stat().st_size
+        except OSError:
+            pass
+        return total
+
+    # ---------------------------------------------------------------- 生命周期
+
+    def start(self):
+        """在当前进程中惰性启动监听线程（fork 后的子进程各自启动并竞争主进程锁）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._indexed.clear()
+            self._ready.clear()
+            self._dirs = {}
+            self._wd_to_path = {}
+            self._path_to_wd = {}
+            self._fd = None
+            thread = threading.Thread(
+                target=self._run, name="optiflux-fswatch", daemon=True
+            )
+            thread.start()
+
+    def wait_ready(self, timeout=None):
+        """等待首次全量扫描完成（非主进程等待读到主进程的快照）"""
+        self.start()
+        return self._ready.wait(timeout)
+
+    def _acquire_leader(self):
+        """非阻塞地获取监听锁，持有者所在进程退出时自动释放"""
+        if fcntl is None or not self.snapshot_path:
+            return True
+        if self._lock_file is None or self._lock_file[0] != os.getpid():
+            os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+            handle = open(self.snapshot_path + ".lock", "a")
+            self._lock_file = (os.getpid(), handle, False)
+        pid, handle, held = self._lock_file
+        if held:
+            return True
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        self._lock_file = (pid, handle, True)
+        logger.info(f"Directory watcher running in process {pid}")
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self._acquire_leader():
+                    break
+                self._follow()
+            except Exception as e:
+                logger.error(f"Directory watcher error: {e}")
+            time.sleep(self.follow_interval)
+        self._lead()
+
+    def _follow(self):
+        """非主进程：快照文件有更新时重新读取"""
+        try:
+            mtime = os.stat(self.snapshot_path).st_mtime
+        except OSError:
+            return
+        if mtime != self._snapshot_mtime:
+            self._snapshot = self._load_snapshot()
+        if self._snapshot_mtime is not None:
+            self._ready.set()
+
+    def _lead(self):
+        self._libc = _load_inotify()
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+            self._fd = fd if fd >= 0 else None
+
+        start = time.time()
+        with self._lock:
+            for root in self.roots:
+                if os.path.isdir(root):
+                    self._scan_tree(root)
+            self._dirty = True
+        self._indexed.set()
+        self._ready.set()
+        mode = "inotify" if self._fd is not None else "polling"
+        logger.info(
+            f"Indexed {len(self._dirs)} directories in {time.time() - start:.2f}s "
+            f"({mode})"
+        )
+        self._save_snapshot()
+
+        last_saved = time.time()
+        while True:
+            try:
+                if self._fd is not None:
+                    self._read_events()
+                else:
+                    time.sleep(self.poll_interval)
+                    self._poll()
+            except Exception as e:
+                logger.error(f"Directory watcher error: {e}")
+                time.sleep(1)
+            if time.time() - last_saved >= self.snapshot_interval:
+                self._save_snapshot()
+                last_saved = time.time()
+
+    # ---------------------------------------------------------------- 扫描与增量更新
+
+    def _watch(self, path):
+        if self._fd is None:
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                # 超出 max_user_watches，整体退回轮询
+                logger.warning("inotify watch limit reached, falling back to polling")
+                self._close_inotify()
+            return
+        self._wd_to_path[wd] = path
+        self._path_to_wd[path] = wd
+
+    def _unwatch(self, path):
+        wd = self._path_to_wd.pop(path, None)
+        if wd is not None:
+            self._wd_to_path.pop(wd, None)
+            if self._fd is not None:
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _close_inotify(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+        self._wd_to_path = {}
+        self._path_to_wd = {}
+
+    def _scan_tree(self, root, dirs=None):
+        """扫描 root 子树并写入 dirs（默认为当前索引），返回 (总大小, 最新修改时间)"""
+        dirs = self._dirs if dirs is None else dirs
+        watch = dirs is self._dirs
+        try:
+            mtime = os.stat(root).st_mtime
+        except OSError:
+            return 0, 0
+        # 先加监听再列目录，列目录期间发生的变化也会产生事件
+        if watch:
+            self._watch(root)
+        node = _Dir(mtime)
+        dirs[root] = node
+        children = []
+        try:
+            with os.scandir(root) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            children.append(item.name)
+                        else:
+                            st = item.stat()
+                            node.files[item.name] = (st.st_size, st.st_mtime)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+
+        node.own_size = sum(size for size, _ in node.files.values())
+        node.tree_size = node.own_size
+        node.tree_mtime = max([mtime] + [m for _, m in node.files.values()])
+        for name in children:
+            size, child_mtime = self._scan_tree(os.path.join(root, name), dirs)
+            node.subdirs.add(name)
+            node.tree_size += size
+            node.tree_mtime = max(node.tree_mtime, child_mtime)
+        return node.tree_size, node.tree_mtime
+
+    def _drop_tree(self, root):
+        """从索引中移除 root 子树，返回其总大小"""
+        node = self._dirs.pop(root, None)
+        if node is None:
+            return 0
+        self._unwatch(root)
+        for name in node.subdirs:
+            self._drop_tree(os.path.join(root, name))
+        return node.tree_size
+
+    def _propagate(self, path, delta, mtime):
+        """把大小差值与修改时间从 path 开始沿父目录向上累加"""
+        while path in self._dirs:
+            node = self._dirs[path]
+            node.tree_size += delta
+            node.tree_mtime = max(node.tree_mtime, mtime)
+            if path in self.roots:
+                break
+            path = os.path.dirname(path)
+
+    def _update_entry(self, parent, name):
+        """重新 stat 目录下的单个条目并更新聚合"""
+        node = self._dirs.get(parent)
+        if node is None:
+            return
+        path = os.path.join(parent, name)
+        try:
+            st = os.lstat(path)
+            is_dir = os.path.isdir(path) and not os.path.islink(path)
+            if not is_dir:
+                st = os.stat(path)
+        except OSError:
+            st = None
+            is_dir = False
+
+        file_delta = 0
+        dir_delta = 0
+        mtime = time.time()
+        if name in node.files and (st is None or is_dir):
+            file_delta -= node.files.pop(name)[0]
+        if name in node.subdirs and (st is None or not is_dir):
+            node.subdirs.discard(name)
+            dir_delta -= self._drop_tree(path)
+
+        if st is not None and is_dir:
+            if name not in node.subdirs:
+                size, mtime = self._scan_tree(path)
+                node.subdirs.add(name)
+                dir_delta += size
+        elif st is not None:
+            old_size = node.files.get(name, (0, 0))[0]
+            node.files[name] = (st.st_size, st.st_mtime)
+            file_delta += st.st_size - old_size
+            mtime = st.st_mtime
+
+        node.own_size += file_delta
+        delta = file_delta + dir_delta
+        try:
+            node.mtime = os.stat(parent).st_mtime
+        except OSError:
+            pass
+        self._propagate(parent, delta, mtime)
+        self._dirty = True
+
+    def _read_events(self):
+        """读取一批 inotify 事件；同一条目的多次事件合并为一次 stat"""
+        ready, _, _ = select.select([self._fd], [], [], 1.0)
+        if not ready:
+            return
+        # 稍作等待以合并突发写入（如 diskcache 连续写同一个数据库文件）
+        time.sleep(0.05)
+        pending = {}
+        overflow = False
+        while True:
+            try:
+                data = os.read(self._fd, 256 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif mask & IN_IGNORED:
+                    path = self._wd_to_path.pop(wd, None)
+                    if path is not None and self._path_to_wd.get(path) == wd:
+                        del self._path_to_wd[path]
+                elif name:
+                    parent = self._wd_to_path.get(wd)
+                    if parent is not None:
+                        pending[(parent, os.fsdecode(name))] = None
+
+        with self._lock:
+            if overflow:
+                logger.warning("inotify queue overflow, rescanning")
+                self._rescan()
+                return
+            for parent, name in pending:
+                self._update_entry(parent, name)
+
+    def _rescan(self):
+        for path in list(self._path_to_wd):
+            self._unwatch(path)
+        self._dirs = {}
+        for root in self.roots:
+            if os.path.isdir(root):
+                self._scan_tree(root)
+        self._dirty = True
+
+    def _poll(self):
+        """轮询模式：在锁外完成全量扫描，再整体替换索引"""
+        dirs = {}
+        for root in self.roots:
+            if os.path.isdir(root):
+                self._scan_tree(root, dirs)
+        with self._lock:
+            self._dirs = dirs
+            self._dirty = True
+
+    # ---------------------------------------------------------------- 落盘
+
+    def _load_snapshot(self):
+        if not self.snapshot_path:
+            return {}
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                mtime = os.fstat(f.fileno()).st_mtime
+                snapshot = {
+                    path: tuple(entry) for path, entry in json.load(f).items()
+                }
+        except (OSError, ValueError):
+            return self._snapshot if self._snapshot_mtime is not None else {}
+        self._snapshot_mtime = mtime
+        return snapshot
+
+    def _save_snapshot(self):
+        if not self.snapshot_path or not self._dirty:
+            return
+        with self._lock:
+            data = {
+                path: [node.own_size, node.tree_size, node.mtime, node.tree_mtime]
+                for path, node in self._dirs.items()
+            }
+            self._dirty = False
+        directory = os.path.dirname(self.snapshot_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".fswatch.")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"Failed to save directory snapshot: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+_default_watcher = None
+_default_lock = threading.Lock()
+
+
+def default_watcher():
+    """监听全部环境目录的共享实例，聚合结果保存在 META_DB_DIR/data 下"""
+    global _default_watcher
+    if _default_watcher is None:
+        with _default_lock:
+            if _default_watcher is None:
+                _default_watcher = DirectoryWatcher(
+                    list(ENV_DIRS.values()),
+                    snapshot_path=os.path.join(META_DB_DIR, "data", "fswatch.json"),
+                )
+    return _default_watcher
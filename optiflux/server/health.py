@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+# 配置日志
+logger = logging.getLogger("optiflux.PortStatusBoard")
+
+RUNNING = "Running"
+STOPPED = "Stopped"
+
+
+class PortStatusBoard:
+    """
+    服务端口状态看板：后台事件循环按固定间隔并发探测所有已配置端口，
+    接口直接读取带时间戳的快照，不再在请求中逐个阻塞连接。
+
+    默认只做 TCP 连接探测；设置 `http_path`（如 FastAPI 的 `/docs`）后，
+    连接成功还需返回 2xx/3xx 才视为 Running。
+    """
+
+    def __init__(
+        self,
+        port_source=None,
+        host="0.0.0.0",
+        interval=5.0,
+        timeout=1.0,
+        http_path=None,
+        concurrency=256,
+    ):
+        """
+        :param port_source: 返回需要定期探测的端口列表的函数（如注册表中的全部端口）
+        :param host: 探测的主机地址
+        :param interval: 两轮探测之间的间隔（秒）
+        :param timeout: 单个端口的探测超时（秒）
+        :param http_path: HTTP 级检查的路径，为空时只检查 TCP 连接
+        :param concurrency: 同时进行的探测数上限
+        """
+        self.port_source = port_source
+        self.host = host
+        self.interval = interval
+        self.timeout = timeout
+        self.http_path = http_path
+        self.concurrency = concurrency
+        self._snapshot = {}  # port -> {"status", "checked_at", "latency_ms", "http_status"}
+        self._ports = set()  # 被查询过的端口，即使不在 port_source 中也持续探测
+        self._ports_lock = threading.Lock()  # 请求线程写入、探测线程复制 _ports
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+        self._started = threading.Event()
+
+    # ---------------------------------------------------------------- 生命周期
+
+    def start(self):
+        """在当前进程中惰性启动探测线程（fork 后的子进程各自启动）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._snapshot = {}
+            self._started.clear()
+            thread = threading.Thread(
+                target=self._run, name="optiflux-health", daemon=True
+            )
+            thread.start()
+        self._started.wait(5)
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._started.set()
+        loop.run_until_complete(self._schedule())
+
+    async def _schedule(self):
+        while True:
+            start = time.time()
+            try:
+                with self._ports_lock:
+                    ports = set(self._ports)
+                if self.port_source is not None:
+                    ports.update(p for p in self.port_source() if p)
+                await self._probe_many(ports)
+                logger.debug(
+                    f"Probed {len(ports)} ports in {time.time() - start:.2f}s"
+                )
+            except Exception as e:
+                logger.error(f"Port probing failed: {e}")
+            await asyncio.sleep(max(self.interval - (time.time() - start), 0.1))
+
+    # ---------------------------------------------------------------- 探测
+
+    async def _probe(self, port, semaphore):
+        async with semaphore:
+            start = time.time()
+            http_status = None
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, int(port)), self.timeout
+                )
+            except (OSError, asyncio.TimeoutError, ValueError):
+                status = STOPPED
+            else:
+                status = RUNNING
+                try:
+                    if self.http_path:
+                        http_status = await asyncio.wait_for(
+                            self._http_check(reader, writer, port), self.timeout
+                        )
+                        if not 200 <= http_status < 400:
+                            status = STOPPED
+                except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                    status = STOPPED
+                finally:
+                    writer.close()
+            return port, {
+                "status": status,
+                "checked_at": time.time(),
+                "latency_ms": round((time.time() - start) * 1000, 1),
+                "http_status": http_status,
+            }
+
+    async def _http_check(self, reader, writer, port):
+        writer.write(
+            f"GET {self.http_path} HTTP/1.0\r\nHost: {self.host}:{port}\r\n\r\n".encode()
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        return int(status_line.split()[1])
+
+    async def _probe_many(self, ports):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._probe(p, semaphore) for p in ports))
+        self._snapshot.update(results)
+        return dict(results)
+
+    # ---------------------------------------------------------------- 查询
+
+    def statuses(self, ports):
+        """
+        批量查询端口状态。
+
+        快照中没有或已过期（超过 3 个探测周期）的端口会在一轮并发探测中补齐，
+        最坏耗时为单个端口的超时时间，而不是端口数乘以超时。
+
+        :param ports: 端口列表
+        :return: 端口到状态详情的字典
+        """
+        self.start()
+        ports = [p for p in ports if p]
+        with self._ports_lock:
+            self._ports.update(ports)
+        now = time.time()
+        result = {}
+        missing = []
+        for port in ports:
+            entry = self._snapshot.get(port)
+            if entry is None or now - entry["checked_at"] > 3 * self.interval:
+                missing.append(port)
+            else:
+                result[port] = entry
+        if missing and self._loop is not None:
+            future = asyncio.run_coroutine_threadsafe(
+                self._probe_many(set(missing)), self._loop
+            )
+            try:
+                result.update(future.result(self.timeout * 2 + 1))
+            except Exception as e:
+                logger.warning(f"On-demand port probing failed: {e}")
+        return result
+
+    def status(self, port):
+        """单个端口的状态（Running/Stopped）"""
+        entry = self.statuses([port]).get(port)
+        return entry["status"] if entry else STOPPED
+
+    def snapshot(self):
+        """当前全部端口的状态快照"""
+        self.start()
+        return dict(self._snapshot)
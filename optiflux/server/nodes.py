@@ -0,0 +1,201 @@
+import logging
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+# 配置日志
+logger = logging.getLogger("optiflux.NodeMonitor")
+
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+UNHEALTHY = "unhealthy"
+_STATUS_RANK = {HEALTHY: 0, DEGRADED: 1, UNHEALTHY: 2}
+
+
+def node_base_url(url):
+    """节点地址只保留 scheme://host:port（配置中的 url 可能带页面路径）"""
+    parts = urlsplit(url)
+    return f"{parts.scheme or 'http'}://{parts.netloc}"
+
+
+class _NodeState:
+    """单个节点的滚动窗口统计"""
+
+    def __init__(self, node, window):
+        self.node = node
+        self.rtts = deque(maxlen=window)  # 成功探测的往返耗时（毫秒）
+        self.results = deque(maxlen=window)  # 每次探测是否成功
+        self.consecutive_failures = 0
+        self.last_checked = None
+        self.last_error = None
+        self.info = {}  # 节点 /api/node_info 返回的负载与模型信息
+
+
+class NodeMonitor:
+    """
+    节点健康监控：后台线程并发探测各节点的 `/api/node_info`，维护 RTT 与错误率的
+    滚动窗口，并记录节点上正在服务的模型版本、端口与负载。
+
+    节点状态：
+    - healthy：最近探测成功且窗口内错误率不超过 `degraded_error_rate`
+    - degraded：最近探测成功但错误率偏高
+    - unhealthy：连续失败 `fail_threshold` 次，或从未探测成功
+    """
+
+    def __init__(
+        self,
+        nodes,
+        interval=10.0,
+        timeout=2.0,
+        window=30,
+        fail_threshold=2,
+        degraded_error_rate=0.2,
+    ):
+        """
+        :param nodes: 节点配置列表（至少包含 name 与 url）
+        :param interval: 探测间隔（秒）
+        :param timeout: 单次探测超时（秒）
+        :param window: RTT 与错误率滚动窗口的探测次数
+        :param fail_threshold: 判定为 unhealthy 的连续失败次数
+        :param degraded_error_rate: 判定为 degraded 的窗口错误率
+        """
+        self.interval = interval
+        self.timeout = timeout
+        self.fail_threshold = fail_threshold
+        self.degraded_error_rate = degraded_error_rate
+        self._states = [_NodeState(node, window) for node in nodes]
+        self._lock = threading.Lock()
+        self._pid = None
+        self._first_round = threading.Event()
+
+    def start(self):
+        """在当前进程中惰性启动探测线程，并等待首轮探测完成"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._first_round.clear()
+                    thread = threading.Thread(
+                        target=self._run, name="optiflux-nodes", daemon=True
+                    )
+                    thread.start()
+        self._first_round.wait(self.timeout + 1)
+
+    def _run(self):
+        with ThreadPoolExecutor(
+            max_workers=min(32, max(len(self._states), 1)),
+            thread_name_prefix="optiflux-node-probe",
+        ) as pool:
+            while True:
+                start = time.time()
+                try:
+                    list(pool.map(self._probe, self._states))
+                except Exception as e:
+                    logger.error(f"Node probing failed: {e}")
+                self._first_round.set()
+                time.sleep(max(self.interval - (time.time() - start), 0.1))
+
+    def _probe(self, state):
+        url = node_base_url(state.node["url"]) + "/api/node_info"
+        start = time.perf_counter()
+        try:
+            response = requests.get(url, timeout=self.timeout)
+            rtt = (time.perf_counter() - start) * 1000
+            if response.status_code == 404:
+                # 旧版本节点没有 /api/node_info，能应答即视为存活
+                info = {}
+            else:
+                response.raise_for_status()
+                info = response.json().get("data", {})
+        except Exception as e:
+            with self._lock:
+                state.results.append(False)
+                state.consecutive_failures += 1
+                state.last_checked = time.time()
+                state.last_error = str(e)
+            return
+
+        with self._lock:
+            state.results.append(True)
+            state.rtts.append(rtt)
+            state.consecutive_failures = 0
+            state.last_checked = time.time()
+            state.last_error = None
+            state.info = info
+
+    def _status(self, state):
+        if not state.results or state.consecutive_failures >= self.fail_threshold:
+            return UNHEALTHY
+        if not any(state.results):
+            return UNHEALTHY
+        error_rate = state.results.count(False) / len(state.results)
+        return DEGRADED if error_rate > self.degraded_error_rate else HEALTHY
+
+    def _describe(self, state):
+        rtts = sorted(state.rtts)
+        total = len(state.results)
+        load = state.info.get("load", {})
+        return {
+            **state.node,
+            "status": self._status(state),
+            "rtt_ms": round(statistics.median(rtts), 1) if rtts else None,
+            "rtt_p95_ms": round(rtts[int(0.95 * (len(rtts) - 1))], 1) if rtts else None,
+            "error_rate": round(state.results.count(False) / total, 3) if total else None,
+            "load": load.get("load_per_cpu"),
+            "last_checked": state.last_checked,
+            "last_error": state.last_error,
+            "models": state.info.get("models", []),
+        }
+
+    def nodes(self, include_unhealthy=False):
+        """
+        节点列表：按状态、负载、RTT 排序，最优节点在最前。
+
+        :param include_unhealthy: 是否包含 unhealthy 节点
+        """
+        self.start()
+        with self._lock:
+            described = [self._describe(state) for state in self._states]
+        if not include_unhealthy:
+            described = [n for n in described if n["status"] != UNHEALTHY]
+        inf = float("inf")
+        described.sort(
+            key=lambda n: (
+                _STATUS_RANK[n["status"]],
+                n["load"] if n["load"] is not None else inf,
+                n["rtt_ms"] if n["rtt_ms"] is not None else inf,
+            )
+        )
+        return described
+
+    def best(self):
+        """负载最低的健康节点（用于部署与看板路由），无可用节点时返回 None"""
+        candidates = self.nodes()
+        return candidates[0] if candidates else None
+
+
+def local_load():
+    """本机负载：1 分钟平均负载（按 CPU 数归一化）与内存使用率"""
+    cpus = os.cpu_count() or 1
+    try:
+        load1 = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        load1 = None
+    load = {
+        "cpu_count": cpus,
+        "load1": load1,
+        "load_per_cpu": round(load1 / cpus, 3) if load1 is not None else None,
+    }
+    try:
+        import psutil
+
+        load["memory_percent"] = psutil.virtual_memory().percent
+    except ImportError:
+        pass
+    return load
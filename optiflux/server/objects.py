@@ -0,0 +1,211 @@
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import zlib
+
+from .uploads import UploadError, install_tree, staging_path
+from ..utils.zipstream import ZipStreamError, safe_join
+
+try:  # 仅 POSIX 可用：通过 FICLONE ioctl 创建 reflink
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 配置日志
+logger = logging.getLogger("optiflux.ObjectStore")
+
+OBJECTS_DIR = ".objects"
+# linux/fs.h: FICLONE = _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+_COPY_BUFFER = 1 << 20
+# 文件系统不支持 reflink 时返回的错误，遇到后不再尝试
+_NO_REFLINK = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS}
+# 上传对象时支持的请求体编码（Content-Encoding）
+ENCODINGS = ("deflate",)
+
+
+def is_object_id(value):
+    """对象 id 为 40 位小写十六进制 sha1"""
+    return (
+        isinstance(value, str)
+        and len(value) == 40
+        and all(c in "0123456789abcdef" for c in value)
+    )
+
+
+def normalize_manifest(files):
+    """
+    校验客户端提交的清单 {相对路径: {"sha1": ..., "size": ...}}。
+    :return: 规范化后的清单
+    """
+    if not isinstance(files, dict) or not files:
+        raise UploadError("Manifest must map file paths to their sha1 and size")
+    manifest = {}
+    for name, item in files.items():
+        try:
+            safe_join("/", name)
+        except ZipStreamError as e:
+            raise UploadError(str(e))
+        if not isinstance(item, dict) or not is_object_id(item.get("sha1")):
+            raise UploadError(f"Invalid sha1 for {name}")
+        size = item.get("size")
+        if not isinstance(size, int) or size < 0:
+            raise UploadError(f"Invalid size for {name}")
+        manifest[name] = {"sha1": item["sha1"], "size": size}
+    return manifest
+
+
+class _InflateReader:
+    """逐块解压 deflate（zlib 格式）请求体，每次 read 的输出不超过 size"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._inflater = zlib.decompressobj()
+        self._pending = b""
+
+    def read(self, size):
+        while True:
+            if self._pending:
+                data = self._inflater.decompress(self._pending, size)
+                self._pending = self._inflater.unconsumed_tail
+                if data:
+                    return data
+            if self._inflater.eof:
+                return b""
+            chunk = self._stream.read(size)
+            if not chunk:
+                data = self._inflater.flush()
+                if not self._inflater.eof:
+                    raise UploadError("Truncated deflate stream")
+                return data
+            self._pending = chunk
+
+
+class ObjectStore:
+    """
+    模型目录下按内容寻址的文件存储：<model_dir>/.objects/<sha1 前 2 位>/<其余 38 位>。
+
+    - 推送新版本时客户端只需上传存储中缺少的文件，版本目录由已有对象构建；
+    - 构建版本目录时先尝试 reflink（写时复制，不占额外空间），不支持时复制；
+      版本目录中的文件与对象不共享 inode，可以原地改写而不影响对象与其他版本。
+    """
+
+    def __init__(self, model_dir):
+        """
+        :param model_dir: 模型目录（版本目录的上一级）
+        """
+        self.model_dir = model_dir
+        self.root = os.path.join(model_dir, OBJECTS_DIR)
+        self._reflink = fcntl is not None
+
+    def path(self, sha1):
+        if not is_object_id(sha1):
+            raise UploadError(f"Invalid object id: {sha1}")
+        return os.path.join(self.root, sha1[:2], sha1[2:])
+
+    def has(self, sha1, size=None):
+        """
+        对象是否存在；给出 size 时同时校验大小，不一致的对象会被移除。
+        """
+        path = self.path(sha1)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if size is not None and st.st_size != size:
+            logger.warning(
+                f"Object {sha1} in {self.model_dir} has size {st.st_size}, "
+                f"expected {size}, dropping it"
+            )
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return False
+        return True
+
+    def missing(self, manifest):
+        """
+        :param manifest: normalize_manifest 的结果
+        :return: 存储中缺少的对象 id（去重，按清单顺序）
+        """
+        missing = {}
+        for item in manifest.values():
+            sha1 = item["sha1"]
+            if sha1 not in missing and not self.has(sha1, item["size"]):
+                missing[sha1] = item["size"]
+        return list(missing)
+
+    def write(self, sha1, stream, encoding=None, size=None):
+        """
+        逐块读取 stream 写入对象，校验 sha1 后改名为正式对象（并发写入同一对象是安全的）。
+        :param encoding: 请求体编码，None 或 ENCODINGS 之一
+        :param size: 对象的原始大小，写入超出时中止（防止异常的压缩数据）
+        :return: 写入的字节数
+        """
+        path = self.path(sha1)
+        if encoding:
+            if encoding not in ENCODINGS:
+                raise UploadError(f"Unsupported content encoding: {encoding}")
+            stream = _InflateReader(stream)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        digest = hashlib.sha1()
+        written = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for data in iter(lambda: stream.read(_COPY_BUFFER), b""):
+                    digest.update(data)
+                    f.write(data)
+                    written += len(data)
+                    if size is not None and written > size:
+                        raise UploadError(f"Object {sha1} is larger than {size} bytes")
+            if digest.hexdigest() != sha1:
+                raise UploadError(f"Object {sha1} checksum mismatch")
+            os.chmod(tmp_path, 0o444)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return written
+
+    def _clone(self, src, dst):
+        """reflink → 复制，返回实际使用的方式"""
+        if self._reflink:
+            try:
+                with open(src, "rb") as s, open(dst, "wb") as d:
+                    fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+                return "reflink"
+            except OSError as e:
+                if os.path.exists(dst):
+                    os.remove(dst)
+                if e.errno in _NO_REFLINK:
+                    self._reflink = False
+        shutil.copyfile(src, dst)
+        return "copy"
+
+    def checkout(self, manifest, target_dir):
+        """
+        按清单在临时目录中构建版本目录，再安装到 target_dir（新版本整体改名，
+        已存在的版本逐个文件替换）。
+        :return: 各构建方式的文件数，如 {"reflink": 10}
+        """
+        missing = self.missing(manifest)
+        if missing:
+            raise UploadError(f"{len(missing)} objects are missing")
+        staging_dir = staging_path(target_dir)
+        methods = {}
+        try:
+            os.makedirs(staging_dir)
+            for name, item in manifest.items():
+                destination = safe_join(staging_dir, name)
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                method = self._clone(self.path(item["sha1"]), destination)
+                methods[method] = methods.get(method, 0) + 1
+            install_tree(staging_dir, target_dir)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return methods
@@ -0,0 +1,429 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+try:  # 仅 POSIX 可用：多个 gunicorn worker 中只让一个运行后台对账
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 配置日志
+logger = logging.getLogger("optiflux.ModelRegistry")
+
+# 模型目录下不是版本目录的子目录
+_IGNORED_DIRS = {"__pycache__", ".ipynb_checkpoints"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    env TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    serving_version TEXT,
+    version_count INTEGER NOT NULL DEFAULT 0,
+    max_version TEXT,
+    total_size INTEGER NOT NULL DEFAULT 0,
+    mtime REAL NOT NULL DEFAULT 0,
+    recomserver TEXT NOT NULL DEFAULT '[]',
+    rewardserver TEXT NOT NULL DEFAULT '[]',
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (env, model_name)
+);
+CREATE INDEX IF NOT EXISTS idx_models_env_mtime ON models (env, mtime DESC);
+CREATE TABLE IF NOT EXISTS versions (
+    env TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    mtime REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (env, model_name, version)
+);
+CREATE TABLE IF NOT EXISTS reconciled (
+    env TEXT PRIMARY KEY,
+    reconciled_at REAL NOT NULL
+);
+"""
+
+
+def _is_version_dir(model_dir, name):
+    return (
+        not name.startswith(".")
+        and name not in _IGNORED_DIRS
+        and os.path.isdir(os.path.join(model_dir, name))
+    )
+
+
+def _tree_size(directory):
+    """目录下全部文件的总大小（字节），忽略扫描过程中消失的文件"""
+    total = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class ModelRegistry:
+    """
+    模型注册表：把各环境下的模型、版本、大小、修改时间与服役版本持久化到 SQLite。
+
+    push/deploy/restart/update_config 时增量更新对应模型，后台对账线程定期全量
+    扫描以发现绕过服务端的目录变更。/model_names 的分页因此只是一次索引查询，
+    不再逐个遍历模型目录。
+    """
+
+    def __init__(self, db_path, env_dirs, reconcile_interval=300, size_of=None):
+        """
+        :param db_path: SQLite 数据库文件路径
+        :param env_dirs: 环境名称到环境目录的映射
+        :param reconcile_interval: 后台全量对账的间隔（秒），0 表示不启动
+        :param size_of: 统计目录树大小的函数（如 `DirectoryWatcher.tree_size`），默认直接遍历
+        """
+        self.db_path = db_path
+        self.env_dirs = env_dirs
+        self.size_of = size_of or _tree_size
+        self.reconcile_interval = reconcile_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._reconciler_pid = None
+        self._lock_file = None
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        """每个线程一个连接；fork 后的子进程重新建立连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _model_dir(self, env, model_name):
+        return os.path.join(self.env_dirs[env], model_name)
+
+    @staticmethod
+    def _read_config(model_dir):
+        config_path = os.path.join(model_dir, "config.json")
+        if not os.path.exists(config_path):
+            return None
+        with open(config_path, "r") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _ports(config, service_type):
+        return json.dumps(
+            [svc.get("port") for svc in config.get(service_type, []) if svc.get("port")]
+        )
+
+    def _write_model(self, conn, env, model_name, config, versions, total_size, mtime):
+        """写入模型行与全部版本行（调用方负责事务）"""
+        names = [v[0] for v in versions]
+        conn.execute(
+            "INSERT OR REPLACE INTO models (env, model_name, serving_version, "
+            "version_count, max_version, total_size, mtime, recomserver, "
+            "rewardserver, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                env,
+                model_name,
+                config.get("current_version"),
+                len(names),
+                max(names, default="None"),
+                total_size,
+                mtime,
+                self._ports(config, "recomserver"),
+                self._ports(config, "rewardserver"),
+                time.time(),
+            ),
+        )
+        conn.execute(
+            "DELETE FROM versions WHERE env = ? AND model_name = ?", (env, model_name)
+        )
+        conn.executemany(
+            "INSERT INTO versions (env, model_name, version, size, mtime) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(env, model_name, name, size, vmtime) for name, size, vmtime in versions],
+        )
+
+    def _delete_model(self, conn, env, model_name):
+        conn.execute(
+            "DELETE FROM models WHERE env = ? AND model_name = ?", (env, model_name)
+        )
+        conn.execute(
+            "DELETE FROM versions WHERE env = ? AND model_name = ?", (env, model_name)
+        )
+
+    def refresh_model(self, env, model_name):
+        """
+        重新扫描单个模型目录并更新注册表；目录或 config.json 不存在时删除记录。
+
+        :param env: 环境名称
+        :param model_name: 模型名称
+        """
+        model_dir = self._model_dir(env, model_name)
+        config = self._read_config(model_dir) if os.path.isdir(model_dir) else None
+        conn = self._connect()
+        if config is None:
+            with conn:
+                self._delete_model(conn, env, model_name)
+            return
+
+        versions = []
+        for name in os.listdir(model_dir):
+            if _is_version_dir(model_dir, name):
+                version_dir = os.path.join(model_dir, name)
+                versions.append(
+                    (name, self.size_of(version_dir), os.path.getmtime(version_dir))
+                )
+        total_size = self.size_of(model_dir)
+        with conn:
+            self._write_model(
+                conn,
+                env,
+                model_name,
+                config,
+                versions,
+                total_size,
+                os.path.getmtime(model_dir),
+            )
+
+    def refresh_version(self, env, model_name, model_version):
+        """
+        只重新统计单个版本目录（push/deploy 后调用），其余版本沿用已记录的大小。
+
+        :param env: 环境名称
+        :param model_name: 模型名称
+        :param model_version: 模型版本
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT total_size FROM models WHERE env = ? AND model_name = ?",
+            (env, model_name),
+        ).fetchone()
+        if row is None:
+            # 新模型：完整扫描一次
+            self.refresh_model(env, model_name)
+            return
+
+        model_dir = self._model_dir(env, model_name)
+        config = self._read_config(model_dir)
+        if config is None:
+            self.refresh_model(env, model_name)
+            return
+
+        version_dir = os.path.join(model_dir, model_version)
+        # 刚写入的版本直接遍历，不依赖可能尚未处理完事件的目录监听器
+        new_size = _tree_size(version_dir) if os.path.isdir(version_dir) else None
+        with conn:
+            versions = {
+                r["version"]: (r["size"], r["mtime"])
+                for r in conn.execute(
+                    "SELECT version, size, mtime FROM versions "
+                    "WHERE env = ? AND model_name = ?",
+                    (env, model_name),
+                )
+            }
+            old_size = versions.pop(model_version, (0, 0))[0]
+            if new_size is not None:
+                versions[model_version] = (new_size, os.path.getmtime(version_dir))
+            total_size = row["total_size"] - old_size + (new_size or 0)
+            self._write_model(
+                conn,
+                env,
+                model_name,
+                config,
+                [(name, size, vmtime) for name, (size, vmtime) in versions.items()],
+                total_size,
+                os.path.getmtime(model_dir),
+            )
+
+    def refresh_config(self, env, model_name):
+        """
+        config.json 变更后（切换服役版本、修改端口）更新注册表，不重新统计大小。
+
+        :param env: 环境名称
+        :param model_name: 模型名称
+        """
+        model_dir = self._model_dir(env, model_name)
+        config = self._read_config(model_dir)
+        conn = self._connect()
+        exists = conn.execute(
+            "SELECT 1 FROM models WHERE env = ? AND model_name = ?", (env, model_name)
+        ).fetchone()
+        if config is None or not exists:
+            self.refresh_model(env, model_name)
+            return
+        with conn:
+            conn.execute(
+                "UPDATE models SET serving_version = ?, recomserver = ?, "
+                "rewardserver = ?, updated_at = ? WHERE env = ? AND model_name = ?",
+                (
+                    config.get("current_version"),
+                    self._ports(config, "recomserver"),
+                    self._ports(config, "rewardserver"),
+                    time.time(),
+                    env,
+                    model_name,
+                ),
+            )
+
+    def reconcile(self, env=None):
+        """
+        全量对账：扫描环境目录，补齐新增模型、删除已不存在的模型并刷新其余模型。
+
+        :param env: 环境名称，默认对账全部环境
+        """
+        envs = [env] if env else list(self.env_dirs)
+        for name in envs:
+            env_dir = self.env_dirs.get(name)
+            start = time.time()
+            on_disk = set()
+            if env_dir and os.path.isdir(env_dir):
+                for model_name in os.listdir(env_dir):
+                    if model_name.startswith(".") or not os.path.isdir(
+                        os.path.join(env_dir, model_name)
+                    ):
+                        continue
+                    on_disk.add(model_name)
+                    try:
+                        self.refresh_model(name, model_name)
+                    except Exception as e:
+                        logger.warning(f"Failed to index {name}/{model_name}: {e}")
+
+            conn = self._connect()
+            with conn:
+                indexed = {
+                    r["model_name"]
+                    for r in conn.execute(
+                        "SELECT model_name FROM models WHERE env = ?", (name,)
+                    )
+                }
+                for model_name in indexed - on_disk:
+                    self._delete_model(conn, name, model_name)
+                conn.execute(
+                    "INSERT OR REPLACE INTO reconciled (env, reconciled_at) "
+                    "VALUES (?, ?)",
+                    (name, time.time()),
+                )
+            logger.info(
+                f"Reconciled registry for {name}: {len(on_disk)} models "
+                f"in {time.time() - start:.2f}s"
+            )
+
+    def _ensure_indexed(self, env):
+        """环境从未对账过时同步对账一次（首次启动）"""
+        row = (
+            self._connect()
+            .execute("SELECT 1 FROM reconciled WHERE env = ?", (env,))
+            .fetchone()
+        )
+        if row is None:
+            with self._lock:
+                row = (
+                    self._connect()
+                    .execute("SELECT 1 FROM reconciled WHERE env = ?", (env,))
+                    .fetchone()
+                )
+                if row is None:
+                    self.reconcile(env)
+
+    def list_models(self, env, page=1, per_page=10):
+        """
+        按修改时间倒序分页查询模型。
+
+        :param env: 环境名称
+        :param page: 页码（从 1 开始）
+        :param per_page: 每页条数
+        :return: (当前页模型列表, 模型总数)
+        """
+        self.start_reconciler()
+        self._ensure_indexed(env)
+        conn = self._connect()
+        total = conn.execute(
+            "SELECT COUNT(*) FROM models WHERE env = ?", (env,)
+        ).fetchone()[0]
+        rows = conn.execute(
+            "SELECT * FROM models WHERE env = ? ORDER BY mtime DESC "
+            "LIMIT ? OFFSET ?",
+            (env, per_page, max(page - 1, 0) * per_page),
+        ).fetchall()
+        models = []
+        for row in rows:
+            model = dict(row)
+            model["recomserver"] = json.loads(model["recomserver"])
+            model["rewardserver"] = json.loads(model["rewardserver"])
+            models.append(model)
+        return models, total
+
+    def list_versions(self, env, model_name):
+        """
+        查询模型的全部版本记录。
+
+        :return: 包含 version/size/mtime 的字典列表
+        """
+        self._ensure_indexed(env)
+        return [
+            dict(row)
+            for row in self._connect().execute(
+                "SELECT version, size, mtime FROM versions "
+                "WHERE env = ? AND model_name = ? ORDER BY version DESC",
+                (env, model_name),
+            )
+        ]
+
+    def all_ports(self):
+        """全部模型配置的 recomserver/rewardserver 端口"""
+        ports = set()
+        for row in self._connect().execute(
+            "SELECT recomserver, rewardserver FROM models"
+        ):
+            ports.update(json.loads(row["recomserver"]))
+            ports.update(json.loads(row["rewardserver"]))
+        return sorted(ports)
+
+    def start_reconciler(self):
+        """在当前进程中惰性启动后台对账线程（同一主机上只有一个进程真正执行）"""
+        if not self.reconcile_interval or self._reconciler_pid == os.getpid():
+            return
+        with self._lock:
+            if self._reconciler_pid == os.getpid():
+                return
+            self._reconciler_pid = os.getpid()
+            thread = threading.Thread(
+                target=self._reconcile_loop, name="optiflux-registry", daemon=True
+            )
+            thread.start()
+
+    def _acquire_leader(self):
+        """非阻塞地获取对账锁，持有者所在进程退出时自动释放"""
+        if fcntl is None:
+            return True
+        if self._lock_file is None or self._lock_file[0] != os.getpid():
+            handle = open(self.db_path + ".reconcile.lock", "a")
+            self._lock_file = (os.getpid(), handle, False)
+        pid, handle, held = self._lock_file
+        if held:
+            return True
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        self._lock_file = (pid, handle, True)
+        return True
+
+    def _reconcile_loop(self):
+        while True:
+            time.sleep(self.reconcile_interval)
+            if not self._acquire_leader():
+                continue
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.error(f"Registry reconcile failed: {e}")
@@ -6,6 +6,7 @@ import zipfile  # 确保导入 zipfile 模块
 import os
 from ..utils.file_utils import unzip_file, ensure_dir_exists
 from ..config import ENV_DIRS, LOG_DIR
+from .fswatch import default_watcher
 
 import traceback  # 导入 traceback 模块
 import time
@@ -79,7 +80,8 @@ def scan_model_names(env, page=1, per_page=10):
         total_size = 0
         latest_timestamp = None
         for model_version in os.listdir(model_dir):
-            if model_version == ".ipynb_checkpoints":  # 排除 .ipynb_checkpoints 目录
+            # 排除 .ipynb_checkpoints、.objects 对象存储、上传临时目录等隐藏目录
+            if model_version.startswith("."):
                 continue
             version_dir = os.path.join(model_dir, model_version)
             if not os.path.isdir(version_dir):
@@ -95,11 +97,7 @@ def scan_model_names(env, page=1, per_page=10):
             timestamp = timestamp.strftime("%Y-%m-%d %H:%M:%S")
 
             # 获取目录大小
-            size = sum(
-                os.path.getsize(os.path.join(version_dir, f))
-                for f in os.listdir(version_dir)
-                if os.path.isfile(os.path.join(version_dir, f))
-            )
+            size = default_watcher().own_size(version_dir)
 
             versions.append(
                 {"model_version": model_version, "timestamp": timestamp, "size": size}
@@ -204,7 +202,8 @@ def scan_model_versions(env, model_name):
 
     # 遍历版本目录
     for model_version in os.listdir(model_dir):
-        if model_version == ".ipynb_checkpoints":  # 排除 .ipynb_checkpoints 目录
+        # 排除 .ipynb_checkpoints、.objects 对象存储、上传临时目录等隐藏目录
+        if model_version.startswith("."):
             continue
         version_dir = os.path.join(model_dir, model_version)
         if not os.path.isdir(version_dir):
@@ -220,11 +219,7 @@ def scan_model_versions(env, model_name):
         timestamp = timestamp.strftime("%Y-%m-%d %H:%M:%S")
 
         # 获取目录大小
-        size = sum(
-            os.path.getsize(os.path.join(version_dir, f))
-            for f in os.listdir(version_dir)
-            if os.path.isfile(os.path.join(version_dir, f))
-        )
+        size = default_watcher().own_size(version_dir)
 
         # 获取 recomserver 和 rewardserver 的端口
         recomserver_port, rewardserver_port = get_server_ports(
@@ -21,16 +21,21 @@ from .routes import (
 )
 
 # from ..config import SERVER_HOST, SERVER_PORT,ENV_DIRS
-from ..config import ENV_DIRS, NODES
+from ..config import (
+    ENV_DIRS,
+    NODES,
+    META_DB_DIR,
+    HEALTH_CHECK_INTERVAL,
+    HEALTH_CHECK_PATH,
+)
 from ..utils.env import load_or_initialize_config
 from ..utils.service import (
-    generate_service_script,
     wait_until_port_used,
-    start_service,
-    kill_process_by_port,
-    is_port_in_use,
+    rolling_restart,
+    ServiceSupervisor,
 )
 from ..utils.file_utils import ensure_dir_exists
+from ..utils.pids import default_registry
 
 import sys
 import argparse
@@ -54,6 +59,7 @@ from flask import (
     request,
     url_for,
     session,
+    Response,
 )
 
 from datetime import timedelta
@@ -90,9 +96,55 @@ cache_dir = os.path.join(os.path.dirname(__file__), "cache")
 os.makedirs(cache_dir, exist_ok=True)
 cache = diskcache.Cache(cache_dir)
 
+from .registry import ModelRegistry
+from .uploads import (
+    UploadManager,
+    UploadError,
+    DEFAULT_CHUNK_SIZE,
+    check_names,
+    install_archive,
+)
+from .objects import ENCODINGS, ObjectStore, normalize_manifest
+from ..utils.zipstream import ZipStreamError, iter_directory_zip, safe_join
+from .fswatch import default_watcher
+
+# 目录监听器：增量维护各目录的大小与修改时间，避免每次请求遍历文件
+watcher = default_watcher()
+# 模型注册表：/model_names 直接分页查询，push/deploy/restart 时增量更新
+registry = ModelRegistry(
+    os.path.join(META_DB_DIR, "data", "registry.db"),
+    ENV_DIRS,
+    size_of=watcher.tree_size,
+)
+
+from .health import PortStatusBoard
+
+# 端口状态看板：后台并发探测全部已配置端口，接口只读快照
+status_board = PortStatusBoard(
+    port_source=registry.all_ports,
+    interval=HEALTH_CHECK_INTERVAL,
+    http_path=HEALTH_CHECK_PATH or None,
+)
+
+from .nodes import NodeMonitor, local_load
+
+# 节点健康监控：并发探测 NODES 中的各节点，维护 RTT 与错误率滚动窗口
+node_monitor = NodeMonitor(NODES)
+
+
+# 服务 supervisor：托管重启过的服务端口，崩溃后按退避策略自动拉起
+supervisor = ServiceSupervisor(default_registry())
+
+
+def update_registry(method, *args):
+    """更新注册表；失败只记录日志，不影响主流程（后台对账会补齐）"""
+    try:
+        getattr(registry, method)(*args)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Registry {method}{args} failed: {e}")
+
 import logging
 import zipfile
-import io
 
 # 配置日志记录
 logging.basicConfig(level=logging.DEBUG)
@@ -118,6 +170,7 @@ app = create_app()
 
 @app.before_request
 def session_handler():
+    supervisor.start()
     session.permanent = True
     app.permanent_session_lifetime = timedelta(minutes=60 * 24 * 7)
 
@@ -437,11 +490,70 @@ def log_operations_to_text(operations, opt_time, log_file="operations_log.txt"):
             f.write("-" * 40 + "\n")  # 添加分隔符
 
 
+def write_push_operations(project_dir, operations):
+    """将 push 携带的操作记录追加到版本目录的 committed_operations 日志"""
+    operations_dir = os.path.join(project_dir, "committed_operations")
+    os.makedirs(operations_dir, exist_ok=True)
+    # 获取当前时间（UTC时间）
+    utc_now = datetime.utcnow()
+
+    # 转换为北京时间（UTC+8）
+    beijing_time = utc_now + timedelta(hours=8)
+
+    # 生成日期（格式为 YYYY-MM-DD）
+    beijing_date = beijing_time.strftime("%Y-%m-%d")
+
+    # 生成完整的 ISO 格式时间（包含时区信息）
+    beijing_isoformat = beijing_time.isoformat()
+
+    log_file_operations = os.path.join(
+        operations_dir, f"operations_log_{beijing_date}.txt"
+    )
+    log_operations_to_text(operations, beijing_isoformat, log_file=log_file_operations)
+
+
+def ensure_model_config(env, model_name, model_version):
+    """模型目录下没有 config.json 时生成默认配置"""
+    # 构建模型目录
+    model_dir = os.path.join(ENV_DIRS[env], model_name)
+    os.makedirs(model_dir, exist_ok=True)
+
+    # 构建 config.json 文件路径
+    config_path = os.path.join(model_dir, "config.json")
+
+    # 如果 config.json 不存在，则生成默认配置
+    if not os.path.exists(config_path):
+        default_config = generate_default_config(env, model_name, model_version)
+        with open(config_path, "w") as f:
+            json.dump(default_config, f, indent=4)
+        print(f"Generated default config.json at {config_path}")
+    else:
+        print(f"Config file already exists at {config_path}")
+
+
+def on_upload_installed(meta, target_dir):
+    """分片上传解压安装完成后（在解压线程中）记录操作并更新注册表"""
+    operations = meta.get("operations")
+    if operations:
+        write_push_operations(target_dir, operations)
+    update_registry(
+        "refresh_version", meta["env"], meta["model_name"], meta["model_version"]
+    )
+
+
+# 分片上传：会话保存在 META_DB_DIR/data/uploads，边接收边解压到临时版本目录
+uploads = UploadManager(
+    os.path.join(META_DB_DIR, "data", "uploads"),
+    ENV_DIRS,
+    on_complete=on_upload_installed,
+)
+
+
 @app.route("/push", methods=["POST"])
 @login_required
 @admin_required
 def push():
-    """接收 ZIP 文件并解压"""
+    """接收 ZIP 文件并解压（整包上传，大文件请使用 /push/upload 分片上传）"""
     logger.debug("Received push request")
     if "file" not in request.files:
         logger.error("No file provided in push request")
@@ -457,61 +569,205 @@ def push():
         logger.error("Missing model_name, remote, or model_version in push request")
         return jsonify({"error": "Missing model_name, remote, or model_version"}), 400
 
-    # 创建目标目录
     project_dir = os.path.join(ENV_DIRS[remote], model_name, model_version)
-    os.makedirs(project_dir, exist_ok=True)
     logger.debug(f"Extracting files to: {project_dir}")
-
     logger.debug(f"operations: {commit_data_str},type:{type(commit_data_str)}")
 
+    ensure_model_config(remote, model_name, model_version)
+
+    # 解压 ZIP 文件：上传文件已由 werkzeug 落盘，逐个条目解压到临时目录后安装
+    try:
+        install_archive(file.stream, project_dir)
+        logger.debug("Extraction successful")
+    except zipfile.BadZipFile:
+        logger.error("Invalid ZIP file in push request")
+        return jsonify({"error": "Invalid ZIP file"}), 400
+    except ZipStreamError as e:
+        return jsonify({"error": str(e)}), 400
+
     if commit_data_str is not None:
         commit_data = json.loads(commit_data_str)  # 反序列化为字典
-        operations_dir = os.path.join(project_dir, "committed_operations")
-        os.makedirs(operations_dir, exist_ok=True)
-        # 获取当前时间（UTC时间）
-        utc_now = datetime.utcnow()
+        write_push_operations(project_dir, commit_data.get("operations", []))
+    update_registry("refresh_version", remote, model_name, model_version)
+    user_id = session.get("_user_id")
+    if user_id:
+        username = get_user_name(session)
+        add_log(
+            "部署模型",
+            f"用户:{username} 通过命令行部署了新模型:{model_name}-{model_version}",
+            user_id,
+        )
 
-        # 转换为北京时间（UTC+8）
-        beijing_time = utc_now + timedelta(hours=8)
+    return jsonify({"status": "success"})
 
-        # 生成日期（格式为 YYYY-MM-DD）
-        beijing_date = beijing_time.strftime("%Y-%m-%d")
 
-        # 生成完整的 ISO 格式时间（包含时区信息）
-        beijing_isoformat = beijing_time.isoformat()
+def upload_response(handler):
+    """分片上传接口的统一权限检查与错误处理"""
+    if hasattr(g, "permission_denied_response"):
+        return g.permission_denied_response
+    try:
+        return jsonify({"status": "success", **handler()})
+    except UploadError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except KeyError:
+        return jsonify({"status": "error", "message": "Upload not found"}), 404
 
-        log_file_operations = os.path.join(
-            operations_dir, f"operations_log_{beijing_date}.txt"
-        )
-        operations = commit_data.get("operations", [])
 
-        log_operations_to_text(
-            operations, beijing_isoformat, log_file=log_file_operations
+@app.route("/push/upload", methods=["POST"])
+@login_required
+@admin_required
+def push_upload_init():
+    """
+    创建（或恢复）分片上传会话。
+    请求 JSON：remote、model_name、model_version、size、chunk_size、chunk_hashes、
+    operations（可选）；返回 upload_id 与缺失的分片序号。
+    """
+    data = request.json or {}
+    remote = data.get("remote")
+    model_name = data.get("model_name")
+    model_version = data.get("model_version")
+
+    def handler():
+        if remote not in ENV_DIRS:
+            raise UploadError(f"Invalid environment: {remote}")
+        if model_name and model_version:
+            ensure_model_config(remote, model_name, model_version)
+        return uploads.create(
+            remote,
+            model_name,
+            model_version,
+            data.get("size", 0),
+            data.get("chunk_hashes") or [],
+            chunk_size=data.get("chunk_size", DEFAULT_CHUNK_SIZE),
+            owner=session.get("_user_id"),
+            operations=data.get("operations") or [],
         )
 
-    # 构建模型目录
-    model_dir = os.path.join(ENV_DIRS[remote], model_name)
-    os.makedirs(model_dir, exist_ok=True)
+    return upload_response(handler)
 
-    # 构建 config.json 文件路径
-    config_path = os.path.join(model_dir, "config.json")
 
-    # 如果 config.json 不存在，则生成默认配置
-    if not os.path.exists(config_path):
-        default_config = generate_default_config(remote, model_name, model_version)
-        with open(config_path, "w") as f:
-            json.dump(default_config, f, indent=4)
-        print(f"Generated default config.json at {config_path}")
-    else:
-        print(f"Config file already exists at {config_path}")
+@app.route("/push/upload/<upload_id>/<int:index>", methods=["PUT"])
+@login_required
+@admin_required
+def push_upload_chunk(upload_id, index):
+    """
+    上传一个分片：请求体为分片原始字节，X-Chunk-Sha1 头为分片的 sha1。
+    """
+    return upload_response(
+        lambda: {
+            "received": uploads.write_chunk(
+                upload_id,
+                index,
+                request.stream,
+                sha1=request.headers.get("X-Chunk-Sha1"),
+            )
+        }
+    )
 
-    # 解压 ZIP 文件
-    try:
-        with zipfile.ZipFile(file, "r") as zipf:
-            zipf.extractall(project_dir)
-        logger.debug("Extraction successful")
+
+@app.route("/push/upload/<upload_id>", methods=["GET"])
+@login_required
+def push_upload_status(upload_id):
+    """查询分片上传的接收与解压进度"""
+    return upload_response(lambda: uploads.status(upload_id))
+
+
+@app.route("/push/upload/<upload_id>/complete", methods=["POST"])
+@login_required
+@admin_required
+def push_upload_complete(upload_id):
+    """
+    结束分片上传：后台完成解压并原子地安装版本目录，客户端轮询状态直到 done。
+    """
+
+    def handler():
+        status = uploads.complete(upload_id)
+        user_id = session.get("_user_id")
+        if user_id:
+            username = get_user_name(session)
+            add_log(
+                "部署模型",
+                f"用户:{username} 通过命令行部署了新模型:"
+                f"{status['model_name']}-{status['model_version']}",
+                user_id,
+            )
+        return status
+
+    return upload_response(handler)
+
+
+def object_store(remote, model_name):
+    """模型目录下的内容寻址对象存储"""
+    if remote not in ENV_DIRS:
+        raise UploadError(f"Invalid environment: {remote}")
+    check_names(model_name)
+    return ObjectStore(os.path.join(ENV_DIRS[remote], model_name))
+
+
+@app.route("/push/manifest", methods=["POST"])
+@login_required
+@admin_required
+def push_manifest():
+    """
+    按内容去重推送的第一步：提交清单，返回对象存储中缺少的文件 sha1，以及上传对象时
+    支持的请求体编码（encodings）。
+    请求 JSON：remote、model_name、model_version、files（{相对路径: {sha1, size}}）。
+    """
+    data = request.json or {}
+
+    def handler():
+        store = object_store(data.get("remote"), data.get("model_name"))
+        check_names(data.get("model_version"))
+        manifest = normalize_manifest(data.get("files"))
+        missing = store.missing(manifest)
+        return {"files": len(manifest), "missing": missing, "encodings": ENCODINGS}
+
+    return upload_response(handler)
+
+
+@app.route("/push/objects/<sha1>", methods=["PUT"])
+@login_required
+@admin_required
+def push_object(sha1):
+    """
+    上传一个对象：请求体为文件原始字节，或 Content-Encoding: deflate 压缩后的字节
+    （可以分块传输）；查询参数 remote、model_name 指定对象存储，size 为原始大小（可选）。
+    """
+
+    def handler():
+        store = object_store(request.args.get("remote"), request.args.get("model_name"))
+        size = request.args.get("size", type=int)
+        encoding = request.headers.get("Content-Encoding", "").strip().lower()
+        return {"size": store.write(sha1, request.stream, encoding or None, size)}
+
+    return upload_response(handler)
+
+
+@app.route("/push/finalize", methods=["POST"])
+@login_required
+@admin_required
+def push_finalize():
+    """
+    按清单从对象存储构建版本目录（reflink/复制）并安装，对象缺失时返回 400。
+    请求 JSON 同 /push/manifest，另含 operations（可选）。
+    """
+    data = request.json or {}
+    remote = data.get("remote")
+    model_name = data.get("model_name")
+    model_version = data.get("model_version")
+
+    def handler():
+        store = object_store(remote, model_name)
+        check_names(model_version)
+        manifest = normalize_manifest(data.get("files"))
+        ensure_model_config(remote, model_name, model_version)
+        project_dir = os.path.join(ENV_DIRS[remote], model_name, model_version)
+        methods = store.checkout(manifest, project_dir)
+        operations = data.get("operations") or []
+        if operations:
+            write_push_operations(project_dir, operations)
+        update_registry("refresh_version", remote, model_name, model_version)
         user_id = session.get("_user_id")
-        # print(user_id,"user_id")
         if user_id:
             username = get_user_name(session)
             add_log(
@@ -519,41 +775,90 @@ def push():
                 f"用户:{username} 通过命令行部署了新模型:{model_name}-{model_version}",
                 user_id,
             )
+        return {"files": len(manifest), "methods": methods}
 
-        return jsonify({"status": "success"})
-    except zipfile.BadZipFile:
-        logger.error("Invalid ZIP file in push request")
-        return jsonify({"error": "Invalid ZIP file"}), 400
+    return upload_response(handler)
 
 
-@app.route("/pull", methods=["GET"])
-def pull():
-    """打包文件并返回 ZIP 文件"""
-    model_name = request.args.get("model_name")
-    remote = request.args.get("remote")
-    model_version = request.args.get("model_version")
+def pull_project_dir(args):
+    """pull 请求对应的版本目录，参数不合法时返回 (None, 错误响应)"""
+    model_name = args.get("model_name")
+    remote = args.get("remote")
+    model_version = args.get("model_version")
     if not model_name or not model_version:
-        return jsonify({"error": "Missing model_name or model_version"}), 400
+        return None, (jsonify({"error": "Missing model_name or model_version"}), 400)
+    if remote not in ENV_DIRS:
+        return None, (jsonify({"error": f"Invalid environment: {remote}"}), 400)
+    try:
+        check_names(model_name, model_version)
+    except UploadError as e:
+        return None, (jsonify({"error": str(e)}), 400)
 
     # 检查项目目录是否存在
     project_dir = os.path.join(ENV_DIRS[remote], model_name, model_version)
     if not os.path.exists(project_dir):
-        return jsonify({"error": "Project not found"}), 404
+        return None, (jsonify({"error": "Project not found"}), 404)
+    return project_dir, None
+
+
+def file_sha1(path):
+    """文件的 sha1，按 (路径, 大小, 修改时间, inode) 缓存，文件未变时不重复计算"""
+    st = os.stat(path)
+    key = f"sha1:{path}:{st.st_size}:{st.st_mtime_ns}:{st.st_ino}"
+    sha1 = cache.get(key)
+    if sha1 is None:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for data in iter(lambda: f.read(1 << 20), b""):
+                digest.update(data)
+        sha1 = digest.hexdigest()
+        cache.set(key, sha1, expire=7 * 86400)
+    return sha1, st.st_size
+
+
+@app.route("/pull/manifest", methods=["GET"])
+def pull_manifest():
+    """版本目录的文件清单 {相对路径: {sha1, size}}，供客户端增量拉取"""
+    project_dir, error = pull_project_dir(request.args)
+    if error:
+        return error
+    files = {}
+    for root, _, filenames in os.walk(project_dir):
+        for filename in filenames:
+            file_path = os.path.join(root, filename)
+            try:
+                sha1, size = file_sha1(file_path)
+            except FileNotFoundError:
+                continue
+            name = os.path.relpath(file_path, project_dir).replace(os.sep, "/")
+            files[name] = {"sha1": sha1, "size": size}
+    return jsonify({"files": files})
 
-    # 创建内存中的 ZIP 文件
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-        for root, _, files in os.walk(project_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                zipf.write(file_path, os.path.relpath(file_path, project_dir))
 
-    # 重置缓冲区指针
-    zip_buffer.seek(0)
+@app.route("/pull", methods=["GET", "POST"])
+def pull():
+    """
+    打包版本目录并以流式 ZIP 返回：边遍历目录边压缩边发送，不在内存中构建归档。
+    POST 请求体可带 {"paths": [...]}，只打包这些文件（增量拉取）。
+    """
+    project_dir, error = pull_project_dir(request.args)
+    if error:
+        return error
+    model_name = request.args.get("model_name")
+    model_version = request.args.get("model_version")
 
-    # 返回 ZIP 文件
-    return (
-        zip_buffer.getvalue(),
+    names = None
+    if request.method == "POST":
+        names = (request.get_json(silent=True) or {}).get("paths") or []
+        try:
+            for name in names:
+                if not os.path.isfile(safe_join(project_dir, name)):
+                    return jsonify({"error": f"File not found: {name}"}), 404
+        except ZipStreamError as e:
+            return jsonify({"error": str(e)}), 400
+
+    return Response(
+        iter_directory_zip(project_dir, names=names),
         200,
         {
             "Content-Type": "application/zip",
@@ -575,10 +880,6 @@ def deploy():
             return g.permission_denied_response
 
         print("Received files:", list(request.files.keys()))
-        # uploadType=request.form.get('uploadType')
-        # print("uploadType",uploadType)
-        for f in request.files.getlist("files"):
-            print(f"File: {f.filename} | Size: {len(f.read())} bytes")
 
         # 获取表单数据
         model_registry = []
@@ -608,9 +909,7 @@ def deploy():
             print(f"Invalid environment: {env}")  # 调试信息
             return jsonify({"status": "error", "message": "Invalid environment."}), 400
 
-        # 创建目标目录
         target_dir = os.path.join(ENV_DIRS[env], model_name, model_version)
-        ensure_dir_exists(target_dir)
 
         # 处理文件上传
         if upload_type == "file":
@@ -619,17 +918,16 @@ def deploy():
                 return jsonify({"status": "error", "message": "No file uploaded."}), 400
 
             file = request.files["file"]
-            file_path = os.path.join(target_dir, file.filename)
-            print(f"Saving file to: {file_path}")  # 调试信息
-            file.save(file_path)
-
-            # 如果是zip文件，解压
             if file.filename.endswith(".zip"):
+                # zip 文件直接从上传的临时文件解压到临时目录，再安装为版本目录
                 print("File is a zip file, extracting...")  # 调试信息
-                with zipfile.ZipFile(file_path, "r") as zipf:
-                    zipf.extractall(target_dir)
+                install_archive(file.stream, target_dir)
                 print("Extraction complete")  # 调试信息
-                os.remove(file_path)  # 解压后删除zip文件
+            else:
+                ensure_dir_exists(target_dir)
+                file_path = os.path.join(target_dir, file.filename)
+                print(f"Saving file to: {file_path}")  # 调试信息
+                file.save(file_path)
 
         # 处理文件夹上传
         else:
@@ -640,6 +938,7 @@ def deploy():
                     400,
                 )
 
+            ensure_dir_exists(target_dir)
             files = request.files.getlist("folder")
             for file in files:
                 # 去除最外层文件夹的名称
@@ -653,6 +952,8 @@ def deploy():
                 print(f"Saving file to: {file_path}")  # 调试信息
                 file.save(file_path)
 
+        update_registry("refresh_version", env, model_name, model_version)
+
         # 注册模型版本信息
         model_registry.append(
             {
@@ -844,101 +1145,51 @@ def get_model_names():
     page = int(request.args.get("page", 1))  # 默认第一页
     per_page = int(request.args.get("per_page", 10))  # 默认每页 10 条
 
-    cache_key = f"get_model_names_{env}_{page}_{per_page}"
-    cached_result = cache.get(cache_key)
-    if cached_result:
-        return jsonify(cached_result)
-
     if not env or env not in ENV_DIRS:
         return jsonify({"status": "error", "message": "Invalid environment"}), 400
 
     try:
-        # 构建环境目录
-        env_dir = ENV_DIRS.get(env)
-        model_names = []
-
-        # 一次性读取目录内容
-        all_models = os.listdir(env_dir)
+        # 从注册表分页查询，只对当前页的模型检查端口
+        models, total = registry.list_models(env, page, per_page)
         beijing_tz = pytz.timezone("Asia/Shanghai")
+        # 当前页全部端口一次性并发查询，未探测过的端口只等待一个超时周期
+        status_board.statuses(
+            [p for m in models for p in m["recomserver"] + m["rewardserver"]]
+        )
 
-        for model_name in all_models:
-            model_dir = os.path.join(env_dir, model_name)
-            if os.path.isdir(model_dir):
-                config_path = os.path.join(model_dir, "config.json")
-                if os.path.exists(config_path):
-                    with open(config_path, "r") as f:
-                        config = json.load(f)
-
-                    current_version = config.get("current_version")
-                    versions = [
-                        v
-                        for v in os.listdir(model_dir)
-                        if os.path.isdir(os.path.join(model_dir, v))
-                    ]
-                    version_count = len(versions)
-                    max_version = max(versions, default="None")
-                    total_size = 0
-
-                    # 计算文件大小
-                    for root, dirs, files in os.walk(model_dir):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            if os.path.isfile(file_path):
-                                try:
-                                    file_size = os.path.getsize(file_path)
-                                    total_size += file_size
-                                except Exception as e:
-                                    print(
-                                        f"Error getting size for file {file_path}: {e}"
-                                    )
-
-                    latest_timestamp = os.path.getmtime(model_dir)
-                    beijing_time = datetime.fromtimestamp(
-                        latest_timestamp, tz=beijing_tz
-                    ).strftime("%Y-%m-%d %H:%M:%S")
-
-                    recomserver = [
-                        {"port": rc["port"], "status": check_service_status(rc["port"])}
-                        for rc in config.get("recomserver", [])
-                    ]
-                    rewardserver = [
-                        {"port": rw["port"], "status": check_service_status(rw["port"])}
-                        for rw in config.get("rewardserver", [])
-                    ]
-
-                    model_names.append(
-                        {
-                            "model_name": model_name,
-                            "version_count": version_count,
-                            "max_version": max_version,
-                            "total_size": total_size,
-                            "latest_timestamp": beijing_time,
-                            "serving_version": current_version,
-                            "recomserver": recomserver,
-                            "rewardserver": rewardserver,
-                            "timestamp": latest_timestamp,  # 添加时间戳用于排序
-                        }
-                    )
-
-        # 根据时间戳排序，最新的排在前面
-        model_names.sort(key=lambda x: x["timestamp"], reverse=True)
-
-        # 分页逻辑
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated_model_names = model_names[start:end]
+        model_names = []
+        for model in models:
+            beijing_time = datetime.fromtimestamp(
+                model["mtime"], tz=beijing_tz
+            ).strftime("%Y-%m-%d %H:%M:%S")
+            model_names.append(
+                {
+                    "model_name": model["model_name"],
+                    "version_count": model["version_count"],
+                    "max_version": model["max_version"],
+                    "total_size": model["total_size"],
+                    "latest_timestamp": beijing_time,
+                    "serving_version": model["serving_version"],
+                    "recomserver": [
+                        {"port": port, "status": check_service_status(port)}
+                        for port in model["recomserver"]
+                    ],
+                    "rewardserver": [
+                        {"port": port, "status": check_service_status(port)}
+                        for port in model["rewardserver"]
+                    ],
+                    "timestamp": model["mtime"],
+                }
+            )
 
         response_data = {
             "status": "success",
-            "model_names": paginated_model_names,
-            "total": len(model_names),
+            "model_names": model_names,
+            "total": total,
             "page": page,
             "per_page": per_page,
         }
 
-        # 缓存结果
-        # cache.set(cache_key, response_data, expire=60)  # 缓存 60 秒
-
         return jsonify(response_data)
     except Exception as e:
         traceback.print_exc()
@@ -999,6 +1250,13 @@ def get_model_versions_nn():
 
         # 获取当前服役版本
         current_version = config.get("current_version")
+        # 并发预取全部端口状态
+        status_board.statuses(
+            [
+                svc.get("port")
+                for svc in config.get("recomserver", []) + config.get("rewardserver", [])
+            ]
+        )
 
         # 扫描模型版本目录
         model_versions = []
@@ -1069,6 +1327,9 @@ def check_service_status(port, host="0.0.0.0"):
     :param port: 端口号
     :return: 状态（Running/Stopped）
     """
+    if host == status_board.host:
+        # 读取状态看板的快照，不在请求中阻塞连接
+        return status_board.status(port)
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
         sock.settimeout(1)  # 设置超时时间为 1 秒
         result = sock.connect_ex((host, port))
@@ -1077,16 +1338,11 @@ def check_service_status(port, host="0.0.0.0"):
 
 def get_directory_size(directory):
     """
-    计算目录大小。
+    计算目录大小（由目录监听器增量维护，环境目录之外的路径直接遍历）。
     :param directory: 目录路径
     :return: 目录大小（字节）
     """
-    total_size = 0
-    for dirpath, _, filenames in os.walk(directory):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            total_size += os.path.getsize(fp)
-    return total_size
+    return watcher.tree_size(directory)
 
 
 @app.route("/service_instance_status", methods=["GET"])
@@ -1257,6 +1513,7 @@ def update_config():
         # 保存配置文件
         with open(config_path, "w") as f:
             json.dump(new_config, f, indent=4)
+        update_registry("refresh_config", env, model_name)
         user_id = session.get("_user_id")
         if user_id:
             username = get_user_name(session)
@@ -1319,34 +1576,34 @@ def restart_services():
         # 保存更新后的配置
         with open(config_path, "w") as f:
             json.dump(config, f, indent=4)
-
-        # 逐个启动服务
-        for service_type in ["recomserver", "rewardserver"]:
-            for service_config in config.get(service_type, []):
-                port = service_config.get("port")
-                if not port:
-                    continue
-
-                # 检查端口是否被占用
-                if is_port_in_use(port):
-                    print(f"Port {port} is in use. Killing the process...")
-                    kill_process_by_port(port)
-                    time.sleep(1)  # 等待进程终止
-
-                # 启动服务
-                script_path = generate_service_script(
-                    env, model_name, model_version, service_type, service_config
-                )
-                log_file = f"run_{service_type}_{port}.log"
-                log_path = os.path.join(
-                    ENV_DIRS.get(env), model_name, model_version, "logs", log_file
-                )
-                result = start_service(get_final_script(script_path, log_path))
-                if "Error" in result:
-                    return jsonify({"status": "error", "message": result}), 500
-
-                print(f"Started {service_type} on port {port}")
-                time.sleep(3)  # 每个服务启动后等待 3 秒
+        update_registry("refresh_config", env, model_name)
+
+        # 并发滚动重启各端口：新进程就绪后再优雅停止旧进程
+        results = rolling_restart(
+            env,
+            model_name,
+            model_version,
+            config,
+            parallelism=int(data.get("parallelism", 4)),
+            ready_timeout=float(data.get("ready_timeout", 120)),
+            drain_timeout=float(data.get("drain_timeout", 30)),
+        )
+        failed = [r for r in results if r.get("status") != "success"]
+        for r in results:
+            print(f"Restarted {r.get('service_type')} on port {r.get('port')}: {r}")
+        if failed:
+            return (
+                jsonify(
+                    {
+                        "status": "error",
+                        "message": "; ".join(
+                            r.get("message", f"Port {r['port']} failed") for r in failed
+                        ),
+                        "results": results,
+                    }
+                ),
+                500,
+            )
 
         user_id = session.get("_user_id")
         if user_id:
@@ -1357,7 +1614,11 @@ def restart_services():
                 user_id,
             )
         return jsonify(
-            {"status": "success", "message": "Services restarted successfully!"}
+            {
+                "status": "success",
+                "message": "Services restarted successfully!",
+                "results": results,
+            }
         )
     except Exception as e:
         traceback.print_exc()
@@ -1385,6 +1646,14 @@ def check_service_status_api():
         with open(config_path, "r") as f:
             config = json.load(f)
 
+        # 并发预取全部端口状态（含探测时间）
+        board = status_board.statuses(
+            [
+                svc.get("port")
+                for svc in config.get("recomserver", []) + config.get("rewardserver", [])
+            ]
+        )
+
         # 检查 recomserver 服务状态
         recom_status = {}
         for recom_config in config.get("recomserver", []):
@@ -1404,6 +1673,9 @@ def check_service_status_api():
                 "status": "success",
                 "recom_status": recom_status,
                 "reward_status": reward_status,
+                "checked_at": {
+                    port: entry["checked_at"] for port, entry in board.items()
+                },
             }
         )
     except Exception as e:
@@ -1411,6 +1683,52 @@ def check_service_status_api():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/service_status_board", methods=["GET"])
+def service_status_board():
+    """
+    返回全部已配置端口的状态快照（含探测时间、耗时与 HTTP 状态码）。
+    """
+    snapshot = status_board.snapshot()
+    return jsonify(
+        {
+            "status": "success",
+            "interval": status_board.interval,
+            "ports": {str(port): entry for port, entry in sorted(snapshot.items())},
+        }
+    )
+
+
+@app.route("/service_processes", methods=["GET"])
+@login_required
+def service_processes():
+    """
+    返回 supervisor 托管的服务进程：状态、重启次数、CPU 与内存占用。
+    """
+    supervisor.start()
+    return jsonify({"status": "success", "services": supervisor.stats()})
+
+
+@app.route("/unwatch_service", methods=["POST"])
+@login_required
+@admin_required
+def unwatch_service():
+    """
+    取消托管端口，默认同时优雅停止该端口的服务。
+    """
+    if hasattr(g, "permission_denied_response"):
+        return g.permission_denied_response
+    data = request.json or {}
+    port = data.get("port")
+    if not port:
+        return jsonify({"status": "error", "message": "Missing port"}), 400
+    stopped = supervisor.unwatch(
+        int(port),
+        stop=bool(data.get("stop", True)),
+        timeout=float(data.get("timeout", 30)),
+    )
+    return jsonify({"status": "success", "port": int(port), "stopped": stopped})
+
+
 @app.route("/get_readme")
 def get_readme():
     try:
@@ -1424,26 +1742,59 @@ def get_readme():
 
 @app.route("/api/nodes")
 def api_nodes():
+    """
+    节点列表：按健康状态、负载与 RTT 排序，默认过滤不可用节点（all=1 返回全部）。
+    """
+    include_all = request.args.get("all", "").lower() in ("1", "true")
+    nodes = node_monitor.nodes(include_unhealthy=include_all)
+    best = node_monitor.best() if include_all else (nodes[0] if nodes else None)
     return jsonify(
         {
             "status": "success",
-            "data": [
-                node for node in NODES if node["status"] == "healthy"
-            ],  # 过滤不可用节点
+            "data": nodes,
+            "best": best["url"] if best else None,
         }
     )
 
 
-import random
+@app.route("/api/node_info")
+def api_node_info():
+    """
+    本节点信息：负载以及各环境正在服务的模型版本与端口状态（供其他节点探测）。
+    """
+    models = []
+    for env in ENV_DIRS:
+        served, _ = registry.list_models(env, 1, 10**6)
+        for model in served:
+            if not model["serving_version"]:
+                continue
+            models.append(
+                {
+                    "env": env,
+                    "model_name": model["model_name"],
+                    "serving_version": model["serving_version"],
+                    "ports": [
+                        {"service": service_type, "port": port}
+                        for service_type in ("recomserver", "rewardserver")
+                        for port in model[service_type]
+                    ],
+                }
+            )
 
+    statuses = status_board.statuses(
+        [p["port"] for model in models for p in model["ports"]]
+    )
+    for model in models:
+        for p in model["ports"]:
+            entry = statuses.get(p["port"])
+            p["status"] = entry["status"] if entry else "Stopped"
 
-def check_node_status(ip, port):
-    """模拟节点健康检查"""
-    try:
-        # 实际生产环境应实现真实检查逻辑
-        return "healthy" if random.random() > 0.2 else "unhealthy"  # 80%健康率
-    except:
-        return "unhealthy"
+    return jsonify(
+        {
+            "status": "success",
+            "data": {"load": local_load(), "models": models, "time": time.time()},
+        }
+    )
 
 
 def main():
@@ -1469,6 +1820,10 @@ def main():
     config = get_config(args.env)
     app.config.update({"ENV": args.env, "ENV_DIRS": config["ENV_DIRS"]})
 
+    # 对账服务进程登记表：清理控制面停机期间已退出或 PID 被复用的记录
+    alive, removed = default_registry().reconcile()
+    print(f"Service registry reconciled: {alive} running, {removed} stale removed")
+
     if args.gunicorn:  # 生产模式
         gunicorn_options = {
             "bind": f"{config['SERVER_HOST']}:{config['SERVER_PORT']}",
@@ -1478,9 +1833,12 @@ def main():
             "errorlog": "-",  # 错误日志输出到stderr
             "loglevel": "info",
         }
+        # supervisor 运行在 worker 中（master 会回收全部子进程，不能托管服务）
+        gunicorn_options["post_worker_init"] = lambda worker: supervisor.start()
         print(f"Starting PROD server (Gunicorn) on {gunicorn_options['bind']}")
         GunicornApp(app, gunicorn_options).run()
     else:  # 开发模式
+        supervisor.start()
         print(
             f"Starting DEV server (Flask) on {config['SERVER_HOST']}:{config['SERVER_PORT']}"
         )
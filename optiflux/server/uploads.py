@@ -0,0 +1,529 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import zipfile
+
+from ..utils.zipstream import (
+    DataDescriptorError,
+    extract_entry,
+    iter_entries,
+    safe_join,
+)
+
+try:  # 仅 POSIX 可用：多个 gunicorn worker 中只让一个解压同一个上传
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 配置日志
+logger = logging.getLogger("optiflux.UploadManager")
+
+DEFAULT_CHUNK_SIZE = 8 << 20
+MAX_CHUNK_SIZE = 64 << 20
+_COPY_BUFFER = 1 << 20
+
+UPLOADING = "uploading"
+EXTRACTING = "extracting"
+DONE = "done"
+ERROR = "error"
+
+
+class UploadError(Exception):
+    """上传请求不合法（返回 4xx）"""
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def install_tree(staging_dir, target_dir):
+    """
+    将解压好的临时目录安装为版本目录。
+    目标不存在时整体 rename（原子操作）；已存在（重复推送同一版本）时逐个文件
+    os.replace，保留日志、脚本等服务端生成的文件，读取方不会看到写了一半的文件。
+    """
+    if not os.path.exists(target_dir):
+        os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+        os.rename(staging_dir, target_dir)
+        return
+    for dirpath, _, filenames in os.walk(staging_dir):
+        relative = os.path.relpath(dirpath, staging_dir)
+        destination = os.path.normpath(os.path.join(target_dir, relative))
+        os.makedirs(destination, exist_ok=True)
+        for filename in filenames:
+            os.replace(
+                os.path.join(dirpath, filename), os.path.join(destination, filename)
+            )
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _extract_zipfile(fileobj, staging_dir):
+    """按中央目录逐个条目流式解压，返回 (条目数, 解压后字节数)"""
+    entries = extracted = 0
+    with zipfile.ZipFile(fileobj, "r") as zipf:
+        for info in zipf.infolist():
+            path = safe_join(staging_dir, info.filename)
+            if info.is_dir():
+                os.makedirs(path, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with zipf.open(info) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst, _COPY_BUFFER)
+            entries += 1
+            extracted += info.file_size
+    os.makedirs(staging_dir, exist_ok=True)
+    return entries, extracted
+
+
+def check_names(*names):
+    """模型名、版本号只能是单级目录名"""
+    for name in names:
+        if not name:
+            raise UploadError("Missing model_name or model_version")
+        if name in (".", "..") or "/" in name or "\\" in name:
+            raise UploadError(f"Invalid name: {name}")
+
+
+def staging_path(target_dir):
+    """与 target_dir 同目录（同一文件系统）的临时目录路径，安装时可直接改名"""
+    parent = os.path.dirname(os.path.normpath(target_dir))
+    os.makedirs(parent, exist_ok=True)
+    name = os.path.basename(os.path.normpath(target_dir))
+    return os.path.join(parent, f".staging-{name}-{os.getpid()}-{time.time_ns()}")
+
+
+def install_archive(fileobj, target_dir):
+    """
+    将 ZIP 文件（需可 seek，如已落盘的上传文件）解压到临时目录后安装到 target_dir，
+    逐个条目流式解压，不会把整个归档读入内存。
+    """
+    staging_dir = staging_path(target_dir)
+    try:
+        _extract_zipfile(fileobj, staging_dir)
+        install_tree(staging_dir, target_dir)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+class _GrowingReader:
+    """
+    按顺序读取正在上传的归档：只读取已连续到达的分片，数据未到时等待，
+    长时间没有新数据则放弃（之后的分片请求会重新启动解压）。
+    """
+
+    def __init__(self, manager, upload_id, meta, idle_timeout, on_wait=None):
+        self.manager = manager
+        self.upload_id = upload_id
+        self.meta = meta
+        self.idle_timeout = idle_timeout
+        self.on_wait = on_wait
+        self.offset = 0
+        self._available = 0
+        self._file = open(manager._path(upload_id, "data.part"), "rb")
+
+    def _wait(self, size):
+        deadline = time.time() + self.idle_timeout
+        while self._available < self.offset + size:
+            self._available = self.manager._contiguous_bytes(self.upload_id, self.meta)
+            if self._available >= min(self.offset + size, self.meta["size"]):
+                break
+            if time.time() > deadline:
+                raise TimeoutError("No new chunks received")
+            if self.on_wait is not None:
+                self.on_wait()
+            time.sleep(0.2)
+
+    def read(self, size):
+        size = min(size, self.meta["size"] - self.offset)
+        if size <= 0:
+            return b""
+        self._wait(size)
+        size = min(size, self._available - self.offset)
+        self._file.seek(self.offset)
+        data = self._file.read(size)
+        self.offset += len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+class UploadManager:
+    """
+    分片、可续传的归档上传。
+
+    - 客户端先提交归档大小与每个分片的 sha1，得到确定性的 upload_id：同一归档重新
+      推送时会拿到同一个会话，只需补传缺失的分片；
+    - 分片按偏移直接写入预分配的 data.part，逐块读取请求体并校验 sha1，内存占用与
+      分片大小无关；不同 worker 可以并发接收同一上传的分片；
+    - 解压在后台线程中边接收边进行：按顺序解析已连续到达的数据，解压到模型目录下的
+      临时版本目录，全部完成后整体改名为版本目录；同一上传只有持有文件锁的一个
+      进程在解压，该进程退出后由下一个请求重新启动解压；
+    - 归档中有未压缩且使用数据描述符的条目（无法顺序解析）时，退回到上传完成后用
+      zipfile 解压。
+    """
+
+    def __init__(
+        self, root, env_dirs, on_complete=None, idle_timeout=60, expire_after=86400
+    ):
+        """
+        :param root: 上传会话目录
+        :param env_dirs: 环境到模型根目录的映射
+        :param on_complete: 安装完成后的回调 on_complete(meta, target_dir)
+        :param idle_timeout: 解压线程等待新分片的最长时间（秒）
+        :param expire_after: 会话过期时间（秒），过期的会话在创建新会话时清理
+        """
+        self.root = root
+        self.env_dirs = env_dirs
+        self.on_complete = on_complete
+        self.idle_timeout = idle_timeout
+        self.expire_after = expire_after
+        self._extractors = {}  # upload_id -> 当前进程中的解压线程
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # ---------------------------------------------------------------- 路径与状态
+
+    def _path(self, upload_id, *parts):
+        if not upload_id.isalnum():
+            raise UploadError("Invalid upload id")
+        return os.path.join(self.root, upload_id, *parts)
+
+    def _meta(self, upload_id):
+        meta = _read_json(self._path(upload_id, "meta.json"))
+        if meta is None:
+            raise KeyError(upload_id)
+        return meta
+
+    def _state(self, upload_id):
+        return _read_json(self._path(upload_id, "state.json"), {"status": UPLOADING})
+
+    def _set_state(self, upload_id, **state):
+        _write_json(self._path(upload_id, "state.json"), state)
+
+    def _received(self, upload_id):
+        """已校验并写入的分片序号集合"""
+        try:
+            with open(self._path(upload_id, "received")) as f:
+                return {int(line) for line in f if line.strip()}
+        except OSError:
+            return set()
+
+    def _contiguous_bytes(self, upload_id, meta):
+        received = self._received(upload_id)
+        count = 0
+        while count in received:
+            count += 1
+        return min(count * meta["chunk_size"], meta["size"])
+
+    def _staging_dir(self, meta):
+        model_dir = os.path.join(self.env_dirs[meta["env"]], meta["model_name"])
+        return os.path.join(model_dir, f".upload-{meta['upload_id']}")
+
+    def target_dir(self, meta):
+        return os.path.join(
+            self.env_dirs[meta["env"]], meta["model_name"], meta["model_version"]
+        )
+
+    # ---------------------------------------------------------------- 会话
+
+    def create(
+        self,
+        env,
+        model_name,
+        model_version,
+        size,
+        chunk_hashes,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        owner=None,
+        **extra,
+    ):
+        """
+        创建（或恢复）上传会话。
+        :param size: 归档总大小（字节）
+        :param chunk_hashes: 每个分片的 sha1
+        :param chunk_size: 分片大小（最后一个分片可以更小）
+        :param owner: 发起上传的用户，不同用户的会话互不复用
+        :param extra: 随会话保存的附加信息（如 push 的 operations）
+        :return: 会话状态（含 upload_id 与已接收的分片）
+        """
+        if env not in self.env_dirs:
+            raise UploadError(f"Invalid environment: {env}")
+        check_names(model_name, model_version)
+        size, chunk_size = int(size), int(chunk_size)
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise UploadError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+        chunks = max(1, -(-size // chunk_size))
+        if size <= 0 or len(chunk_hashes) != chunks:
+            raise UploadError(f"Expected {chunks} chunk hashes for {size} bytes")
+
+        fingerprint = ":".join(
+            [str(owner), env, model_name, model_version, str(size), str(chunk_size)]
+            + list(chunk_hashes)
+        )
+        upload_id = hashlib.sha1(fingerprint.encode()).hexdigest()[:24]
+        if os.path.exists(self._path(upload_id, "meta.json")):
+            # 只续传未完成的会话；已完成或失败的会话重新开始
+            if self._state(upload_id)["status"] in (DONE, ERROR):
+                self.discard(upload_id)
+            else:
+                return self.status(upload_id)
+
+        self._expire()
+        upload_dir = self._path(upload_id)
+        os.makedirs(upload_dir, exist_ok=True)
+        with open(self._path(upload_id, "data.part"), "wb") as f:
+            f.truncate(size)
+        meta = {
+            "upload_id": upload_id,
+            "env": env,
+            "model_name": model_name,
+            "model_version": model_version,
+            "size": size,
+            "chunk_size": chunk_size,
+            "chunks": chunks,
+            "chunk_hashes": list(chunk_hashes),
+            "owner": owner,
+            "created_at": time.time(),
+            **extra,
+        }
+        _write_json(self._path(upload_id, "meta.json"), meta)
+        self._set_state(upload_id, status=UPLOADING)
+        self._ensure_extractor(upload_id)
+        return self.status(upload_id)
+
+    def write_chunk(self, upload_id, index, stream, sha1=None):
+        """
+        接收一个分片：逐块读取请求体写入对应偏移，校验通过后登记为已接收。
+        :param stream: 请求体流
+        :param sha1: 客户端声明的分片 sha1（可选，须与创建会话时的一致）
+        :return: 已接收的分片数
+        """
+        meta = self._meta(upload_id)
+        index = int(index)
+        if not 0 <= index < meta["chunks"]:
+            raise UploadError(f"Chunk index {index} out of range")
+        expected = meta["chunk_hashes"][index]
+        if sha1 and sha1 != expected:
+            raise UploadError(f"Chunk {index} checksum does not match the session")
+        offset = index * meta["chunk_size"]
+        length = min(meta["chunk_size"], meta["size"] - offset)
+
+        digest = hashlib.sha1()
+        fd = os.open(self._path(upload_id, "data.part"), os.O_WRONLY)
+        try:
+            position = offset
+            remaining = length
+            while remaining:
+                data = stream.read(min(_COPY_BUFFER, remaining))
+                if not data:
+                    break
+                digest.update(data)
+                os.pwrite(fd, data, position)
+                position += len(data)
+                remaining -= len(data)
+            if remaining or stream.read(1):
+                raise UploadError(f"Chunk {index} must be exactly {length} bytes")
+            if digest.hexdigest() != expected:
+                raise UploadError(f"Chunk {index} checksum mismatch")
+        finally:
+            os.close(fd)
+
+        # 追加写一行是原子的，多个 worker 可以同时登记
+        fd = os.open(
+            self._path(upload_id, "received"), os.O_WRONLY | os.O_APPEND | os.O_CREAT
+        )
+        try:
+            os.write(fd, f"{index}\n".encode())
+        finally:
+            os.close(fd)
+        self._ensure_extractor(upload_id)
+        return len(self._received(upload_id))
+
+    def complete(self, upload_id):
+        """
+        标记上传结束：全部分片到齐后由解压线程完成安装。
+        :return: 会话状态
+        """
+        meta = self._meta(upload_id)
+        missing = meta["chunks"] - len(self._received(upload_id))
+        if missing:
+            raise UploadError(f"{missing} chunks are still missing")
+        with open(self._path(upload_id, "complete"), "w"):
+            pass
+        self._ensure_extractor(upload_id)
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        """会话状态：已接收/缺失的分片与解压进度"""
+        meta = self._meta(upload_id)
+        received = self._received(upload_id)
+        state = self._state(upload_id)
+        if state["status"] not in (DONE, ERROR):
+            self._ensure_extractor(upload_id)
+        return {
+            "upload_id": upload_id,
+            "env": meta["env"],
+            "model_name": meta["model_name"],
+            "model_version": meta["model_version"],
+            "size": meta["size"],
+            "chunk_size": meta["chunk_size"],
+            "chunks": meta["chunks"],
+            "received": len(received),
+            "missing": [i for i in range(meta["chunks"]) if i not in received],
+            **state,
+        }
+
+    def discard(self, upload_id):
+        """删除会话及其临时版本目录"""
+        meta = _read_json(self._path(upload_id, "meta.json"))
+        if meta is not None:
+            shutil.rmtree(self._staging_dir(meta), ignore_errors=True)
+        shutil.rmtree(self._path(upload_id), ignore_errors=True)
+
+    def _expire(self):
+        now = time.time()
+        for upload_id in os.listdir(self.root):
+            meta = _read_json(os.path.join(self.root, upload_id, "meta.json"))
+            created_at = meta["created_at"] if meta else 0
+            if now - created_at > self.expire_after:
+                self.discard(upload_id)
+
+    # ---------------------------------------------------------------- 解压
+
+    def _ensure_extractor(self, upload_id):
+        """当前没有进程在解压该上传时，在本进程中启动解压线程"""
+        with self._lock:
+            thread = self._extractors.get(upload_id)
+            if thread is not None and thread.is_alive():
+                return
+            handle = open(self._path(upload_id, "extract.lock"), "a")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    handle.close()
+                    return
+            thread = threading.Thread(
+                target=self._extract,
+                args=(upload_id, handle),
+                name=f"optiflux-upload-{upload_id[:8]}",
+                daemon=True,
+            )
+            self._extractors[upload_id] = thread
+            thread.start()
+
+    def _extract(self, upload_id, lock_handle):
+        try:
+            state = self._state(upload_id)
+            if state["status"] in (DONE, ERROR):
+                return
+            meta = self._meta(upload_id)
+            staging_dir = self._staging_dir(meta)
+            # 解压进度不跨进程保存：从头开始，之前的临时目录作废
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            os.makedirs(staging_dir)
+            self._set_state(upload_id, status=EXTRACTING, entries=0, extracted=0)
+            try:
+                self._extract_streaming(upload_id, meta, staging_dir)
+            except DataDescriptorError:
+                logger.info(
+                    f"Upload {upload_id} is not streamable, waiting for all chunks"
+                )
+                self._extract_complete(upload_id, meta, staging_dir)
+
+            # 归档已读到中央目录，等待客户端确认上传结束
+            deadline = time.time() + self.idle_timeout
+            while not os.path.exists(self._path(upload_id, "complete")):
+                if time.time() > deadline:
+                    raise TimeoutError("Upload was not completed")
+                time.sleep(0.2)
+
+            target_dir = self.target_dir(meta)
+            install_tree(staging_dir, target_dir)
+            if self.on_complete is not None:
+                self.on_complete(meta, target_dir)
+            state = self._state(upload_id)
+            self._set_state(upload_id, **{**state, "status": DONE})
+            try:
+                os.remove(self._path(upload_id, "data.part"))
+            except OSError:
+                pass
+            logger.info(f"Upload {upload_id} installed to {target_dir}")
+        except (TimeoutError, KeyError) as e:
+            # 客户端暂停上传：释放锁，后续请求会重新启动解压
+            logger.info(f"Upload {upload_id} extraction paused: {e}")
+            if os.path.exists(self._path(upload_id)):
+                self._set_state(upload_id, status=UPLOADING)
+        except Exception as e:
+            logger.error(f"Upload {upload_id} failed: {e}")
+            if os.path.exists(self._path(upload_id)):
+                self._set_state(upload_id, status=ERROR, message=str(e))
+        finally:
+            lock_handle.close()
+
+    def _extract_streaming(self, upload_id, meta, staging_dir):
+        progress = {"entries": 0, "extracted": 0, "reported_at": 0}
+
+        def report():
+            # 至多每秒写一次状态文件（等待分片时也会汇报已解压的进度）
+            if time.time() - progress["reported_at"] > 1:
+                progress["reported_at"] = time.time()
+                self._set_state(
+                    upload_id,
+                    status=EXTRACTING,
+                    entries=progress["entries"],
+                    extracted=progress["extracted"],
+                    received_bytes=reader.offset,
+                )
+
+        def on_data(size):
+            progress["extracted"] += size
+            report()
+
+        reader = _GrowingReader(
+            self, upload_id, meta, self.idle_timeout, on_wait=report
+        )
+        try:
+            for entry in iter_entries(reader):
+                extract_entry(entry, staging_dir, on_data=on_data)
+                progress["entries"] += 1
+        finally:
+            reader.close()
+        self._set_state(
+            upload_id,
+            status=EXTRACTING,
+            entries=progress["entries"],
+            extracted=progress["extracted"],
+        )
+
+    def _extract_complete(self, upload_id, meta, staging_dir):
+        """无法顺序解析时，等全部分片到齐后按中央目录解压"""
+        deadline = time.time() + self.idle_timeout
+        while self._contiguous_bytes(upload_id, meta) < meta["size"]:
+            if time.time() > deadline:
+                raise TimeoutError("No new chunks received")
+            time.sleep(0.2)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        entries, extracted = _extract_zipfile(
+            self._path(upload_id, "data.part"), staging_dir
+        )
+        self._set_state(
+            upload_id, status=EXTRACTING, entries=entries, extracted=extracted
+        )
+
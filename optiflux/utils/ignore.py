@@ -0,0 +1,251 @@
+import os
+import re
+
+# 每个目录下读取的忽略规则文件，后者优先
+IGNORE_FILES = (".gitignore", ".optifluxignore")
+
+
+def _translate(pattern):
+    """将单条 gitignore 模式（已去掉 ! 与首尾的 /）转为正则"""
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            j = i
+            while j < n and pattern[j] == "*":
+                j += 1
+            # 独占一级路径的 ** 匹配任意层目录；其余情况与 * 相同
+            if j - i >= 2 and (i == 0 or pattern[i - 1] == "/"):
+                if j == n:
+                    out.append(".*")
+                    i = j
+                    continue
+                if pattern[j] == "/":
+                    out.append("(?:.*/)?")
+                    i = j + 1
+                    continue
+            out.append("[^/]*")
+            i = j
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            j = i + 1
+            if j < n and pattern[j] in "!^":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 1
+            if j >= n:  # 没有闭合的 [ 按字面匹配
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = pattern[i + 1 : j].replace("\\", "\\\\")
+            if body[0] in "!^":
+                body = "^" + body[1:]
+            out.append(f"(?!/)[{body}]")
+            i = j + 1
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+def parse_pattern(line):
+    """
+    解析一行 gitignore 规则。
+    :return: (是否为否定规则, 是否只匹配目录, 正则)，空行与注释返回 None
+    """
+    line = line.rstrip("\n\r")
+    # 末尾未转义的空格不属于模式
+    while line.endswith(" ") and not line.endswith("\\ "):
+        line = line[:-1]
+    if not line or line.startswith("#"):
+        return None
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    # 含 / 的模式相对规则文件所在目录匹配，否则匹配任意层级的文件名
+    anchored = "/" in line
+    regex = _translate(line.lstrip("/"))
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+    return negate, dir_only, regex
+
+
+class _RuleSet:
+    """
+    一个目录下的规则。相邻的同类（忽略/否定）规则合并为一个正则，从后往前逐组
+    匹配，第一个命中的组决定结果，与 gitignore “最后一条匹配的规则生效” 一致。
+    """
+
+    def __init__(self, lines):
+        self.groups = []  # [(negate, 目录正则, 文件正则)]
+        run = []
+        for line in lines:
+            rule = parse_pattern(line)
+            if rule is None:
+                continue
+            if run and run[-1][0] != rule[0]:
+                self._add_group(run)
+                run = []
+            run.append(rule)
+        if run:
+            self._add_group(run)
+
+    def _add_group(self, rules):
+        def compile_rules(selected):
+            if not selected:
+                return None
+            return re.compile("|".join(f"(?:{regex})" for _, _, regex in selected))
+
+        self.groups.append(
+            (
+                rules[0][0],
+                compile_rules(rules),
+                compile_rules([rule for rule in rules if not rule[1]]),
+            )
+        )
+
+    def match(self, relative_path, is_dir):
+        """
+        :return: True 忽略、False 明确不忽略（否定规则）、None 未命中
+        """
+        for negate, dir_regex, file_regex in reversed(self.groups):
+            regex = dir_regex if is_dir else file_regex
+            if regex is not None and regex.fullmatch(relative_path):
+                return not negate
+        return None
+
+
+class IgnoreMatcher:
+    """
+    gitignore 语义的忽略规则匹配器。
+
+    - 规则来自 root 及各级子目录下的 .gitignore / .optifluxignore，按需读取并缓存；
+      子目录中的规则优先于上级目录，内置的默认规则优先级最低；
+    - 支持 *、?、[...]、**、! 否定、结尾 / 只匹配目录、含 / 时相对规则文件目录匹配；
+    - 目录被忽略时其下所有文件都被忽略（不能被否定规则重新包含），walk 会直接剪枝，
+      不进入被忽略的目录。
+    """
+
+    def __init__(self, root, patterns=(), ignore_files=IGNORE_FILES):
+        """
+        :param root: 仓库根目录，规则中的路径相对于此
+        :param patterns: 内置的默认规则（gitignore 语法）
+        :param ignore_files: 各目录下读取的规则文件名
+        """
+        self.root = os.path.abspath(root)
+        self._prefix = os.path.join(self.root, "")
+        self.patterns = list(patterns)
+        self.ignore_files = ignore_files
+        self._rules = {}  # 相对目录 -> _RuleSet 或 None
+        self._dirs = {}  # 相对目录 -> 是否被忽略
+
+    def _rule_set(self, relative_dir):
+        if relative_dir not in self._rules:
+            lines = list(self.patterns) if relative_dir == "" else []
+            directory = os.path.join(self.root, relative_dir)
+            for name in self.ignore_files:
+                try:
+                    with open(os.path.join(directory, name), encoding="utf-8") as f:
+                        lines.extend(f)
+                except OSError:
+                    continue
+            self._rules[relative_dir] = _RuleSet(lines) if lines else None
+        return self._rules[relative_dir]
+
+    def _relative(self, path):
+        """相对 root 的 posix 路径（root 自身为 ""），root 之外的路径返回 None"""
+        absolute = os.path.abspath(path)
+        if absolute == self.root:
+            return ""
+        if not absolute.startswith(self._prefix):
+            return None
+        return absolute[len(self._prefix) :].replace(os.sep, "/")
+
+    def _match(self, relative, is_dir):
+        """只看路径自身（不看上级目录）是否被忽略"""
+        parts = relative.split("/")
+        # 从最深的规则文件开始，第一个明确的结果生效
+        for depth in range(len(parts) - 1, -1, -1):
+            rule_set = self._rule_set("/".join(parts[:depth]))
+            if rule_set is None:
+                continue
+            result = rule_set.match("/".join(parts[depth:]), is_dir)
+            if result is not None:
+                return result
+        return False
+
+    def _dir_ignored(self, relative):
+        if relative not in self._dirs:
+            parent = relative.rpartition("/")[0]
+            self._dirs[relative] = (parent and self._dir_ignored(parent)) or (
+                self._match(relative, True)
+            )
+        return self._dirs[relative]
+
+    def is_ignored(self, path, is_dir=None):
+        """
+        :param path: 文件或目录路径（绝对路径或相对当前目录）
+        :param is_dir: 是否为目录，默认检查文件系统
+        """
+        relative = self._relative(path)
+        if not relative:
+            return False
+        if is_dir is None:
+            is_dir = os.path.isdir(path)
+        if is_dir:
+            return self._dir_ignored(relative)
+        parent = relative.rpartition("/")[0]
+        if parent and self._dir_ignored(parent):
+            return True
+        return self._match(relative, False)
+
+    def walk(self, top, on_ignored=None):
+        """
+        遍历 top 下未被忽略的文件，被忽略的目录不会进入。
+        :param on_ignored: 遇到被忽略的文件或目录时的回调 on_ignored(路径)
+        :return: 文件路径迭代器（与 os.walk 拼出的路径形式一致）
+        """
+        if self.is_ignored(top, True):
+            if on_ignored is not None:
+                on_ignored(top)
+            return
+        for dirpath, dirnames, filenames in os.walk(top):
+            relative_dir = self._relative(dirpath)
+            kept = []
+            for name in dirnames:
+                path = os.path.join(dirpath, name)
+                if relative_dir is None:
+                    ignored = False
+                else:
+                    relative = f"{relative_dir}/{name}" if relative_dir else name
+                    # 上级目录未被忽略（否则不会进入），只需看目录自身
+                    if relative not in self._dirs:
+                        self._dirs[relative] = self._match(relative, True)
+                    ignored = self._dirs[relative]
+                if ignored:
+                    if on_ignored is not None:
+                        on_ignored(path)
+                else:
+                    kept.append(name)
+            dirnames[:] = kept
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if relative_dir is not None:
+                    relative = f"{relative_dir}/{name}" if relative_dir else name
+                    if self._match(relative, False):
+                        if on_ignored is not None:
+                            on_ignored(path)
+                        continue
+                yield path
@@ -0,0 +1,134 @@
+import os
+
+try:  # 可选依赖：无 /proc 时用于枚举子进程和读取内存
+    import psutil
+except ImportError:
+    psutil = None
+
+# smaps_rollup 中关心的字段（单位 kB）
+_SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared_clean",
+    "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean",
+    "Private_Dirty": "private_dirty",
+    "Swap": "swap",
+}
+
+
+def process_memory(pid):
+    """
+    读取单个进程的内存占用（字节）。
+
+    优先解析 /proc/<pid>/smaps_rollup，其中 Pss 按共享进程数均摊共享页，
+    因此多个 worker 的 Pss 之和才是真实占用；无法读取时退回 psutil。
+
+    :param pid: 进程 ID
+    :return: 包含 rss/pss/shared/private 等字段的字典
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            usage = {}
+            for line in f:
+                parts = line.split()
+                field = _SMAPS_FIELDS.get(parts[0].rstrip(":"))
+                if field is not None:
+                    usage[field] = int(parts[1]) * 1024
+        usage["shared"] = usage.get("shared_clean", 0) + usage.get("shared_dirty", 0)
+        usage["private"] = usage.get("private_clean", 0) + usage.get(
+            "private_dirty", 0
+        )
+        return usage
+    except (OSError, IndexError, ValueError):
+        pass
+
+    if psutil is None:
+        return {}
+    info = psutil.Process(pid).memory_full_info()
+    rss = info.rss
+    private = getattr(info, "uss", rss)
+    return {
+        "rss": rss,
+        "pss": getattr(info, "pss", rss),
+        "shared": getattr(info, "shared", rss - private),
+        "private": private,
+        "swap": getattr(info, "swap", 0),
+    }
+
+
+def _children(pid):
+    """返回 pid 的全部子进程（递归）"""
+    if psutil is not None:
+        try:
+            return [p.pid for p in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+
+    children = []
+    pending = [pid]
+    while pending:
+        parent = pending.pop()
+        try:
+            with open(f"/proc/{parent}/task/{parent}/children") as f:
+                direct = [int(child) for child in f.read().split()]
+        except OSError:
+            direct = []
+        children.extend(direct)
+        pending.extend(direct)
+    return children
+
+
+def _is_gunicorn(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return b"gunicorn" in f.read()
+    except OSError:
+        if psutil is None:
+            return False
+        try:
+            return "gunicorn" in " ".join(psutil.Process(pid).cmdline())
+        except psutil.Error:
+            return False
+
+
+def memory_report(root_pid=None):
+    """
+    统计 master 及其全部 worker 的内存占用与共享情况。
+
+    RSS 之和会把共享页重复计算，Pss 之和是真实占用，二者之差即 fork
+    写时复制共享所节省的内存。
+
+    :param root_pid: master 进程 ID；默认在 gunicorn worker 中取父进程，否则取当前进程
+    :return: 包含各进程明细与汇总的字典
+    """
+    if root_pid is None:
+        parent = os.getppid()
+        root_pid = parent if _is_gunicorn(parent) else os.getpid()
+
+    processes = []
+    for pid in [root_pid] + _children(root_pid):
+        try:
+            usage = process_memory(pid)
+        except Exception:
+            # 进程可能在统计过程中退出
+            continue
+        role = "master" if pid == root_pid else "worker"
+        processes.append({"pid": pid, "role": role, **usage})
+
+    rss_sum = sum(p.get("rss", 0) for p in processes)
+    pss_sum = sum(p.get("pss", 0) for p in processes)
+    shared_sum = sum(p.get("shared", 0) for p in processes)
+    return {
+        "root_pid": root_pid,
+        "current_pid": os.getpid(),
+        "processes": processes,
+        "total": {
+            "rss": rss_sum,
+            "pss": pss_sum,
+            "shared": shared_sum,
+            "private": sum(p.get("private", 0) for p in processes),
+            "saved_by_sharing": rss_sum - pss_sum,
+        },
+        "shared_ratio": round(shared_sum / rss_sum, 4) if rss_sum else 0.0,
+    }
@@ -0,0 +1,401 @@
+import json
+import os
+import signal
+import sqlite3
+import threading
+import time
+
+from ..config import META_DB_DIR
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS services (
+    port INTEGER PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    pgid INTEGER NOT NULL,
+    start_time TEXT NOT NULL,
+    env TEXT,
+    model_name TEXT,
+    model_version TEXT,
+    service_type TEXT,
+    pid_file TEXT,
+    launched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS desired (
+    port INTEGER PRIMARY KEY,
+    env TEXT,
+    model_name TEXT,
+    model_version TEXT,
+    service_type TEXT,
+    command TEXT NOT NULL,
+    cwd TEXT,
+    log_path TEXT,
+    hold_until REAL NOT NULL DEFAULT 0,
+    state TEXT,
+    restarts INTEGER NOT NULL DEFAULT 0,
+    consecutive_failures INTEGER NOT NULL DEFAULT 0,
+    last_exit_code INTEGER,
+    last_exit_at REAL,
+    next_start_at REAL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# supervisor 可更新的运行状态字段
+_STATUS_FIELDS = {
+    "state",
+    "restarts",
+    "consecutive_failures",
+    "last_exit_code",
+    "last_exit_at",
+    "next_start_at",
+}
+
+
+def proc_start_time(pid):
+    """
+    读取进程的启动时间标识，用于识别 PID 复用。
+    Linux 上为 /proc/<pid>/stat 的第 22 个字段（开机以来的时钟滴答数）。
+    :param pid: 进程 ID
+    :return: 启动时间字符串，进程不存在时返回 None
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            # 第 2 个字段（进程名）可能包含空格，从最后一个 ")" 之后开始切分
+            fields = f.read().rsplit(b")", 1)[1].split()
+        if fields[0] == b"Z":
+            return None  # 僵尸进程视为已退出
+        return fields[19].decode()
+    except (OSError, IndexError):
+        pass
+    try:
+        import psutil
+
+        return repr(psutil.Process(pid).create_time())
+    except Exception:
+        return None
+
+
+# 由控制面通过 subprocess.Popen 直接启动、未交给 asyncio 的服务进程：pid -> Popen。
+# 只通过 Popen.poll 回收这些进程；其他 PID（如 supervisor 的 asyncio 子进程）不调用
+# waitpid，以免抢先回收而使其等待方拿不到退出码
+_children = {}
+_children_lock = threading.Lock()
+
+
+def track_child(process):
+    """登记直接启动的服务进程（subprocess.Popen），退出后在存活检查时回收"""
+    with _children_lock:
+        _children[process.pid] = process
+
+
+def _reap(pid):
+    """回收已退出的登记子进程，否则它会一直以僵尸进程存在"""
+    process = _children.get(pid)
+    if process is not None and process.poll() is not None:
+        with _children_lock:
+            _children.pop(pid, None)
+
+
+def _leader_alive(leader):
+    _reap(leader)
+    return proc_start_time(leader) is not None
+
+
+def stop_process_group(pgid, timeout=30, sig=signal.SIGTERM, leader=None):
+    """
+    停止整个进程组：先发 sig，超时后发 SIGKILL。
+
+    以组长（gunicorn master）是否退出判断停止完成：master 优雅退出前会等待
+    全部 worker 结束；已退出的 worker 可能暂时以僵尸进程留在组内，不必等待。
+
+    :param pgid: 进程组 ID
+    :param timeout: 等待组长退出的最长时间（秒）
+    :param sig: 首先发送的信号（SIGTERM 为优雅退出）
+    :param leader: 组长 PID，默认与进程组 ID 相同
+    :return: 是否需要强制杀掉
+    """
+    leader = pgid if leader is None else leader
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        return False
+    deadline = time.time() + timeout
+    while _leader_alive(leader) and time.time() < deadline:
+        time.sleep(0.1)
+    if not _leader_alive(leader):
+        return False
+
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    deadline = time.time() + 5
+    while _leader_alive(leader) and time.time() < deadline:
+        time.sleep(0.05)
+    return True
+
+
+class PidRegistry:
+    """
+    控制面启动的服务进程登记表：端口 -> master PID、进程组与启动时间。
+
+    停止、重启与状态查询只需一次 /proc 读取和一次信号，不再扫描整张进程表；
+    启动时间用于识别 PID 被其他进程复用的情况。服务以独立会话启动，
+    进程组 ID 即 master PID，向进程组发信号即可同时覆盖 master 与全部 worker。
+
+    desired 表保存 supervisor 托管的期望状态（启动命令与重启统计），
+    控制面的任一 worker 都可以写入，由持有 supervisor 锁的进程负责执行。
+    """
+
+    def __init__(self, db_path):
+        """
+        :param db_path: SQLite 数据库文件路径
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        """每个线程一个连接；fork 后的子进程重新建立连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def record(self, port, pid, **meta):
+        """
+        登记新启动的服务（同一端口的旧记录被覆盖）。
+        :param port: 服务端口
+        :param pid: master 进程 ID
+        :param meta: env/model_name/model_version/service_type/pid_file 等附加信息
+        :return: 登记的记录，进程已退出时返回 None
+        """
+        start_time = proc_start_time(pid)
+        if start_time is None:
+            return None
+        try:
+            pgid = os.getpgid(pid)
+        except OSError:
+            return None
+        entry = {
+            "port": port,
+            "pid": pid,
+            "pgid": pgid,
+            "start_time": start_time,
+            "env": meta.get("env"),
+            "model_name": meta.get("model_name"),
+            "model_version": meta.get("model_version"),
+            "service_type": meta.get("service_type"),
+            "pid_file": meta.get("pid_file"),
+            "launched_at": time.time(),
+        }
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO services (port, pid, pgid, start_time, env, "
+                "model_name, model_version, service_type, pid_file, launched_at) "
+                "VALUES (:port, :pid, :pgid, :start_time, :env, :model_name, "
+                ":model_version, :service_type, :pid_file, :launched_at)",
+                entry,
+            )
+        return entry
+
+    def get(self, port):
+        """
+        查询端口的登记记录（不检查进程是否存活）。
+        :param port: 服务端口
+        :return: 记录字典或 None
+        """
+        row = (
+            self._connect()
+            .execute("SELECT * FROM services WHERE port = ?", (port,))
+            .fetchone()
+        )
+        return dict(row) if row else None
+
+    def remove(self, port, pid=None):
+        """
+        删除端口的登记记录。
+        :param pid: 指定时只删除该 PID 的记录（避免误删新进程的记录）
+        """
+        with self._connect() as conn:
+            if pid is None:
+                conn.execute("DELETE FROM services WHERE port = ?", (port,))
+            else:
+                conn.execute(
+                    "DELETE FROM services WHERE port = ? AND pid = ?", (port, pid)
+                )
+
+    @staticmethod
+    def is_alive(entry):
+        """记录对应的进程是否仍在运行（PID 存在且启动时间一致）"""
+        if entry is None:
+            return False
+        _reap(entry["pid"])
+        return proc_start_time(entry["pid"]) == entry["start_time"]
+
+    def lookup(self, port):
+        """
+        查询端口上由控制面启动且仍在运行的服务。
+        :param port: 服务端口
+        :return: 记录字典；未登记或进程已退出时返回 None（并清理失效记录）
+        """
+        entry = self.get(port)
+        if entry is None:
+            return None
+        if not self.is_alive(entry):
+            self.remove(port, entry["pid"])
+            return None
+        return entry
+
+    def stop_entry(self, entry, timeout=30, sig=signal.SIGTERM):
+        """
+        停止一条记录对应的整个进程组并删除记录。
+        :param entry: 登记记录
+        :param timeout: 等待进程组退出的最长时间（秒）
+        :param sig: 首先发送的信号（SIGTERM 为优雅退出）
+        :return: 是否需要强制杀掉
+        """
+        forced = False
+        if self.is_alive(entry):
+            forced = stop_process_group(
+                entry["pgid"], timeout=timeout, sig=sig, leader=entry["pid"]
+            )
+        self.remove(entry["port"], entry["pid"])
+        return forced
+
+    def stop(self, port, timeout=30, sig=signal.SIGTERM):
+        """
+        停止端口上登记的服务。
+        :return: True 表示找到并停止了登记的服务，False 表示端口未登记
+        """
+        entry = self.lookup(port)
+        if entry is None:
+            return False
+        self.stop_entry(entry, timeout=timeout, sig=sig)
+        return True
+
+    def entries(self):
+        """全部登记记录（附带 alive 字段）"""
+        rows = self._connect().execute("SELECT * FROM services ORDER BY port")
+        return [{**dict(row), "alive": self.is_alive(row)} for row in rows]
+
+    def reconcile(self):
+        """
+        清理已退出进程的记录（控制面启动时调用）。
+        :return: (存活数, 清理数)
+        """
+        alive, removed = 0, 0
+        for entry in self.entries():
+            if entry["alive"]:
+                alive += 1
+            else:
+                self.remove(entry["port"], entry["pid"])
+                removed += 1
+        return alive, removed
+
+    # ---------------------------------------------------------------- 期望状态
+
+    def set_desired(self, port, command, cwd=None, log_path=None, **meta):
+        """
+        托管端口：记录服务的启动命令，进程退出后由 supervisor 重新拉起。
+        已托管的端口更新命令并清零连续失败次数，累计重启次数保留。
+        :param port: 服务端口
+        :param command: 启动命令（参数列表，不经过 shell）
+        :param cwd: 工作目录
+        :param log_path: 标准输出与错误输出的日志文件
+        :param meta: env/model_name/model_version/service_type
+        """
+        row = {
+            "port": port,
+            "env": meta.get("env"),
+            "model_name": meta.get("model_name"),
+            "model_version": meta.get("model_version"),
+            "service_type": meta.get("service_type"),
+            "command": json.dumps(list(command)),
+            "cwd": cwd,
+            "log_path": log_path,
+            "updated_at": time.time(),
+        }
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO desired (port, env, model_name, model_version, "
+                "service_type, command, cwd, log_path, updated_at) VALUES (:port, "
+                ":env, :model_name, :model_version, :service_type, :command, :cwd, "
+                ":log_path, :updated_at) ON CONFLICT(port) DO UPDATE SET "
+                "env = excluded.env, model_name = excluded.model_name, "
+                "model_version = excluded.model_version, "
+                "service_type = excluded.service_type, command = excluded.command, "
+                "cwd = excluded.cwd, log_path = excluded.log_path, hold_until = 0, "
+                "consecutive_failures = 0, next_start_at = NULL, "
+                "updated_at = excluded.updated_at",
+                row,
+            )
+
+    def get_desired(self, port):
+        """查询端口的期望状态，未托管时返回 None"""
+        row = (
+            self._connect()
+            .execute("SELECT * FROM desired WHERE port = ?", (port,))
+            .fetchone()
+        )
+        return self._desired_row(row) if row else None
+
+    def desired(self):
+        """全部托管端口的期望状态"""
+        rows = self._connect().execute("SELECT * FROM desired ORDER BY port")
+        return [self._desired_row(row) for row in rows]
+
+    @staticmethod
+    def _desired_row(row):
+        spec = dict(row)
+        spec["command"] = json.loads(spec["command"])
+        return spec
+
+    def clear_desired(self, port):
+        """取消托管（不停止进程）"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM desired WHERE port = ?", (port,))
+
+    def hold(self, port, seconds):
+        """
+        暂停 supervisor 对端口的重启（滚动重启等运维操作期间），seconds 为 0 时恢复。
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE desired SET hold_until = ? WHERE port = ?",
+                (time.time() + seconds if seconds else 0, port),
+            )
+
+    def update_status(self, port, **fields):
+        """更新 supervisor 记录的运行状态（state/restarts/last_exit_code 等）"""
+        fields = {k: v for k, v in fields.items() if k in _STATUS_FIELDS}
+        if not fields:
+            return
+        assignments = ", ".join(f"{name} = :{name}" for name in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE desired SET {assignments} WHERE port = :port",
+                {**fields, "port": port},
+            )
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def default_registry():
+    """控制面共享的登记表，保存在 META_DB_DIR/data/services.db"""
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = PidRegistry(
+                    os.path.join(META_DB_DIR, "data", "services.db")
+                )
+    return _default_registry
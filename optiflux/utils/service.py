@@ -6,31 +6,62 @@ import psutil
 import signal
 import json
 from ..config import ENV_DIRS
+from .pids import default_registry, stop_process_group, track_child
 import traceback
 import socket
+import shlex
+import asyncio
+import logging
+import threading
+
+try:  # Windows 上没有 fcntl，supervisor 不做跨进程选主
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 配置日志
+logger = logging.getLogger("optiflux.ServiceSupervisor")
 
 
 def get_port_status(port):
     """
-    检查端口状态。
+    检查端口状态：控制面登记的服务只读取 /proc/<pid>/stat，
+    其余端口查询内核的监听 socket 表（不再调用 lsof）。
     :param port: 端口号
     :return: 端口状态（running/failed/error）
     """
     try:
-        process = subprocess.run(
-            ["lsof", "-i", f":{port}"], capture_output=True, text=True
-        )
-        stdout = process.stdout
-        stderr = process.stderr
-
-        if "PID" in stdout:
+        if default_registry().lookup(port) is not None:
             return "running"
-        else:
-            return "failed"
+        listening = listening_ports()
+        if listening is None:
+            return "running" if is_port_in_use(port) else "failed"
+        return "running" if port in listening else "failed"
     except Exception:
         return f"Error: {traceback.format_exc()}"
 
 
+def listening_ports():
+    """
+    读取 /proc/net/tcp 与 /proc/net/tcp6 中处于 LISTEN 状态的端口。
+    :return: 端口集合，无法读取（非 Linux）时返回 None
+    """
+    ports = set()
+    found = False
+    for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(path) as f:
+                next(f, None)  # 表头
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 3 and fields[3] == "0A":  # 0A = LISTEN
+                        ports.add(int(fields[1].rsplit(":", 1)[1], 16))
+            found = True
+        except OSError:
+            continue
+    return ports if found else None
+
+
 def is_port_in_use(port):
     """
     检查端口是否被占用。
@@ -207,42 +238,73 @@ def start_service_with_nohup(script_path):
         return False
 
 
-def generate_service_script(env, model_name, model_version, service_type, config):
+def gunicorn_command(env, model_name, model_version, service_type, config):
     """
-    生成启动单个服务的脚本文件。
+    构造启动单个服务的 gunicorn 命令（参数列表，可直接执行，无需 shell）。
     :param env: 环境（dev/preprod/prod）
     :param model_name: 模型名称
     :param model_version: 模型版本
     :param service_type: 服务类型（recomserver/rewardserver）
     :param config: 服务配置（包含 port, workers 等信息）
-    :return: 脚本文件路径
+    :return: 命令参数列表
     """
     port = config.get("port")
     workers = config.get("workers", 1)  # 默认 1 个 worker
-    log_file = f"{service_type}_{port}.log"
-    log_path = os.path.join(
-        ENV_DIRS.get(env), model_name, model_version, "logs", log_file
-    )
     project_root = os.path.join(ENV_DIRS.get(env), model_name, model_version)
+    log_path = os.path.join(project_root, "logs", f"{service_type}_{port}.log")
 
     # 确保日志目录存在
     os.makedirs(os.path.dirname(log_path), exist_ok=True)
 
-    # 获取项目根目录
-    # project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    # --reuse-port 允许滚动重启时新旧进程同时监听该端口
+    return [
+        "gunicorn",
+        "--workers",
+        str(workers),
+        "--bind",
+        f":{port}",
+        "--reuse-port",
+        "--worker-class",
+        "uvicorn.workers.UvicornWorker",
+        "--preload",
+        "--chdir",
+        project_root,
+        f"src.{service_type}:app",
+        "--log-file",
+        log_path,
+        "--log-level",
+        "info",
+    ]
+
 
-    # 脚本内容
+def generate_service_script(env, model_name, model_version, service_type, config):
+    """
+    生成启动单个服务的脚本文件。
+    :param env: 环境（dev/preprod/prod）
+    :param model_name: 模型名称
+    :param model_version: 模型版本
+    :param service_type: 服务类型（recomserver/rewardserver）
+    :param config: 服务配置（包含 port, workers 等信息）
+    :return: 脚本文件路径
+    """
+    port = config.get("port")
+    command = gunicorn_command(env, model_name, model_version, service_type, config)
+    # 每个选项与其取值占一行
+    lines = []
+    for arg in command:
+        if lines and not arg.startswith("-") and lines[-1][-1].startswith("-"):
+            lines[-1].append(arg)
+        else:
+            lines.append([arg])
+    command_line = " \\\n         ".join(
+        " ".join(shlex.quote(arg) for arg in line) for line in lines
+    )
+
+    # 脚本内容（额外参数如就绪探测地址、pid 文件由调用方通过 "$@" 传入）
     script_content = f"""#!/bin/bash
 
-# 启动 gunicorn
-gunicorn --workers {workers} \\
-         --bind :{port} \\
-         --worker-class uvicorn.workers.UvicornWorker \\
-         --preload \\
-         --chdir {project_root} \\
-         src.{service_type}:app \\
-         --log-file {log_path} \\
-         --log-level info
+exec {command_line} \\
+         "$@"
 """
 
     # 脚本文件路径
@@ -254,29 +316,46 @@ gunicorn --workers {workers} \\
     # 确保脚本目录存在
     os.makedirs(os.path.dirname(script_path), exist_ok=True)
 
-    # 写入脚本文件
-    with open(script_path, "w") as f:
+    # 写入临时文件后改名：正在执行旧脚本的进程不受影响
+    tmp_path = f"{script_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
         f.write(script_content)
 
     # 赋予脚本执行权限
-    st = os.stat(script_path)
-    os.chmod(script_path, st.st_mode | stat.S_IEXEC)
+    st = os.stat(tmp_path)
+    os.chmod(tmp_path, st.st_mode | stat.S_IEXEC)
+    os.replace(tmp_path, script_path)
 
     return script_path
 
 
+def stop_port(port, timeout=30, sig=signal.SIGTERM):
+    """
+    停止监听端口的服务。
+    先取消 supervisor 对该端口的托管，否则被主动停止的服务会被重新拉起；
+    控制面登记过的服务直接向其进程组发信号；未登记的（如手工启动的）服务
+    才退回按端口查找监听进程。
+    :param port: 端口号
+    :param timeout: 等待优雅退出的最长时间（秒），超时后强制杀掉
+    :param sig: 首先发送的信号
+    :return: 是否停止了服务
+    """
+    registry = default_registry()
+    registry.clear_desired(port)
+    if registry.stop(port, timeout=timeout, sig=sig):
+        return True
+    masters = find_listening_masters(port)
+    if not masters:
+        return False
+    drain_processes(masters, timeout=timeout)
+    return True
+
+
 def kill_process_by_port(port):
     """
     根据端口号杀掉相关进程。
     """
-    for proc in psutil.process_iter(["pid", "name", "connections"]):
-        try:
-            for conn in proc.connections():
-                if conn.laddr.port == port:
-                    proc.kill()
-                    break
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            continue
+    stop_port(port, timeout=0, sig=signal.SIGKILL)
 
 
 def start_gunicorn_service(env, model_name, model_version, service_type, config):
@@ -299,16 +378,15 @@ def start_gunicorn_service(env, model_name, model_version, service_type, config)
     # 确保日志目录存在
     os.makedirs(os.path.dirname(log_path), exist_ok=True)
 
-    # 如果端口被占用，杀掉占用端口的进程
-    for proc in psutil.process_iter(["pid", "name", "connections"]):
-        try:
-            for conn in proc.connections():
-                if conn.laddr.port == port:
-                    print(f"Killing process {proc.pid} using port {port}")
-                    os.kill(proc.pid, signal.SIGTERM)
-                    time.sleep(1)  # 等待进程终止
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            continue
+    # 如果端口被占用，停止占用端口的服务
+    if stop_port(port):
+        print(f"Stopped service using port {port}")
+    pid_file = os.path.join(
+        ENV_DIRS.get(env), model_name, model_version, "scripts", f"{service_type}_{port}.pid"
+    )
+    os.makedirs(os.path.dirname(pid_file), exist_ok=True)
+    if os.path.exists(pid_file):
+        os.remove(pid_file)
 
     # 启动 gunicorn 服务
     command = [
@@ -325,13 +403,657 @@ def start_gunicorn_service(env, model_name, model_version, service_type, config)
         log_path,
         "--log-level",
         "info",
+        "--pid",
+        pid_file,
         "--daemon",  # 后台运行
     ]
 
     try:
         subprocess.run(command, check=True)
         print(f"Started {service_type} on port {port}")
+        _record_daemon(
+            port,
+            pid_file,
+            env=env,
+            model_name=model_name,
+            model_version=model_version,
+            service_type=service_type,
+        )
         return port
     except subprocess.CalledProcessError as e:
         print(f"Failed to start {service_type} on port {port}: {e}")
         return None
+
+
+def _record_daemon(port, pid_file, timeout=10, **meta):
+    """等待 daemon 模式的 gunicorn 写出 pid 文件，并登记 master PID"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with open(pid_file) as f:
+                pid = int(f.read().strip())
+        except (OSError, ValueError):
+            time.sleep(0.1)
+            continue
+        return default_registry().record(port, pid, pid_file=pid_file, **meta)
+    print(f"No pid file written for port {port}, service is not registered")
+    return None
+
+
+def find_free_port(host="127.0.0.1"):
+    """
+    申请一个当前空闲的端口。
+    :param host: 绑定地址
+    :return: 端口号
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def can_share_port(port):
+    """
+    检查端口能否通过 SO_REUSEPORT 与现有监听者共享。
+    只有当前监听者同样设置了 SO_REUSEPORT（且属于同一用户）时才能绑定成功。
+    :param port: 端口号
+    :return: True 表示可以与旧进程同时监听
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        return False
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        try:
+            sock.bind(("0.0.0.0", port))
+            return True
+        except OSError:
+            return False
+
+
+def find_listening_masters(port):
+    """
+    查找监听指定端口的进程，只返回最上层进程（gunicorn master）。
+    需要遍历进程表，仅用于控制面未登记的服务。
+    :param port: 端口号
+    :return: psutil.Process 列表
+    """
+    listening = listening_ports()
+    if listening is not None and port not in listening:
+        return []  # 端口无人监听，无需扫描进程表
+
+    pids = set()
+    try:
+        for conn in psutil.net_connections(kind="inet"):
+            if conn.laddr and conn.laddr.port == port and conn.status == "LISTEN":
+                if conn.pid:
+                    pids.add(conn.pid)
+    except psutil.AccessDenied:
+        for proc in psutil.process_iter(["pid"]):
+            try:
+                for conn in proc.connections(kind="inet"):
+                    if conn.laddr.port == port and conn.status == "LISTEN":
+                        pids.add(proc.pid)
+                        break
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+
+    # 共享的监听 socket 可能只归到 worker 名下，沿父进程上溯到 master
+    masters = {}
+    for pid in pids:
+        try:
+            proc = psutil.Process(pid)
+            while True:
+                parent = proc.parent()
+                if parent is None or not _same_server(parent, proc):
+                    break
+                proc = parent
+            masters[proc.pid] = proc
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return list(masters.values())
+
+
+def _same_server(parent, child):
+    """
+    判断 parent 是否为 child 所属的 gunicorn master：
+    fork 出的 worker 与 master 命令行相同，装有 setproctitle 时为 master/worker 标题。
+    """
+    parent_cmd = " ".join(parent.cmdline())
+    child_cmd = " ".join(child.cmdline())
+    if parent_cmd == child_cmd:
+        return True
+    return child_cmd.startswith("gunicorn: worker") and parent_cmd.startswith(
+        "gunicorn: master"
+    )
+
+
+def drain_processes(masters, timeout=30):
+    """
+    优雅停止进程：先发 SIGTERM（gunicorn 会等待 worker 处理完在途请求），
+    超时后对仍存活的进程发 SIGKILL。
+    :param masters: 需要停止的 master 进程列表
+    :param timeout: 等待优雅退出的最长时间（秒）
+    :return: 被强制杀掉的进程数
+    """
+    procs = []
+    for master in masters:
+        try:
+            procs.append(master)
+            procs.extend(master.children(recursive=True))
+            master.send_signal(signal.SIGTERM)
+        except psutil.NoSuchProcess:
+            continue
+    _, alive = psutil.wait_procs(procs, timeout=timeout)
+    for proc in alive:
+        try:
+            proc.kill()
+        except psutil.NoSuchProcess:
+            pass
+    psutil.wait_procs(alive, timeout=5)
+    return len(alive)
+
+
+def wait_until_ready(port, process=None, path="/docs", timeout=120, interval=0.2):
+    """
+    通过 HTTP 请求探测服务是否就绪（返回 5xx 以外的状态码即视为就绪）。
+    :param port: 探测端口（本机回环地址）
+    :param process: 对应的 Popen 对象，进程提前退出时立即返回失败
+    :param path: 探测路径
+    :param timeout: 最长等待时间（秒）
+    :param interval: 探测间隔（秒）
+    :return: 是否就绪
+    """
+    import http.client
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+        try:
+            conn.request("GET", path)
+            if conn.getresponse().status < 500:
+                return True
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            conn.close()
+        time.sleep(interval)
+    return False
+
+
+def launch_service(command, log_path, cwd=None):
+    """
+    在独立进程组中直接启动服务命令（不经过 shell，返回的进程即 gunicorn master）。
+    :param command: 命令参数列表
+    :param log_path: 标准输出与错误输出的日志文件
+    :param cwd: 工作目录
+    :return: subprocess.Popen 对象
+    """
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen(
+            list(command),
+            cwd=cwd,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    track_child(process)
+    return process
+
+
+def tcp_migrate_req_enabled():
+    """
+    内核是否开启 net.ipv4.tcp_migrate_req（Linux 5.14+）。
+    开启后旧监听 socket 关闭时，其队列中尚未 accept 的连接会迁移到同端口的新进程，
+    否则这部分连接会被重置。
+    :return: True/False，无法读取时返回 None
+    """
+    try:
+        with open("/proc/sys/net/ipv4/tcp_migrate_req") as f:
+            return f.read().strip() == "1"
+    except OSError:
+        return None
+
+
+def rolling_restart_port(
+    env,
+    model_name,
+    model_version,
+    service_type,
+    service_config,
+    ready_path="/docs",
+    ready_timeout=120,
+    drain_timeout=30,
+    supervise=True,
+):
+    """
+    零停机重启单个端口的服务。
+
+    1. 新 gunicorn 以 SO_REUSEPORT 与旧进程同时监听该端口，并额外绑定一个本机
+       空闲端口用于就绪探测（避免探测请求被旧进程应答）；
+    2. 就绪后向旧 master 发送 SIGTERM，旧进程处理完在途请求后退出，新连接全部
+       进入新进程；
+    3. 旧进程未设置 SO_REUSEPORT（无法共享端口）时退化为先停后起，仍以真实探测
+       代替固定等待；新进程未能就绪时保留旧进程继续服务。
+    4. supervise 为 True 时新版本交由 ServiceSupervisor 托管，崩溃后自动拉起；
+       重启期间暂停 supervisor 对该端口的干预。
+
+    :return: 包含 port、mode、status、各步骤耗时（秒）的字典
+    """
+    port = service_config.get("port")
+    start = time.time()
+    steps = {}
+    result = {"port": port, "service_type": service_type, "steps": steps}
+
+    def step(name, since):
+        steps[name] = round(time.time() - since, 3)
+        return time.time()
+
+    registry = default_registry()
+    registry.hold(port, ready_timeout + 2 * drain_timeout + 30)
+    try:
+        t = time.time()
+        # 脚本保留给运维手工启动，控制面直接执行命令
+        generate_service_script(
+            env, model_name, model_version, service_type, service_config
+        )
+        command = gunicorn_command(
+            env, model_name, model_version, service_type, service_config
+        )
+        old_entry = registry.lookup(port)
+        old_masters = [] if old_entry else find_listening_masters(port)
+        if old_entry is None and not old_masters:
+            mode = "fresh"
+        elif can_share_port(port):
+            mode = "reuseport"
+        else:
+            mode = "stop-start"
+        result["mode"] = mode
+        t = step("prepare", t)
+
+        def drain_old():
+            forced = False
+            if old_entry is not None:
+                forced = registry.stop_entry(old_entry, timeout=drain_timeout)
+            if old_masters:
+                forced = drain_processes(old_masters, timeout=drain_timeout) > 0 or forced
+            return forced
+
+        if mode == "stop-start":
+            result["forced"] = drain_old()
+            t = step("drain", t)
+
+        version_dir = os.path.join(ENV_DIRS.get(env), model_name, model_version)
+        probe_port = find_free_port()
+        pid_file = os.path.join(
+            version_dir, "scripts", f"{service_type}_{port}.{int(start * 1000)}.pid"
+        )
+        log_path = os.path.join(version_dir, "logs", f"run_{service_type}_{port}.log")
+        process = launch_service(
+            command + ["--bind", f"127.0.0.1:{probe_port}", "--pid", pid_file],
+            log_path,
+            cwd=version_dir,
+        )
+        result["pid"] = process.pid
+        result["pid_file"] = pid_file
+        t = step("launch", t)
+
+        ready = wait_until_ready(
+            probe_port, process=process, path=ready_path, timeout=ready_timeout
+        )
+        t = step("ready", t)
+        if not ready:
+            # 新进程未就绪：停止新进程，旧进程（若仍在）继续服务
+            if process.poll() is None:
+                stop_process_group(process.pid, timeout=5, leader=process.pid)
+            result.update(
+                status="error",
+                message=f"Service on port {port} did not become ready, see {log_path}",
+                total=round(time.time() - start, 3),
+            )
+            return result
+
+        registry.record(
+            port,
+            process.pid,
+            env=env,
+            model_name=model_name,
+            model_version=model_version,
+            service_type=service_type,
+            pid_file=pid_file,
+        )
+        if supervise:
+            # 托管不带探测端口与 pid 文件的命令，崩溃后按此重新拉起
+            registry.set_desired(
+                port,
+                command,
+                cwd=version_dir,
+                log_path=log_path,
+                env=env,
+                model_name=model_name,
+                model_version=model_version,
+                service_type=service_type,
+            )
+        if mode == "reuseport":
+            if tcp_migrate_req_enabled() is False:
+                result["warning"] = (
+                    "net.ipv4.tcp_migrate_req is off: connections queued on the old "
+                    "listener may be reset while draining"
+                )
+            result["forced"] = drain_old()
+            t = step("drain", t)
+
+        result.update(status="success", total=round(time.time() - start, 3))
+        return result
+    finally:
+        registry.hold(port, 0)
+
+
+def rolling_restart(
+    env, model_name, model_version, config, parallelism=4, **port_kwargs
+):
+    """
+    并发地对模型的全部 recomserver/rewardserver 端口执行零停机重启。
+    :param env: 环境（dev/preprod/prod）
+    :param model_name: 模型名称
+    :param model_version: 模型版本
+    :param config: 模型的 config.json 内容
+    :param parallelism: 同时重启的端口数上限
+    :param port_kwargs: 传给 rolling_restart_port 的参数（如 ready_timeout、drain_timeout）
+    :return: 每个端口的结果列表（按配置顺序）
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    tasks = [
+        (service_type, service_config)
+        for service_type in ["recomserver", "rewardserver"]
+        for service_config in config.get(service_type, [])
+        if service_config.get("port")
+    ]
+
+    def run(task):
+        service_type, service_config = task
+        try:
+            return rolling_restart_port(
+                env,
+                model_name,
+                model_version,
+                service_type,
+                service_config,
+                **port_kwargs,
+            )
+        except Exception as e:
+            traceback.print_exc()
+            return {
+                "port": service_config.get("port"),
+                "service_type": service_type,
+                "status": "error",
+                "message": str(e),
+            }
+
+    with ThreadPoolExecutor(max_workers=max(1, parallelism)) as pool:
+        return list(pool.map(run, tasks))
+
+
+class ServiceSupervisor:
+    """
+    服务进程 supervisor：在后台事件循环中托管 recomserver/rewardserver。
+
+    - 期望状态保存在 PidRegistry 的 desired 表中，控制面任一 worker 均可写入；
+      同一主机上只有持有 supervisor 锁的进程真正执行，持有者退出后由其他进程接管；
+    - 由自己拉起的进程通过 asyncio 子进程等待退出，接管的已有进程按间隔读取 /proc；
+    - 进程意外退出后按指数退避重新拉起，运行超过 `stable_after` 秒后退避清零；
+    - 端口已被滚动重启的新进程接管、或处于 hold 期间时不做干预。
+    """
+
+    def __init__(
+        self,
+        registry=None,
+        poll_interval=1.0,
+        backoff_base=1.0,
+        backoff_max=60.0,
+        stable_after=30.0,
+    ):
+        """
+        :param registry: PidRegistry，默认使用控制面共享的登记表
+        :param poll_interval: 期望状态与接管进程的检查间隔（秒）
+        :param backoff_base: 首次重启前的等待时间（秒），连续失败时翻倍
+        :param backoff_max: 重启等待时间上限（秒）
+        :param stable_after: 进程运行超过该时间后再退出不计入连续失败
+        """
+        self.registry = registry or default_registry()
+        self.poll_interval = poll_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self._tasks = {}  # port -> 托管协程
+        self._children = {}  # pid -> 自己拉起的 asyncio 子进程
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._pid = None
+
+    # ---------------------------------------------------------------- 生命周期
+
+    def start(self):
+        """在当前进程中惰性启动托管线程（fork 后的子进程各自启动并竞争锁）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._tasks = {}
+            self._children = {}
+            thread = threading.Thread(
+                target=self._run, name="optiflux-supervisor", daemon=True
+            )
+            thread.start()
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(self._main())
+
+    def _acquire_leader(self):
+        """非阻塞地获取 supervisor 锁，持有者所在进程退出时自动释放"""
+        if fcntl is None:
+            return True
+        if self._lock_file is None or self._lock_file[0] != os.getpid():
+            handle = open(self.registry.db_path + ".supervisor.lock", "a")
+            self._lock_file = (os.getpid(), handle, False)
+        pid, handle, held = self._lock_file
+        if held:
+            return True
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        self._lock_file = (pid, handle, True)
+        logger.info(f"Service supervisor running in process {pid}")
+        return True
+
+    async def _main(self):
+        while True:
+            try:
+                if self._acquire_leader():
+                    self._sync()
+            except Exception as e:
+                logger.error(f"Service supervisor failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def _sync(self):
+        """为每个托管端口保持一个托管协程，取消已不再托管的端口"""
+        desired = {spec["port"] for spec in self.registry.desired()}
+        for port in desired:
+            task = self._tasks.get(port)
+            if task is None or task.done():
+                self._tasks[port] = asyncio.ensure_future(self._supervise(port))
+        for port in list(self._tasks):
+            if port not in desired:
+                self._tasks.pop(port).cancel()
+
+    # ---------------------------------------------------------------- 托管
+
+    async def _supervise(self, port):
+        while True:
+            spec = self.registry.get_desired(port)
+            if spec is None:
+                return
+            if spec["hold_until"] > time.time():
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            entry = self.registry.lookup(port)
+            if entry is None:
+                entry = await self._spawn(spec)
+            self.registry.update_status(port, state="running", next_start_at=None)
+            code = await self._wait_exit(entry)
+
+            spec = self.registry.get_desired(port)
+            if spec is None or spec["hold_until"] > time.time():
+                continue  # 已取消托管，或正在滚动重启
+            if self.registry.lookup(port) is not None:
+                continue  # 端口已由新进程接管
+            await asyncio.sleep(self._record_exit(spec, entry, code))
+
+    async def _spawn(self, spec):
+        os.makedirs(os.path.dirname(spec["log_path"]), exist_ok=True)
+        with open(spec["log_path"], "ab") as log:
+            process = await asyncio.create_subprocess_exec(
+                *spec["command"],
+                cwd=spec["cwd"],
+                stdout=log,
+                stderr=asyncio.subprocess.STDOUT,
+                stdin=asyncio.subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        self._children[process.pid] = process
+        entry = self.registry.record(
+            spec["port"],
+            process.pid,
+            env=spec["env"],
+            model_name=spec["model_name"],
+            model_version=spec["model_version"],
+            service_type=spec["service_type"],
+        )
+        logger.info(
+            f"Started {spec['service_type']} on port {spec['port']} (pid {process.pid})"
+        )
+        # 进程启动后立即退出时 record 返回 None，仍按一次失败处理
+        return entry or {"pid": process.pid, "launched_at": time.time()}
+
+    async def _wait_exit(self, entry):
+        """等待进程退出，返回退出码（接管的非子进程无法获得退出码，返回 None）"""
+        process = self._children.get(entry["pid"])
+        if process is not None:
+            code = await process.wait()
+            self._children.pop(entry["pid"], None)
+            return code
+        while self.registry.is_alive(entry):
+            await asyncio.sleep(self.poll_interval)
+        return None
+
+    def _record_exit(self, spec, entry, code):
+        """记录一次意外退出，返回重新拉起前的等待时间"""
+        now = time.time()
+        if now - entry["launched_at"] >= self.stable_after:
+            failures = 1
+        else:
+            failures = spec["consecutive_failures"] + 1
+        delay = min(self.backoff_base * 2 ** (failures - 1), self.backoff_max)
+        self.registry.update_status(
+            spec["port"],
+            state="backoff",
+            restarts=spec["restarts"] + 1,
+            consecutive_failures=failures,
+            last_exit_code=code,
+            last_exit_at=now,
+            next_start_at=now + delay,
+        )
+        logger.warning(
+            f"{spec['service_type']} on port {spec['port']} exited with code {code}, "
+            f"restarting in {delay:.1f}s (consecutive failures: {failures})"
+        )
+        return delay
+
+    # ---------------------------------------------------------------- 操作与查询
+
+    def unwatch(self, port, stop=True, timeout=30):
+        """
+        取消托管端口。
+        :param stop: 是否同时优雅停止该端口的服务
+        :param timeout: 等待优雅退出的最长时间（秒）
+        :return: 是否停止了服务
+        """
+        self.registry.clear_desired(port)
+        return stop_port(port, timeout=timeout) if stop else False
+
+    def stats(self, sample_interval=0.1):
+        """
+        托管服务的运行统计：状态、重启次数、CPU 与内存（master 与 worker 合计）。
+        :param sample_interval: CPU 使用率的采样时长（秒）
+        :return: 每个托管端口一条记录的列表
+        """
+        from .memory import memory_report
+
+        services = []
+        processes = []  # (service, [psutil.Process])
+        for spec in self.registry.desired():
+            entry = self.registry.lookup(spec["port"])
+            service = {
+                key: spec[key]
+                for key in (
+                    "port",
+                    "env",
+                    "model_name",
+                    "model_version",
+                    "service_type",
+                    "state",
+                    "restarts",
+                    "consecutive_failures",
+                    "last_exit_code",
+                    "last_exit_at",
+                    "next_start_at",
+                )
+            }
+            service.update(
+                pid=None, uptime=None, workers=0, cpu_percent=None, rss=None, pss=None
+            )
+            if entry is None:
+                if service["state"] == "running":
+                    service["state"] = "stopped"
+            else:
+                report = memory_report(root_pid=entry["pid"])
+                pids = [p["pid"] for p in report["processes"]]
+                service.update(
+                    pid=entry["pid"],
+                    uptime=round(time.time() - entry["launched_at"], 1),
+                    workers=len(pids) - 1,
+                    rss=report["total"]["rss"],
+                    pss=report["total"]["pss"],
+                )
+                procs = []
+                for pid in pids:
+                    try:
+                        proc = psutil.Process(pid)
+                        proc.cpu_percent(None)
+                        procs.append(proc)
+                    except psutil.Error:
+                        continue
+                processes.append((service, procs))
+            services.append(service)
+
+        if processes:
+            time.sleep(sample_interval)
+            for service, procs in processes:
+                total = 0.0
+                for proc in procs:
+                    try:
+                        total += proc.cpu_percent(None)
+                    except psutil.Error:
+                        continue
+                service["cpu_percent"] = round(total, 1)
+        return services
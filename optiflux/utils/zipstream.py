@@ -0,0 +1,587 @@
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+# ZIP 本地文件头（不含 4 字节签名）
+_LOCAL_HEADER = struct.Struct("<HHHHHIIIHH")
+_LOCAL_SIG = b"PK\x03\x04"
+# 本地文件之后依次是中央目录、zip64 结束记录或结束记录，读到即表示条目结束
+_END_SIGS = {b"PK\x01\x02", b"PK\x06\x06", b"PK\x05\x06"}
+_DESCRIPTOR_SIG = b"PK\x07\x08"
+_CENTRAL_HEADER = struct.Struct("<4sHHHHHHIIIHHHHHII")
+_ZIP64_END = struct.Struct("<4sQHHIIQQQQ")
+_ZIP64_LOCATOR = struct.Struct("<4sIQI")
+_END = struct.Struct("<4sHHHHIIH")
+_ZIP64_LIMIT = 0xFFFFFFFF
+_SAMPLE_SIZE = 256 << 10
+
+_FLAG_ENCRYPTED = 0x01
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+
+STORED = 0
+DEFLATED = 8
+
+
+class ZipStreamError(Exception):
+    """ZIP 流无法按顺序解析"""
+
+
+class DataDescriptorError(ZipStreamError):
+    """未压缩条目的大小写在数据之后（写入不可 seek 的流时生成），无法边接收边解析"""
+
+
+class ZipStreamEntry:
+    """顺序读取时的单个条目，数据只能通过 iter_data 读取一次"""
+
+    def __init__(
+        self,
+        stream,
+        name,
+        method,
+        crc,
+        compressed_size,
+        size,
+        chunk_size,
+        descriptor=False,
+        zip64=False,
+    ):
+        self.name = name
+        self.method = method
+        self.crc = crc
+        self.compressed_size = compressed_size
+        self.size = size
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._remaining = compressed_size
+        # 使用数据描述符的条目大小未知：依靠 deflate 流自身的结束标记确定边界
+        self._descriptor = descriptor
+        self._zip64 = zip64
+        self._start = stream.tell() if descriptor else None
+        self._consumed = False
+
+    @property
+    def is_dir(self):
+        return self.name.endswith("/")
+
+    def iter_data(self):
+        """逐块返回解压后的数据，结束时校验 CRC"""
+        if self._consumed:
+            raise ZipStreamError(f"Data of {self.name} was already read")
+        self._consumed = True
+        if self._descriptor:
+            yield from self._iter_descriptor_data()
+            return
+        if self.method == DEFLATED:
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        elif self.method != STORED:
+            raise ZipStreamError(
+                f"Unsupported compression method {self.method} for {self.name}"
+            )
+        crc = 0
+        while self._remaining:
+            data = _read_exact(self._stream, min(self._chunk_size, self._remaining))
+            self._remaining -= len(data)
+            if self.method == DEFLATED:
+                data = decompressor.decompress(data)
+            if data:
+                crc = zlib.crc32(data, crc)
+                yield data
+        if self.method == DEFLATED:
+            data = decompressor.flush()
+            if data:
+                crc = zlib.crc32(data, crc)
+                yield data
+        if crc != self.crc:
+            raise ZipStreamError(f"CRC mismatch for {self.name}")
+
+    def _iter_descriptor_data(self):
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        crc = size = compressed_size = 0
+        while not decompressor.eof:
+            data = self._stream.read(self._chunk_size)
+            if not data:
+                raise ZipStreamError("Unexpected end of ZIP stream")
+            data = decompressor.decompress(data)
+            if data:
+                crc = zlib.crc32(data, crc)
+                size += len(data)
+                yield data
+        # 多读的数据属于数据描述符及后续条目，退回流中
+        self._stream.unread(decompressor.unused_data)
+        compressed_size = self._stream.tell() - self._start
+
+        signature = _read_exact(self._stream, 4)
+        if signature != _DESCRIPTOR_SIG:
+            self._stream.unread(signature)
+        fmt = "<IQQ" if self._zip64 else "<III"
+        expected_crc, expected_compressed, expected_size = struct.unpack(
+            fmt, _read_exact(self._stream, struct.calcsize(fmt))
+        )
+        if (crc, compressed_size, size) != (
+            expected_crc,
+            expected_compressed,
+            expected_size,
+        ):
+            raise ZipStreamError(f"Data descriptor mismatch for {self.name}")
+        self.crc, self.compressed_size, self.size = crc, compressed_size, size
+
+    def skip(self):
+        """跳过未读取的数据"""
+        if self._descriptor:
+            if not self._consumed:
+                for _ in self.iter_data():
+                    pass
+            return
+        while self._remaining:
+            data = _read_exact(self._stream, min(self._chunk_size, self._remaining))
+            self._remaining -= len(data)
+
+
+class _PushbackReader:
+    """支持退回已读数据并统计读取位置的流包装"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._pending = b""
+        self._position = 0
+
+    def read(self, size):
+        if self._pending:
+            data, self._pending = self._pending[:size], self._pending[size:]
+        else:
+            data = self._stream.read(size)
+        self._position += len(data)
+        return data
+
+    def unread(self, data):
+        self._pending = data + self._pending
+        self._position -= len(data)
+
+    def tell(self):
+        return self._position
+
+
+def _read_exact(stream, size):
+    chunks = []
+    while size:
+        data = stream.read(size)
+        if not data:
+            raise ZipStreamError("Unexpected end of ZIP stream")
+        chunks.append(data)
+        size -= len(data)
+    return b"".join(chunks)
+
+
+def _zip64_sizes(extra, compressed_size, size):
+    """从 zip64 扩展字段中读取超过 4GB 的大小"""
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, length = struct.unpack_from("<HH", extra, offset)
+        if header_id == 0x0001:
+            values = iter(struct.unpack_from(f"<{length // 8}Q", extra, offset + 4))
+            if size == 0xFFFFFFFF:
+                size = next(values)
+            if compressed_size == 0xFFFFFFFF:
+                compressed_size = next(values)
+            break
+        offset += 4 + length
+    return compressed_size, size
+
+
+def _has_zip64(extra):
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, length = struct.unpack_from("<HH", extra, offset)
+        if header_id == 0x0001:
+            return True
+        offset += 4 + length
+    return False
+
+
+def iter_entries(stream, chunk_size=1 << 20):
+    """
+    按顺序解析 ZIP 流中的条目，无需先拿到末尾的中央目录。
+
+    适用于边接收边解压：每个条目在其数据读完前不会读取后续字节；调用方未读取的
+    条目数据会在取下一个条目时自动跳过。
+
+    使用数据描述符（写入不可 seek 的流时生成）的条目仅支持 deflate 压缩。
+
+    :param stream: 只需支持 read(n) 的文件对象
+    :param chunk_size: 每次读取的压缩数据大小
+    :return: ZipStreamEntry 迭代器
+    """
+    stream = _PushbackReader(stream)
+    while True:
+        first = stream.read(1)
+        if not first:
+            return
+        signature = first + _read_exact(stream, 3)
+        if signature in _END_SIGS:
+            return
+        if signature != _LOCAL_SIG:
+            raise ZipStreamError("Invalid local file header")
+
+        (
+            _version,
+            flags,
+            method,
+            _time,
+            _date,
+            crc,
+            compressed_size,
+            size,
+            name_length,
+            extra_length,
+        ) = _LOCAL_HEADER.unpack(_read_exact(stream, _LOCAL_HEADER.size))
+        raw_name = _read_exact(stream, name_length)
+        extra = _read_exact(stream, extra_length)
+        name = raw_name.decode("utf-8" if flags & _FLAG_UTF8 else "cp437")
+        if flags & _FLAG_ENCRYPTED:
+            raise ZipStreamError(f"Encrypted entry {name} is not supported")
+        descriptor = bool(flags & _FLAG_DATA_DESCRIPTOR)
+        if descriptor and method != DEFLATED:
+            raise DataDescriptorError(f"Entry {name} uses a data descriptor")
+        zip64 = _has_zip64(extra)
+        compressed_size, size = _zip64_sizes(extra, compressed_size, size)
+
+        entry = ZipStreamEntry(
+            stream,
+            name,
+            method,
+            crc,
+            compressed_size,
+            size,
+            chunk_size,
+            descriptor=descriptor,
+            zip64=zip64,
+        )
+        yield entry
+        entry.skip()
+
+
+def safe_join(root, name):
+    """
+    将条目名映射到 root 下的路径，拒绝绝对路径与 ".." 等越界路径。
+    :return: 目标路径
+    """
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".")]
+    if not parts or ".." in parts or os.path.splitdrive(parts[0])[0]:
+        raise ZipStreamError(f"Unsafe entry name: {name}")
+    return os.path.join(root, *parts)
+
+
+def extract_entry(entry, root, on_data=None):
+    """
+    将条目写入 root 下（先写临时文件再改名，读取方不会看到写了一半的文件）。
+    :param on_data: 每写入一块数据后的回调 on_data(字节数)，用于汇报进度
+    :return: 写入的路径
+    """
+    path = safe_join(root, entry.name)
+    if entry.is_dir:
+        os.makedirs(path, exist_ok=True)
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.partial"
+    with open(tmp_path, "wb") as f:
+        for data in entry.iter_data():
+            f.write(data)
+            if on_data is not None:
+                on_data(len(data))
+    os.replace(tmp_path, path)
+    return path
+
+
+# 已压缩格式：再次 deflate 几乎没有收益，用压缩级别 0（只分块不压缩）以节省 CPU
+COMPRESSED_SUFFIXES = {
+    ".zip",
+    ".gz",
+    ".tgz",
+    ".bz2",
+    ".xz",
+    ".zst",
+    ".lz4",
+    ".7z",
+    ".rar",
+    ".jar",
+    ".whl",
+    ".npz",
+    ".parquet",
+    ".jpg",
+    ".jpeg",
+    ".png",
+    ".gif",
+    ".webp",
+    ".mp3",
+    ".mp4",
+    # 模型权重以浮点数据为主，deflate 通常只能减小几个百分点
+    ".pt",
+    ".pth",
+    ".ckpt",
+    ".safetensors",
+    ".onnx",
+}
+
+
+def choose_compresslevel(f, path, compresslevel=6):
+    """
+    选择文件的 deflate 压缩级别：COMPRESSED_SUFFIXES 中的文件不压缩；扩展名未知的
+    大文件先试压开头一段，压缩后仍超过原大小 90% 时不压缩。
+    :param f: 以二进制方式打开的文件，试压后回到开头
+    :param path: 文件路径（用于判断扩展名）
+    :return: 压缩级别，0 表示不压缩
+    """
+    if not compresslevel:
+        return 0
+    if os.path.splitext(path)[1].lower() in COMPRESSED_SUFFIXES:
+        return 0
+    if os.fstat(f.fileno()).st_size > _SAMPLE_SIZE * 4:
+        sample = f.read(_SAMPLE_SIZE)
+        f.seek(0)
+        if len(zlib.compress(sample, 1)) > len(sample) * 0.9:
+            return 0
+    return compresslevel
+
+
+def _dos_datetime(timestamp):
+    t = time.localtime(max(timestamp, 315532800))  # ZIP 最早只能表示 1980 年
+    dos_date = (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    dos_time = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+    return dos_time, dos_date
+
+
+class ZipStreamWriter:
+    """
+    顺序写出 ZIP，不需要 seek：条目一律 deflate 并在数据后写数据描述符，
+    边读文件边输出，可直接作为 HTTP 响应体；超过 4GB 时使用 zip64。
+    """
+
+    def __init__(self, write, chunk_size=1 << 20):
+        """
+        :param write: 接收输出字节的回调
+        :param chunk_size: 读取文件的块大小
+        """
+        self._write = write
+        self._chunk_size = chunk_size
+        self._offset = 0
+        self._entries = []
+
+    def _emit(self, data):
+        if data:
+            self._write(data)
+            self._offset += len(data)
+
+    def add_file(self, path, arcname, compresslevel=6):
+        """
+        :param compresslevel: deflate 压缩级别，0 表示只分块不压缩；已压缩的文件
+            按 choose_compresslevel 自动降为 0
+        """
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            name = arcname.replace(os.sep, "/").encode("utf-8")
+            flags = _FLAG_DATA_DESCRIPTOR | _FLAG_UTF8
+            dos_time, dos_date = _dos_datetime(st.st_mtime)
+            # 与 zipfile 相同的估计：文件在读取期间可能继续增长（如日志），留出余量
+            zip64 = st.st_size * 1.05 > _ZIP64_LIMIT
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if zip64 else b""
+            version = 45 if zip64 else 20
+            offset = self._offset
+            self._emit(
+                _LOCAL_SIG
+                + _LOCAL_HEADER.pack(
+                    version,
+                    flags,
+                    DEFLATED,
+                    dos_time,
+                    dos_date,
+                    0,
+                    _ZIP64_LIMIT if zip64 else 0,
+                    _ZIP64_LIMIT if zip64 else 0,
+                    len(name),
+                    len(extra),
+                )
+                + name
+                + extra
+            )
+
+            compresslevel = choose_compresslevel(f, path, compresslevel)
+            compressor = zlib.compressobj(
+                compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS
+            )
+            crc = size = compressed_size = 0
+            for data in iter(lambda: f.read(self._chunk_size), b""):
+                crc = zlib.crc32(data, crc)
+                size += len(data)
+                data = compressor.compress(data)
+                compressed_size += len(data)
+                self._emit(data)
+        data = compressor.flush()
+        compressed_size += len(data)
+        self._emit(data)
+        if not zip64 and max(size, compressed_size) >= _ZIP64_LIMIT:
+            raise ZipStreamError(f"{path} grew beyond 4GB while being archived")
+        fmt = "<IQQ" if zip64 else "<III"
+        self._emit(_DESCRIPTOR_SIG + struct.pack(fmt, crc, compressed_size, size))
+        self._entries.append(
+            (name, flags, dos_time, dos_date, crc, compressed_size, size, offset, st)
+        )
+
+    def close(self):
+        """写出中央目录与结束记录"""
+        central_offset = self._offset
+        for name, flags, dos_time, dos_date, crc, csize, size, offset, st in (
+            self._entries
+        ):
+            zip64_fields = [v for v in (size, csize, offset) if v >= _ZIP64_LIMIT]
+            extra = b""
+            if zip64_fields:
+                extra = struct.pack(
+                    f"<HH{len(zip64_fields)}Q",
+                    0x0001,
+                    8 * len(zip64_fields),
+                    *zip64_fields,
+                )
+            version = 45 if zip64_fields else 20
+            self._emit(
+                _CENTRAL_HEADER.pack(
+                    b"PK\x01\x02",
+                    3 << 8 | version,  # 创建系统：UNIX
+                    version,
+                    flags,
+                    DEFLATED,
+                    dos_time,
+                    dos_date,
+                    crc,
+                    min(csize, _ZIP64_LIMIT),
+                    min(size, _ZIP64_LIMIT),
+                    len(name),
+                    len(extra),
+                    0,
+                    0,
+                    0,
+                    (st.st_mode & 0xFFFF) << 16,
+                    min(offset, _ZIP64_LIMIT),
+                )
+                + name
+                + extra
+            )
+        central_size = self._offset - central_offset
+        count = len(self._entries)
+        if (
+            count >= 0xFFFF
+            or central_offset >= _ZIP64_LIMIT
+            or central_size >= _ZIP64_LIMIT
+        ):
+            zip64_end_offset = self._offset
+            self._emit(
+                _ZIP64_END.pack(
+                    b"PK\x06\x06",
+                    _ZIP64_END.size - 12,
+                    45,
+                    45,
+                    0,
+                    0,
+                    count,
+                    count,
+                    central_size,
+                    central_offset,
+                )
+                + _ZIP64_LOCATOR.pack(b"PK\x06\x07", 0, zip64_end_offset, 1)
+            )
+        self._emit(
+            _END.pack(
+                b"PK\x05\x06",
+                0,
+                0,
+                min(count, 0xFFFF),
+                min(count, 0xFFFF),
+                min(central_size, _ZIP64_LIMIT),
+                min(central_offset, _ZIP64_LIMIT),
+                0,
+            )
+        )
+
+
+class _Stopped(Exception):
+    """消费方已关闭生成器"""
+
+
+def iter_directory_zip(
+    root, names=None, compresslevel=6, queue_size=8, block_size=1 << 20
+):
+    """
+    将目录打包为 ZIP 字节流：后台线程遍历目录并压缩，经有界队列逐块返回，
+    压缩与发送并行进行，内存占用不超过 queue_size 个块。
+    消费方提前关闭生成器（如客户端断开）时后台线程随之退出。
+
+    :param root: 要打包的目录
+    :param names: 只打包这些相对路径（默认整个目录）
+    :param compresslevel: deflate 压缩级别（已压缩的文件不压缩，见 choose_compresslevel）
+    :param queue_size: 队列中最多缓存的块数
+    :param block_size: 每块的大小
+    :return: 字节块生成器
+    """
+    blocks = queue.Queue(maxsize=queue_size)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                blocks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise _Stopped
+
+    def produce():
+        buffer = bytearray()
+
+        def write(data):
+            buffer.extend(data)
+            if len(buffer) >= block_size:
+                put(bytes(buffer))
+                buffer.clear()
+
+        try:
+            writer = ZipStreamWriter(write, chunk_size=block_size)
+            if names is None:
+                paths = (
+                    os.path.join(dirpath, filename)
+                    for dirpath, _, filenames in os.walk(root)
+                    for filename in filenames
+                )
+            else:
+                paths = (safe_join(root, name) for name in names)
+            for path in paths:
+                try:
+                    writer.add_file(path, os.path.relpath(path, root), compresslevel)
+                except FileNotFoundError:
+                    # 打包期间被删除的文件（如轮转的日志）直接跳过
+                    continue
+            writer.close()
+            if buffer:
+                put(bytes(buffer))
+            put(done)
+        except _Stopped:
+            pass
+        except Exception as e:
+            if not stopped.is_set():
+                put(e)
+
+    thread = threading.Thread(target=produce, name="optiflux-zip", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = blocks.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
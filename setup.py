@@ -22,6 +22,7 @@ setup(
         "pydantic>=1.8.0",
         "gunicorn>=20.1.0",  # 新增核心依赖
         "python-dotenv>=0.19.0",
+        "diskcache>=5.0,<6",  # ModelCache 的批量读取依赖 5.x 的表结构
     ],
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,45 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from optiflux import Model
+from optiflux.api.service import ModelkitAutoAPIRouter
+
+
+class BatchOnlyAsyncModel(Model):
+    """只重写了 `_apredict_batch` 的异步模型"""
+
+    def load(self):
+        self.batches = []
+
+    async def _apredict_batch(self, inputs):
+        self.batches.append(len(inputs))
+        return [{"double": item["x"] * 2} for item in inputs]
+
+
+def test_batch_only_async_model_is_async():
+    assert BatchOnlyAsyncModel.is_async()
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_batch_only_async_model_endpoints(tmp_path, monkeypatch, lazy):
+    monkeypatch.chdir(tmp_path)  # 缓存目录写在当前目录下
+    app = FastAPI()
+    app.include_router(
+        ModelkitAutoAPIRouter(model={"double": BatchOnlyAsyncModel}, lazy=lazy)
+    )
+    with TestClient(app) as client:
+        response = client.post("/predict/double", json={"x": 3})
+        assert response.status_code == 200
+        assert response.json() == {"double": 6}
+
+        response = client.post("/predict/batch/double", json=[{"x": 1}, {"x": 2}])
+        assert response.status_code == 200
+        assert response.json() == [{"double": 2}, {"double": 4}]
+
+
+def test_async_model_rejected_in_process_mode():
+    with pytest.raises(ValueError, match="async"):
+        ModelkitAutoAPIRouter(
+            model={"double": BatchOnlyAsyncModel}, execution_mode="process"
+        )
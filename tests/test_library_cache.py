@@ -0,0 +1,26 @@
+from optiflux import Model
+from optiflux.core.library import ModelLibrary
+
+
+class TopKModel(Model):
+    """结果取决于关键字参数 top_k 的模型"""
+
+    def load(self):
+        self.calls = 0
+
+    def _predict_batch(self, inputs, top_k=1):
+        self.calls += 1
+        return [list(range(item, item + top_k)) for item in inputs]
+
+
+def test_predict_batch_cache_keys_include_kwargs(tmp_path):
+    lib = ModelLibrary(models={"topk": TopKModel}, cache_dir=str(tmp_path))
+    model = lib.get_model("topk")
+
+    assert lib.predict_batch("topk", [1, 2], top_k=1) == [[1], [2]]
+    assert lib.predict_batch("topk", [1, 2], top_k=2) == [[1, 2], [2, 3]]
+    assert model.calls == 2
+
+    # 相同的参数命中缓存
+    assert lib.predict_batch("topk", [1, 2], top_k=2) == [[1, 2], [2, 3]]
+    assert model.calls == 2